@@ -1,16 +1,63 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta
 import io
 import os
+import time
+import traceback
 from collections import defaultdict
 import plotly.express as px
 import plotly.graph_objects as go
 
-# 清空Streamlit所有缓存，部署后自动生效，彻底禁用缓存
-st.cache_data.clear()
-st.cache_resource.clear()
+from project_invalid_core import (
+    pa,
+    STREAM_CHUNK_SIZE,
+    PARALLEL_MIN_ROWS,
+    PARALLEL_MIN_WORKERS,
+    AMOUNT_COLUMNS,
+    RATIO_COLUMNS,
+    DATE_COLUMNS,
+    TIME_COLUMNS,
+    PRICE_COLUMNS,
+    COLUMNAR_CACHE_DIR,
+    ARROW_EXPORT_SUFFIXES,
+    QUERY_ENGINES,
+    DEFAULT_ENGINE,
+    AnalysisError,
+    MissingColumnsError,
+    NoDataError,
+    parse_time_columns,
+    read_dataset,
+    dataset_file_path,
+    plan_dataset_load,
+    estimate_violation_preview,
+    clear_columnar_cache,
+    analyze_complete_data,
+    build_violation_cube,
+    build_statistics_index,
+    analyze_violation_statistics,
+    analyze_violation_cube,
+    analyze_csv_in_chunks,
+    build_project_summary,
+    build_total_stats,
+    encode_price_cents,
+    sum_amount,
+    format_for_csv,
+    write_excel_report,
+    write_csv_export,
+    typed_export_table,
+    write_arrow_export,
+    write_tables_archive,
+    result_report_date,
+    export_cache_key,
+    hash_bytes,
+    hash_file,
+    hash_dataframe,
+    ResultCache,
+    JobQueue,
+    csv_dataset_hash,
+    precompute_dataset,
+)
 
 # 设置页面配置
 st.set_page_config(
@@ -1157,6 +1204,10 @@ if 'uploaded_file' not in st.session_state:
     st.session_state.uploaded_file = None
 if 'local_file_path' not in st.session_state:
     st.session_state.local_file_path = None
+if 'uploaded_file_id' not in st.session_state:
+    st.session_state.uploaded_file_id = None
+if 'parsed_times' not in st.session_state:
+    st.session_state.parsed_times = None
 if 'show_raw_data' not in st.session_state:
     st.session_state.show_raw_data = False
 if 'highlight_violations' not in st.session_state:
@@ -1169,6 +1220,42 @@ if 'high_violation_threshold' not in st.session_state:
     st.session_state.high_violation_threshold = 20
 if 'medium_violation_threshold' not in st.session_state:
     st.session_state.medium_violation_threshold = 10
+if 'dataset_hash' not in st.session_state:
+    st.session_state.dataset_hash = None
+if 'violation_cube' not in st.session_state:
+    st.session_state.violation_cube = None
+if 'statistics_index' not in st.session_state:
+    st.session_state.statistics_index = None
+if 'load_analysis_columns_only' not in st.session_state:
+    st.session_state.load_analysis_columns_only = False
+if 'use_columnar_cache' not in st.session_state:
+    st.session_state.use_columnar_cache = True
+if 'stream_mode' not in st.session_state:
+    st.session_state.stream_mode = False
+if 'stream_chunk_size' not in st.session_state:
+    st.session_state.stream_chunk_size = STREAM_CHUNK_SIZE
+if 'streamed_result' not in st.session_state:
+    st.session_state.streamed_result = None
+if 'fixed_point_gmv' not in st.session_state:
+    st.session_state.fixed_point_gmv = False
+if 'worker_count' not in st.session_state:
+    st.session_state.worker_count = 1
+if 'analysis_engine' not in st.session_state:
+    st.session_state.analysis_engine = DEFAULT_ENGINE
+if 'query_source' not in st.session_state:
+    st.session_state.query_source = None
+if 'load_plan' not in st.session_state:
+    st.session_state.load_plan = None
+if 'fast_preview' not in st.session_state:
+    st.session_state.fast_preview = False
+if 'preview_result' not in st.session_state:
+    st.session_state.preview_result = None
+if 'load_job' not in st.session_state:
+    st.session_state.load_job = None
+if 'analysis_jobs' not in st.session_state:
+    st.session_state.analysis_jobs = {}
+if 'statistics_params' not in st.session_state:
+    st.session_state.statistics_params = None
 
 # 侧边栏配置
 with st.sidebar:
@@ -1215,453 +1302,560 @@ with st.sidebar:
     # 文件状态显示
     if st.session_state.uploaded_file is not None:
         st.success("✅ 已加载上传文件")
+    elif st.session_state.streamed_result is not None:
+        st.success("✅ 已完成流式分析")
+    elif st.session_state.query_source is not None:
+        st.success(f"✅ 已加载文件（{QUERY_ENGINES[st.session_state.query_source['engine']]['name']}）")
+    elif st.session_state.load_job is not None:
+        st.info("⏳ 正在后台加载数据")
     elif st.session_state.local_file_path is not None:
         st.success(f"✅ 已加载本地文件")
     else:
         st.info("📁 请先上传数据文件")
 
 
-# 数据解析和清洗函数
-def parse_date(date_str):
-    """解析各种格式的日期字符串"""
-    if not date_str or pd.isna(date_str) or str(date_str) == '1/1/1970 08:00:00':
+# ==================== 结果显示和导出格式 ====================
+def run_analysis(compute, error_message):
+    """执行分析并在页面上提示分析异常，出错时返回None"""
+    try:
+        return compute()
+    except MissingColumnsError as e:
+        st.error(f"❌ {e}")
+        st.info(f"📊 文件中的列: {e.columns}")
+    except NoDataError as e:
+        st.warning(f"⚠️ {e}")
+    except Exception as e:
+        st.error(f"❌ {error_message}: {e}")
+        st.error(traceback.format_exc())
+    return None
+
+
+def build_column_config(df, amount_format="%.2f"):
+    """为结果表中的金额列、占比列和日期列生成st.dataframe使用的显示格式"""
+    column_config = {}
+    for column in df.columns:
+        if column in AMOUNT_COLUMNS:
+            column_config[column] = st.column_config.NumberColumn(column, format=amount_format)
+        elif column in RATIO_COLUMNS:
+            column_config[column] = st.column_config.NumberColumn(column, format="percent")
+        elif column in DATE_COLUMNS:
+            column_config[column] = st.column_config.DateColumn(column, format="YYYY-MM-DD")
+    return column_config
+
+
+# ==================== 结果缓存 ====================
+@st.cache_resource
+def get_result_cache():
+    """所有会话共享的结果缓存，容量、过期时间和内存上限也由所有会话共享（在设置页修改）"""
+    return ResultCache()
+
+
+@st.cache_resource
+def get_export_cache():
+    """所有会话共享的导出文件缓存（导出文件较大，与分析结果分开限制数量和内存）"""
+    return ResultCache(max_entries=8, max_bytes=512 * 1024 ** 2)
+
+
+def apply_cache_settings():
+    """设置页修改缓存设置时调用：调整所有会话共享的结果缓存和导出文件缓存（两者过期时间相同）"""
+    ttl_seconds = st.session_state.cache_ttl_minutes_input * 60
+    get_result_cache().configure(
+        st.session_state.cache_max_entries_input,
+        ttl_seconds,
+        st.session_state.cache_max_megabytes_input * 1024 ** 2
+    )
+    get_export_cache().configure(
+        st.session_state.export_cache_entries_input,
+        ttl_seconds,
+        st.session_state.export_cache_megabytes_input * 1024 ** 2
+    )
+
+
+def get_cached_result(name, dataset_hash, params, compute):
+    """返回缓存的结果，未命中时调用compute计算并缓存（结果为None时不缓存）"""
+    return get_result_cache().get_or_compute((name, dataset_hash, params), compute)
+
+
+# ==================== 按需导出 ====================
+def export_download_button(label, export_format, params, build, file_name, mime, report_date=None):
+    """按需生成导出文件：点击生成后按 (导出格式, 数据哈希, 参数, 报告日期) 缓存，之后直接提供下载
+
+    页面运行时不再生成导出内容，只有点击生成按钮时才调用 build。
+    """
+    cache = get_export_cache()
+    key = export_cache_key(export_format, st.session_state.dataset_hash, params, report_date)
+    data = cache.get(key)
+    # 生成按钮和下载按钮占同一位置，生成完成后直接替换为下载按钮
+    slot = st.empty()
+    if data is None:
+        if not slot.button(f"⚙️ 生成{label}", key=f"build_{export_format}", use_container_width=True):
+            return
+        with st.spinner(f"正在生成{label}..."):
+            data = build()
+        cache.set(key, data)
+
+    slot.download_button(
+        label=f"📥 下载{label}",
+        data=data,
+        file_name=file_name,
+        mime=mime,
+        use_container_width=True,
+        key=f"download_{export_format}"
+    )
+
+
+def build_csv_export(df):
+    """生成结果表的CSV导出内容，金额和占比按显示格式输出"""
+    csv_buffer = io.StringIO()
+    format_for_csv(df).to_csv(csv_buffer, index=False, encoding='utf-8-sig')
+    return csv_buffer.getvalue()
+
+
+# 原始数据和筛选数据的导出格式：按块写成CSV（可选压缩），或写成保留列类型的Parquet / Arrow IPC文件
+RAW_EXPORT_FORMATS = {
+    'csv': {'label': "CSV", 'compression': None, 'suffix': ".csv", 'mime': "text/csv"},
+    'csv.gz': {'label': "CSV（gzip压缩）", 'compression': 'gzip', 'suffix': ".csv.gz", 'mime': "application/gzip"},
+    'zip': {'label': "CSV（zip压缩）", 'compression': 'zip', 'suffix': ".zip", 'mime': "application/zip"},
+    'parquet': {'label': "Parquet", 'suffix': ".parquet", 'mime': "application/vnd.apache.parquet"},
+    'arrow': {'label': "Arrow IPC", 'suffix': ".arrow", 'mime': "application/vnd.apache.arrow.file"},
+}
+
+# 分析结果表（详细分析、项目汇总、统计汇总）的列式导出格式，每个表一个文件打包为zip
+TABLE_EXPORT_LABELS = {'parquet': "Parquet", 'arrow': "Arrow IPC"}
+
+
+def available_raw_export_formats():
+    """可用的原始数据导出格式，未安装pyarrow时不提供Parquet和Arrow"""
+    return [name for name in RAW_EXPORT_FORMATS if pa is not None or name not in ARROW_EXPORT_SUFFIXES]
+
+
+def build_raw_export(df, export_format, file_stem, parsed_times=None):
+    """按块导出原始数据：CSV（可压缩）原样输出文本；Parquet和Arrow中时间列为日期时间类型
+
+    返回回到开头的BytesIO，直接缓存并交给下载按钮，不再另外复制一份字节串。
+    """
+    buffer = io.BytesIO()
+    if export_format in ARROW_EXPORT_SUFFIXES:
+        write_arrow_export(typed_export_table(df, parsed_times), buffer, export_format)
+    else:
+        write_csv_export(df, buffer, RAW_EXPORT_FORMATS[export_format]['compression'], arcname=f"{file_stem}.csv")
+    buffer.seek(0)
+    return buffer
+
+
+def raw_data_download_button(label, export_name, params, df):
+    """原始数据导出：先选择导出格式，再按需生成和下载"""
+    export_format = st.selectbox(
+        f"{label}导出格式",
+        available_raw_export_formats(),
+        format_func=lambda name: RAW_EXPORT_FORMATS[name]['label'],
+        key=f"{export_name}_export_format",
+        help="数据量大时建议压缩，文件通常只有原来的几分之一；Parquet和Arrow保留数值和日期时间类型，适合导入BI工具"
+    )
+    options = RAW_EXPORT_FORMATS[export_format]
+    file_stem = f"{label}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    # 已解析的时间列按索引对齐，导出筛选后的数据时不必重新解析
+    parsed_times = st.session_state.parsed_times
+    export_download_button(
+        label, f"{export_name}_{export_format}", params,
+        lambda: build_raw_export(df, export_format, file_stem, parsed_times),
+        f"{file_stem}{options['suffix']}",
+        options['mime']
+    )
+
+
+def analysis_report_tables(analysis_result, include_raw_data=True):
+    """违规率分析报告中的表：详细分析、原始数据（可选）、项目汇总和统计汇总"""
+    result_df = analysis_result['analysis_result']
+    filtered_df = analysis_result['filtered_data']
+
+    tables = {'详细分析': result_df}
+    # 原始数据超过Excel行数上限时拆分为多个工作表
+    if include_raw_data and filtered_df is not None:
+        tables['原始数据'] = filtered_df
+
+    # 创建项目汇总
+    if analysis_result['use_project_code']:
+        summary_df = build_project_summary(result_df)
+        if summary_df is not None:
+            tables['项目汇总'] = summary_df
+
+    # 添加统计信息
+    tables['统计汇总'] = build_total_stats(result_df, analysis_result['fixed_point'])
+    return tables
+
+
+def build_analysis_workbook(analysis_result):
+    """生成违规率分析的Excel报告：详细分析、原始数据、项目汇总和统计汇总"""
+    # 只写模式逐行写入，工作簿内容先写到临时文件，内存中只保留压缩后的xlsx
+    excel_buffer = io.BytesIO()
+    write_excel_report(analysis_report_tables(analysis_result), excel_buffer)
+    excel_buffer.seek(0)
+    return excel_buffer
+
+
+def build_analysis_tables_archive(analysis_result, export_format):
+    """把详细分析、项目汇总和统计汇总分别写成Parquet或Arrow文件并打包为zip（原始数据单独导出）"""
+    buffer = io.BytesIO()
+    write_tables_archive(analysis_report_tables(analysis_result, include_raw_data=False), buffer, export_format)
+    buffer.seek(0)
+    return buffer
+
+
+# ==================== 后台任务队列 ====================
+@st.cache_resource
+def get_job_queue():
+    """所有会话共享的后台任务队列"""
+    return JobQueue()
+
+
+def release_job(slot):
+    """放弃当前会话在指定位置（如 'analysis'、'statistics'）等待的任务"""
+    job = st.session_state.analysis_jobs.pop(slot, None)
+    if job is not None:
+        get_job_queue().release(job)
+
+
+def release_all_jobs():
+    """放弃当前会话等待的全部任务（加载新数据或清除数据时）"""
+    for slot in list(st.session_state.analysis_jobs):
+        release_job(slot)
+
+
+@st.fragment(run_every=1)
+def wait_for_job(slot, message):
+    """每秒检查一次后台任务，完成后刷新整个页面"""
+    job = st.session_state.analysis_jobs.get(slot)
+    if job is None or job['future'].done():
+        st.rerun()
+    st.info(f"⏳ {message}（已用时 {time.monotonic() - job['submitted_at']:.0f} 秒）")
+
+
+def get_job_result(slot, name, dataset_hash, params, compute, message, error_message):
+    """在后台任务中计算结果并按 (name, dataset_hash, params) 缓存
+
+    缓存命中时直接返回；否则提交任务（相同任务只计算一次），同一位置的参数改变时放弃之前的任务。
+    任务完成前显示等待提示并停止本次页面运行，完成后自动刷新；计算出错时提示错误并返回None。
+    compute 在后台线程中执行，不能访问 st.session_state。
+    """
+    key = (name, dataset_hash, params)
+    job = st.session_state.analysis_jobs.get(slot)
+    if job is not None and job['key'] != key:
+        release_job(slot)
+        job = None
+
+    if job is None:
+        cache = get_result_cache()
+        result = cache.get(key)
+        if result is not None:
+            return result
+
+        def compute_and_cache(progress):
+            result = compute()
+            if result is not None:
+                cache.set(key, result)
+            return result
+
+        job = get_job_queue().submit(key, compute_and_cache)
+        st.session_state.analysis_jobs[slot] = job
+
+    if not job['future'].done():
+        wait_for_job(slot, message)
+        st.stop()
+
+    release_job(slot)
+    return run_analysis(job['future'].result, error_message)
+
+
+# ==================== 数据加载 ====================
+def load_csv_dataset(source, file_hash):
+    """按声明的列类型读取CSV文件并设为当前数据，相同内容和加载选项的文件直接使用缓存或列式缓存"""
+    analysis_columns_only = st.session_state.load_analysis_columns_only
+    dataset_hash = csv_dataset_hash(file_hash, analysis_columns_only)
+    df = get_cached_result('read_csv', dataset_hash, (),
+                           lambda: read_dataset(source, file_hash, analysis_columns_only,
+                                                st.session_state.use_columnar_cache))
+    set_current_dataset(df, dataset_hash)
+    return df
+
+
+def set_current_dataset(df, dataset_hash=None):
+    """保存当前数据及其内容哈希，并在加载时一次性解析时间列"""
+    if dataset_hash is None:
+        dataset_hash = hash_dataframe(df)
+
+    st.session_state.uploaded_file = df
+    st.session_state.streamed_result = None
+    st.session_state.query_source = None
+    st.session_state.dataset_hash = dataset_hash
+    st.session_state.parsed_times = get_cached_result(
+        'parse_time_columns', dataset_hash, (), lambda: parse_time_columns(df))
+
+    # 预先构建违规率统计使用的日期立方体和行索引
+    parsed_times = st.session_state.parsed_times
+    if all(column in parsed_times for column in TIME_COLUMNS):
+        st.session_state.violation_cube = get_cached_result(
+            'build_violation_cube', dataset_hash, (),
+            lambda: build_violation_cube(df, parsed_times['order_time'], parsed_times['finish_time']))
+        st.session_state.statistics_index = get_cached_result(
+            'build_statistics_index', dataset_hash, (),
+            lambda: build_statistics_index(df, parsed_times['order_time'], parsed_times['finish_time']))
+    else:
+        st.session_state.violation_cube = None
+        st.session_state.statistics_index = None
+
+    # 定点数模式下加载时即把金额列转换为整数分
+    load_price_cents(df)
+
+
+def load_price_cents(df):
+    """定点数模式下返回当前数据按分存储的金额列（按数据哈希缓存），否则返回None"""
+    if not st.session_state.fixed_point_gmv or not all(column in df.columns for column in PRICE_COLUMNS):
         return None
+    return get_cached_result('encode_price_cents', st.session_state.dataset_hash, (),
+                             lambda: encode_price_cents(df))
+
+
+def load_streamed_dataset(source, file_hash, chunk_size=None):
+    """以流式分析模式处理CSV文件，只保留合并后的分析结果和日期立方体，不保留原始数据"""
+    dataset_hash = f"{file_hash}-stream"
+    if chunk_size is None:
+        chunk_size = st.session_state.stream_chunk_size
+    fixed_point = st.session_state.fixed_point_gmv
+    streamed_result = get_cached_result(
+        'analyze_csv_in_chunks', dataset_hash, (fixed_point,),
+        lambda: run_analysis(lambda: analyze_csv_in_chunks(source, chunk_size, fixed_point), "流式分析数据时出错"))
+
+    st.session_state.uploaded_file = None
+    st.session_state.parsed_times = None
+    st.session_state.violation_cube = None
+    st.session_state.statistics_index = None
+    st.session_state.dataset_hash = dataset_hash
+    st.session_state.streamed_result = streamed_result
+    st.session_state.query_source = None
+    return streamed_result
 
-    date_str = str(date_str).strip()
 
-    # 尝试多种日期格式
-    date_formats = [
-        '%d/%m/%Y %H:%M:%S',
-        '%Y-%m-%d %H:%M:%S',
-        '%m/%d/%Y %H:%M:%S',
-        '%d/%m/%Y',
-        '%Y-%m-%d',
-        '%Y/%m/%d %H:%M:%S',
-    ]
+def load_query_dataset(source, file_hash, engine):
+    """使用查询引擎直接读取数据文件，只记录文件路径和基本信息，分析时由引擎在文件上执行聚合"""
+    path = dataset_file_path(source, file_hash)
+    source_info = get_cached_result(f'{engine}_source_info', file_hash, (),
+                                    lambda: QUERY_ENGINES[engine]['source_info'](path))
 
-    for fmt in date_formats:
+    st.session_state.uploaded_file = None
+    st.session_state.parsed_times = None
+    st.session_state.violation_cube = None
+    st.session_state.statistics_index = None
+    st.session_state.streamed_result = None
+    st.session_state.dataset_hash = f"{file_hash}-{engine}"
+    st.session_state.query_source = {'engine': engine, 'path': path, **source_info}
+    return st.session_state.query_source
+
+
+def resolve_load_engine(source):
+    """确定加载方式，返回 (计算引擎, 流式分析每块行数)
+
+    计算引擎为自动选择时，按文件大小、估计行数和可用内存决定加载方式，选择结果保存在 load_plan 中。
+    """
+    st.session_state.load_plan = None
+    if st.session_state.stream_mode:
+        return 'stream', st.session_state.stream_chunk_size
+
+    engine = st.session_state.analysis_engine
+    if engine == 'auto':
+        plan = plan_dataset_load(source, st.session_state.load_analysis_columns_only)
+        st.session_state.load_plan = plan
+        return plan['engine'], plan['chunk_size']
+    return engine, st.session_state.stream_chunk_size
+
+
+def load_dataset_file(source, file_hash):
+    """按当前加载模式读取CSV文件（查询引擎、流式分析或整体加载到内存）
+
+    读取和分析在后台进行，页面显示进度；开启快速预览时先显示抽样估计结果，完成后替换为精确结果。
+    """
+    engine, chunk_size = resolve_load_engine(source)
+    start_background_load(source, file_hash, engine, chunk_size)
+
+
+def load_dataset_with_engine(source, file_hash, engine, chunk_size):
+    """使用指定的计算引擎加载数据"""
+    if engine in QUERY_ENGINES:
+        load_query_dataset(source, file_hash, engine)
+    elif engine == 'stream':
+        load_streamed_dataset(source, file_hash, chunk_size)
+    else:
         try:
-            return datetime.strptime(date_str, fmt)
-        except:
-            continue
+            load_csv_dataset(source, file_hash)
+        except MemoryError:
+            # 内存不足时改用流式分析，不让看板进程因加载数据失败
+            st.session_state.load_plan = {'engine': 'stream', 'reason': "整体加载时内存不足，改为流式分析"}
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            load_streamed_dataset(source, file_hash)
+
+
+def show_load_plan():
+    """显示自动选择的计算引擎及原因"""
+    plan = st.session_state.load_plan
+    if plan is None:
+        return
+    engine_name = {'pandas': 'pandas', 'stream': '流式分析'}.get(
+        plan['engine'], QUERY_ENGINES.get(plan['engine'], {}).get('name'))
+    st.info(f"⚙️ 计算引擎：{engine_name}（{plan['reason']}）")
 
-    return None
 
+def has_current_dataset():
+    """是否已加载数据（包括流式分析结果、查询引擎的数据文件和正在后台加载的数据）"""
+    return (st.session_state.uploaded_file is not None or
+            st.session_state.local_file_path is not None or
+            st.session_state.streamed_result is not None or
+            st.session_state.query_source is not None or
+            st.session_state.load_job is not None)
 
-# ==================== 违规率分析页面函数 ====================
-def analyze_complete_data(df):
-    """使用完整计算逻辑分析数据（不应用时间筛选）"""
-    try:
-        # 检查必要的列是否存在
-        required_columns = ['activity_name', 'project_name', 'channel_name', 'bonus_invalid_text', 'bonus_text']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-
-        if missing_columns:
-            st.error(f"❌ 缺少必要的列: {missing_columns}")
-            st.info(f"📊 文件中的列: {list(df.columns)}")
-            return None
-
-        # 检查是否有order_text列
-        if 'order_text' not in df.columns:
-            st.error("❌ 缺少order_text列，无法计算实际计佣GMV")
-            st.info(f"📊 文件中的列: {list(df.columns)}")
-            return None
-
-        # 检查是否有estimate_cos_price和actual_cos_price列
-        if 'estimate_cos_price' not in df.columns:
-            st.error("❌ 缺少estimate_cos_price列，无法计算预估计佣GMV")
-            st.info(f"📊 文件中的列: {list(df.columns)}")
-            return None
-
-        if 'actual_cos_price' not in df.columns:
-            st.error("❌ 缺少actual_cos_price列，无法计算实际计佣GMV")
-            st.info(f"📊 文件中的列: {list(df.columns)}")
-            return None
-
-        # 检查是否有project_code列用于排序
-        if 'project_code' not in df.columns:
-            use_project_code = False
-        else:
-            use_project_code = True
 
-        # 确保estimate_cos_price和actual_cos_price是数值类型
-        for col in ['estimate_cos_price', 'actual_cos_price']:
-            if not pd.api.types.is_numeric_dtype(df[col]):
-                try:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-                except Exception as e:
-                    st.error(f"❌ 转换{col}为数值类型时出错: {e}")
-                    return None
-
-        # 如果使用project_code排序，我们需要获取每个项目的project_code
-        if use_project_code:
-            # 获取每个项目的project_code（取第一个非空值）
-            project_code_map = {}
-            for project_name in df['project_name'].unique():
-                project_codes = df[df['project_name'] == project_name]['project_code'].dropna().unique()
-                if len(project_codes) > 0:
-                    project_code_map[project_name] = str(project_codes[0])
-                else:
-                    project_code_map[project_name] = project_name  # 如果没有project_code，使用项目名称
-
-        # 计算项目级别的统计数据（用于项目违规率和项目违规GMV占比）
-        project_stats = {}
-        for project_name in df['project_name'].unique():
-            project_group = df[df['project_name'] == project_name]
-
-            # 项目总订单数
-            project_total_count = len(project_group)
-
-            # 项目总GMV（预估）
-            project_estimate_gmv = project_group['estimate_cos_price'].sum()
-
-            # 项目总GMV（实际） - 只计算bonus_text为"有效"且order_text为"已完成"的订单
-            project_actual_gmv = project_group[
-                (project_group['bonus_text'] == '有效') &
-                (project_group['order_text'] == '已完成')
-                ]['actual_cos_price'].sum()
-
-            # 项目无效-违规订单数
-            project_invalid_violation = (project_group['bonus_invalid_text'] == '无效-违规订单').sum()
-
-            # 项目无效-风险订单数
-            project_invalid_risk = (project_group['bonus_invalid_text'] == '无效-风险订单').sum()
-
-            # 项目无效-违规订单GMV（预估）
-            project_invalid_violation_gmv = project_group.loc[
-                project_group['bonus_invalid_text'] == '无效-违规订单',
-                'estimate_cos_price'
-            ].sum()
-
-            # 项目无效-风险订单GMV（预估）
-            project_invalid_risk_gmv = project_group.loc[
-                project_group['bonus_invalid_text'] == '无效    -风险订单',
-                'estimate_cos_price'
-            ].sum()
-
-            # 项目违规率
-            project_violation_rate = (
-                                             project_invalid_violation + project_invalid_risk) / project_total_count if project_total_count > 0 else 0
-
-            # 项目违规GMV占比（使用预估GMV）
-            project_violation_gmv_ratio = (
-                                                  project_invalid_violation_gmv + project_invalid_risk_gmv) / project_estimate_gmv if project_estimate_gmv > 0 else 0
-
-            project_stats[project_name] = {
-                'project_total_count': project_total_count,
-                'project_estimate_gmv': project_estimate_gmv,
-                'project_actual_gmv': project_actual_gmv,
-                'project_invalid_violation': project_invalid_violation,
-                'project_invalid_risk': project_invalid_risk,
-                'project_invalid_violation_gmv': project_invalid_violation_gmv,
-                'project_invalid_risk_gmv': project_invalid_risk_gmv,
-                'project_violation_rate': project_violation_rate,
-                'project_violation_gmv_ratio': project_violation_gmv_ratio
-            }
-
-        # 获取所有唯一的项目-渠道组合
-        unique_combinations = df[['project_name', 'channel_name']].drop_duplicates()
-
-        # 将组合转换为列表
-        project_channel_combinations = []
-        for _, row in unique_combinations.iterrows():
-            project_channel_combinations.append((row['project_name'], row['channel_name']))
-
-        # 用于存储结果的列表
-        results = []
-
-        # 按照数据中实际存在的项目名称和渠道名称组合处理
-        for project_name, channel_name in project_channel_combinations:
-            # 筛选对应项目名称和渠道名称的数据
-            group = df[(df['project_name'] == project_name) & (df['channel_name'] == channel_name)]
-            total_count = len(group)
-
-            # 如果没有数据，跳过
-            if total_count == 0:
-                continue
-
-            # 统计 bonus_invalid_text 中的各类无效原因
-            invalid_violation_mask = (group['bonus_invalid_text'] == '无效-违规订单')
-            invalid_risk_mask = (group['bonus_invalid_text'] == '无效-风险订单')
-            invalid_cancel_mask = (group['bonus_invalid_text'] == '无效-取消')
-            invalid_split_mask = (group['bonus_invalid_text'] == '无效-拆单')
-            invalid_return_mask = (group['bonus_invalid_text'] == '无效-退货')
-
-            invalid_violation = invalid_violation_mask.sum()
-            invalid_risk = invalid_risk_mask.sum()
-            invalid_cancel = invalid_cancel_mask.sum()
-            invalid_split = invalid_split_mask.sum()
-            invalid_return = invalid_return_mask.sum()
-
-            # 其他无效原因
-            invalid_other = (group['bonus_invalid_text'].notna() &
-                             (group['bonus_invalid_text'] != '') &
-                             (group['bonus_invalid_text'] != '无效-取消') &
-                             (group['bonus_invalid_text'] != '无效-违规订单') &
-                             (group['bonus_invalid_text'] != '无效-风险订单') &
-                             (group['bonus_invalid_text'] != '无效-拆单') &
-                             (group['bonus_invalid_text'] != '无效-退货')).sum()
-
-            # 计算无效订单总数（所有无效原因的总和）
-            total_invalid_orders = invalid_cancel + invalid_violation + invalid_risk + invalid_split + invalid_return + invalid_other
-
-            # 计算预估计佣GMV - 使用estimate_cos_price
-            estimate_commission_gmv = group['estimate_cos_price'].sum() if not group[
-                'estimate_cos_price'].isna().all() else 0
-
-            # 计算预估完成GMV - 只计算bonus_text为"有效"的订单
-            valid_mask = (group['bonus_text'] == '有效')
-            estimate_completed_gmv = group.loc[valid_mask, 'estimate_cos_price'].sum() if not group[
-                'estimate_cos_price'].isna().all() else 0
-
-            # 计算实际计佣GMV - 只计算bonus_text为"有效"且order_text为"已完成"的订单
-            valid_completed_mask = (group['bonus_text'] == '有效') & (group['order_text'] == '已完成')
-            actual_commission_gmv = group.loc[valid_completed_mask, 'actual_cos_price'].sum() if not group[
-                'actual_cos_price'].isna().all() else 0
-
-            # 计算无效-违规订单GMV - 使用estimate_cos_price
-            invalid_violation_gmv = group.loc[invalid_violation_mask, 'estimate_cos_price'].sum() if not group[
-                'estimate_cos_price'].isna().all() else 0
-
-            # 计算无效-风险订单GMV - 使用estimate_cos_price
-            invalid_risk_gmv = group.loc[invalid_risk_mask, 'estimate_cos_price'].sum() if not group[
-                'estimate_cos_price'].isna().all() else 0
-
-            # 计算GMV占比（占预估计佣GMV的比例）
-            invalid_violation_gmv_ratio = invalid_violation_gmv / estimate_commission_gmv if estimate_commission_gmv > 0 else 0
-            invalid_risk_gmv_ratio = invalid_risk_gmv / estimate_commission_gmv if estimate_commission_gmv > 0 else 0
-
-            # 计算各类订单占比（占订单总数的比例）
-            invalid_ratio_total = total_invalid_orders / total_count if total_count > 0 else 0
-            violation_ratio_total = invalid_violation / total_count if total_count > 0 else 0
-            risk_ratio_total = invalid_risk / total_count if total_count > 0 else 0
-
-            # 计算渠道违规率（违规订单数占比）
-            channel_violation_rate = (invalid_violation + invalid_risk) / total_count if total_count > 0 else 0
-
-            # 计算渠道违规GMV占比
-            channel_violation_gmv_ratio = (
-                                                  invalid_violation_gmv + invalid_risk_gmv) / estimate_commission_gmv if estimate_commission_gmv > 0 else 0
-
-            # 获取日期（假设使用数据中的最小日期或当前日期）
-            date = pd.Timestamp.now().strftime('%Y-%m-%d')
-
-            # 获取项目级别的统计数据
-            project_stat = project_stats.get(project_name, {})
-
-            # 创建结果字典
-            result_dict = {
-                '日期': date,
-                '项目名称': project_name,
-                '渠道名称': channel_name,
-                '订单总数': total_count,
-                '预估计佣GMV': f"{estimate_commission_gmv:.2f}",
-                '预估完成': f"{estimate_completed_gmv:.2f}",
-                '实际计佣GMV': f"{actual_commission_gmv:.2f}",
-                '无效订单总数': total_invalid_orders,
-                '无效订单占比': f"{invalid_ratio_total:.2%}",
-                '无效-违规订单数': invalid_violation,
-                '无效-违规订单占比': f"{violation_ratio_total:.2%}",
-                '无效-违规订单GMV': f"{invalid_violation_gmv:.2f}",
-                '无效-违规订单GMV占比': f"{invalid_violation_gmv_ratio:.2%}",
-                '无效-风险订单数': invalid_risk,
-                '无效-风险订单占比': f"{risk_ratio_total:.2%}",
-                '无效-风险订单GMV': f"{invalid_risk_gmv:.2f}",
-                '无效-风险订单GMV占比': f"{invalid_risk_gmv_ratio:.2%}",
-                '违规率': f"{channel_violation_rate:.2%}",
-                '违规GMV占比': f"{channel_violation_gmv_ratio:.2%}",
-                '项目违规率': f"{project_stat.get('project_violation_rate', 0):.2%}",
-                '项目违规GMV占比': f"{project_stat.get('project_violation_gmv_ratio', 0):.2%}"
-            }
-
-            # 如果有项目编号，添加到结果中
-            if use_project_code:
-                project_code = project_code_map.get(project_name, "")
-                result_dict['项目编号'] = project_code
-
-            results.append(result_dict)
-
-        # 转换为 DataFrame
-        result_df = pd.DataFrame(results)
-
-        # 按照项目编号排序（如果有项目编号）
-        if use_project_code:
-            # 确保项目编号可以正确排序
-            try:
-                # 尝试将项目编号转换为整数进行排序
-                result_df['项目编号_排序'] = pd.to_numeric(result_df['项目编号'], errors='coerce')
-                result_df = result_df.sort_values('项目编号_排序', ascending=True)
-                result_df = result_df.drop('项目编号_排序', axis=1)
-            except:
-                # 如果不能转换为数字，按字符串排序
-                result_df = result_df.sort_values('项目编号', ascending=True)
-        else:
-            # 按项目名称排序
-            result_df = result_df.sort_values('项目名称', ascending=True)
-
-        # 按照要求的字段顺序重新排列
-        required_columns_order = [
-            '日期',
-            '项目名称',
-            '渠道名称',
-            '订单总数',
-            '预估计佣GMV',
-            '预估完成',
-            '实际计佣GMV',
-            '无效订单总数',
-            '无效订单占比',
-            '无效-违规订单数',
-            '无效-违规订单占比',
-            '无效-违规订单GMV',
-            '无效-违规订单GMV占比',
-            '无效-风险订单数',
-            '无效-风险订单占比',
-            '无效-风险订单GMV',
-            '无效-风险订单GMV占比',
-            '违规率',
-            '违规GMV占比',
-            '项目违规率',
-            '项目违规GMV占比'
-        ]
-
-        # 如果有项目编号，添加到列顺序中
-        if use_project_code:
-            # 在项目名称之后，渠道名称之前插入项目编号
-            required_columns_order.insert(2, '项目编号')  # 位置2（0-based索引）
-
-        # 确保只保留要求的列
-        result_df = result_df[required_columns_order]
-
-        return {
-            'analysis_result': result_df,
-            'filtered_data': df,
-            'total_combinations': len(project_channel_combinations),
-            'total_records': len(df),
-            'use_project_code': use_project_code
-        }
+# ==================== 后台预计算 ====================
+def start_background_load(source, file_hash, engine, chunk_size):
+    """在后台开始加载和预计算；开启快速预览时先同步得到抽样估计结果"""
+    preview = None
+    if st.session_state.fast_preview:
+        try:
+            preview = estimate_violation_preview(source, analysis_columns_only=True)
+        except (AnalysisError, ValueError):
+            preview = None
+
+    options = {
+        'analysis_columns_only': st.session_state.load_analysis_columns_only,
+        'use_columnar_cache': st.session_state.use_columnar_cache,
+        'fixed_point': st.session_state.fixed_point_gmv,
+        'workers': st.session_state.worker_count,
+        'chunk_size': chunk_size,
+    }
+    # 后台线程使用独立的读取位置，页面仍可读取上传内容显示预览（BytesIO共享同一份字节数据，不复制）
+    background_source = io.BytesIO(source.getvalue()) if hasattr(source, 'getvalue') else source
+    cache = get_result_cache()
 
-    except Exception as e:
-        st.error(f"❌ 分析数据时出错: {e}")
-        import traceback
-        st.error(traceback.format_exc())
-        return None
+    # 之前的数据还在计算的任务不再需要；其他会话正在加载同一文件时共用同一个任务
+    release_all_jobs()
+    st.session_state.statistics_params = None
+    st.session_state.analysis_jobs['load'] = get_job_queue().submit(
+        ('precompute_dataset', file_hash, engine, tuple(sorted(options.items()))),
+        lambda progress: precompute_dataset(cache, background_source, file_hash, engine, options, progress))
 
+    st.session_state.uploaded_file = None
+    st.session_state.streamed_result = None
+    st.session_state.query_source = None
+    st.session_state.parsed_times = None
+    st.session_state.violation_cube = None
+    st.session_state.statistics_index = None
+    st.session_state.dataset_hash = None
+    st.session_state.preview_result = preview
+    st.session_state.load_job = {
+        'source': source,
+        'file_hash': file_hash,
+        'engine': engine,
+        'chunk_size': chunk_size,
+    }
 
-# ==================== 违规率统计页面函数 ====================
-def analyze_violation_statistics(df, order_start_dt, order_end_dt, finish_start_dt, finish_end_dt):
-    """分析违规率统计"""
-    try:
-        # 检查必要的列是否存在
-        required_columns = ['project_name', 'channel_name', 'bonus_invalid_text', 'bonus_text', 'order_time',
-                            'finish_time']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-
-        if missing_columns:
-            st.error(f"❌ 缺少必要的列: {missing_columns}")
-            st.info(f"📊 文件中的列: {list(df.columns)}")
-            return None
-
-        # 解析日期列
-        df['order_time_parsed'] = df['order_time'].apply(parse_date)
-        df['finish_time_parsed'] = df['finish_time'].apply(parse_date)
-
-        # 筛选下单时间在指定范围内的所有订单
-        order_mask = df['order_time_parsed'].notna()
-
-        if order_start_dt:
-            order_mask = order_mask & (df['order_time_parsed'] >= order_start_dt)
-        if order_end_dt:
-            order_mask = order_mask & (df['order_time_parsed'] <= order_end_dt)
-
-        order_filtered_df = df[order_mask].copy()
-
-        if len(order_filtered_df) == 0:
-            st.warning("⚠️ 没有符合下单时间筛选条件的订单")
-            return None
-
-        # 获取所有唯一的项目-渠道组合（基于下单时间筛选后的数据）
-        unique_combinations = order_filtered_df[['project_name', 'channel_name']].drop_duplicates()
-
-        # 将组合转换为列表
-        project_channel_combinations = []
-        for _, row in unique_combinations.iterrows():
-            project_channel_combinations.append((row['project_name'], row['channel_name']))
-
-        # 用于存储结果的列表
-        results = []
-
-        # 按照数据中实际存在的项目名称和渠道名称组合处理
-        for project_name, channel_name in project_channel_combinations:
-            # 筛选对应项目名称和渠道名称的数据（基于下单时间）
-            order_group = order_filtered_df[
-                (order_filtered_df['project_name'] == project_name) &
-                (order_filtered_df['channel_name'] == channel_name)
-                ]
-
-            # 订单总数（基于下单时间）
-            order_total_count = len(order_group)
-
-            # 筛选完成时间在指定范围内的订单
-            finish_group = order_group.copy()
-
-            finish_mask = finish_group['finish_time_parsed'].notna()
-
-            if finish_start_dt:
-                finish_mask = finish_mask & (finish_group['finish_time_parsed'] >= finish_start_dt)
-            if finish_end_dt:
-                finish_mask = finish_mask & (finish_group['finish_time_parsed'] <= finish_end_dt)
-
-            finish_filtered = finish_group[finish_mask]
-
-            # 计算无效订单总数（基于完成时间）
-            # bonus_text = '无效' 的订单
-            invalid_orders = finish_filtered[finish_filtered['bonus_text'] == '无效']
-            invalid_order_count = len(invalid_orders)
-
-            # 计算违规订单数（基于完成时间）
-            # bonus_invalid_text = '无效-风险订单' 或 '无效-违规订单'
-            violation_orders = finish_filtered[
-                (finish_filtered['bonus_invalid_text'] == '无效-风险订单') |
-                (finish_filtered['bonus_invalid_text'] == '无效-违规订单')
-                ]
-            violation_order_count = len(violation_orders)
-
-            # 计算违规率
-            violation_rate = violation_order_count / order_total_count if order_total_count > 0 else 0
-
-            # 创建结果字典
-            result_dict = {
-                '项目名称': project_name,
-                '渠道名称': channel_name,
-                '订单总数': order_total_count,  # 基于下单时间
-                '无效订单总数': invalid_order_count,  # 基于完成时间
-                '违规订单数': violation_order_count,  # 基于完成时间
-                '违规率': f"{violation_rate:.2%}"
-            }
-
-            results.append(result_dict)
-
-        # 转换为 DataFrame
-        result_df = pd.DataFrame(results)
-
-        # 按项目名称排序
-        result_df = result_df.sort_values('项目名称', ascending=True)
-
-        return {
-            'analysis_result': result_df,
-            'order_filtered_data': order_filtered_df,
-            'total_combinations': len(project_channel_combinations),
-            'order_total_count': len(order_filtered_df)
-        }
 
+def finish_load_job():
+    """后台预计算完成后，用缓存中的结果加载数据（替换快速预览）"""
+    load_job = st.session_state.load_job
+    job = st.session_state.analysis_jobs.get('load')
+    if load_job is None or job is None or not job['future'].done():
+        return
+
+    st.session_state.load_job = None
+    st.session_state.preview_result = None
+    release_job('load')
+    error = job['future'].exception()
+    if error is not None:
+        st.error(f"❌ 读取文件失败: {error}")
+        return
+
+    engine = job['future'].result()
+    if engine != load_job['engine']:
+        st.session_state.load_plan = {'engine': engine, 'reason': "整体加载时内存不足，改为流式分析"}
+    if hasattr(load_job['source'], 'seek'):
+        load_job['source'].seek(0)
+    try:
+        load_dataset_with_engine(load_job['source'], load_job['file_hash'], engine, load_job['chunk_size'])
     except Exception as e:
-        st.error(f"❌ 分析违规率统计时出错: {e}")
-        import traceback
-        st.error(traceback.format_exc())
-        return None
+        st.error(f"❌ 读取文件失败: {e}")
+        return
+    st.rerun()
+
+
+@st.fragment(run_every=1)
+def show_load_progress():
+    """每秒刷新一次后台预计算进度，完成后刷新整个页面"""
+    job = st.session_state.analysis_jobs.get('load')
+    if job is None or job['future'].done():
+        st.rerun()
+    progress = job['progress']
+    st.progress(progress.get('fraction', 0.0),
+                text=f"⏳ 后台预计算：{progress.get('stage', '排队中')}"
+                     f"（已用时 {time.monotonic() - job['submitted_at']:.0f} 秒）")
+
+
+def show_violation_preview(preview):
+    """显示快速预览：各组合违规率和违规GMV占比的估计值及置信区间"""
+    st.markdown("""
+    <div class="custom-card">
+        <h3>⚡ 快速预览（分层抽样估计）</h3>
+    </div>
+    """, unsafe_allow_html=True)
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.info(f"📊 样本订单数：{preview['sample_rows']:,}")
+    with col2:
+        st.info(f"📊 估计数据总行数：{preview['estimated_total_rows']:,}")
+    with col3:
+        st.info(f"📊 置信水平：{preview['confidence']:.0%}")
+
+    preview_df = preview['preview_result']
+    st.dataframe(
+        preview_df,
+        use_container_width=True,
+        height=500,
+        column_config=build_column_config(preview_df)
+    )
+    st.caption("精确结果计算完成后自动替换估计值")
+
+
+def load_current_dataset():
+    """返回当前数据及加载时解析好的时间列"""
+    if st.session_state.uploaded_file is None and st.session_state.local_file_path is not None:
+        load_csv_dataset(st.session_state.local_file_path, hash_file(st.session_state.local_file_path))
+
+    df = st.session_state.uploaded_file
+    if df is not None and (st.session_state.parsed_times is None or st.session_state.dataset_hash is None):
+        set_current_dataset(df)
+
+    return df, st.session_state.parsed_times
 
 
 # ==================== 页面1：上传数据文件 ====================
+def show_dataset_summary(file_name, total_records, preview_df):
+    """显示已加载文件的基本信息和数据预览"""
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.info(f"📊 文件：{file_name}")
+    with col2:
+        st.info(f"📊 数据行数：{total_records:,}")
+    with col3:
+        st.info(f"📊 数据列数：{len(preview_df.columns)}")
+
+    # 显示列名预览
+    with st.expander("📋 查看数据列名", expanded=False):
+        st.write("数据列：", list(preview_df.columns))
+
+    # 显示数据预览
+    with st.expander("👀 预览数据（前10行）", expanded=False):
+        st.dataframe(preview_df, use_container_width=True)
+
+
 def page_upload_data():
     """上传数据文件页面"""
     st.markdown("""
@@ -1682,6 +1876,39 @@ def page_upload_data():
     </div>
     """, unsafe_allow_html=True)
 
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.session_state.load_analysis_columns_only = st.checkbox(
+            "仅加载分析所需列",
+            value=st.session_state.load_analysis_columns_only,
+            help="只读取两个分析页面用到的列，可以明显减少内存占用；导出的原始数据也只包含这些列"
+        )
+
+    with col2:
+        st.session_state.stream_mode = st.checkbox(
+            "流式分析模式（超大文件）",
+            value=st.session_state.stream_mode,
+            help="分块读取文件并合并各块的聚合结果，内存占用只取决于分块大小；该模式下不保留原始数据，无法导出原始数据"
+        )
+
+    st.session_state.fast_preview = st.checkbox(
+        "快速预览（抽样估计）",
+        value=st.session_state.fast_preview,
+        help="按项目-渠道组合分层抽样，几秒内先显示违规率和违规GMV占比的估计值及置信区间，"
+             "精确结果在后台计算，完成后自动替换"
+    )
+
+    if st.session_state.stream_mode:
+        st.session_state.stream_chunk_size = st.number_input(
+            "每块读取行数",
+            min_value=10000,
+            max_value=5000000,
+            step=50000,
+            value=st.session_state.stream_chunk_size,
+            help="分块越小，峰值内存越低"
+        )
+
     uploaded_file = st.file_uploader(
         "选择CSV文件",
         type=["csv"],
@@ -1691,33 +1918,73 @@ def page_upload_data():
 
     if uploaded_file is not None:
         try:
-            # 尝试读取文件
+            # 尝试读取文件（同一文件只读取和解析一次）
             with st.spinner("正在读取文件..."):
-                df = pd.read_csv(uploaded_file)
-                st.session_state.uploaded_file = df
-                st.session_state.local_file_path = None
+                load_id = (uploaded_file.file_id, st.session_state.load_analysis_columns_only,
+                           st.session_state.stream_mode, st.session_state.analysis_engine,
+                           st.session_state.fast_preview)
+                if st.session_state.uploaded_file_id != load_id:
+                    file_data = uploaded_file.getvalue()
+                    load_dataset_file(io.BytesIO(file_data), hash_bytes(file_data))
+                    st.session_state.uploaded_file_id = load_id
+                    st.session_state.local_file_path = None
+
+            streamed_result = st.session_state.streamed_result
+            query_source = st.session_state.query_source
+            df = st.session_state.uploaded_file
+            if streamed_result is not None:
+                st.success("✅ 文件流式分析完成！")
+                preview_df = pd.read_csv(io.BytesIO(uploaded_file.getvalue()), nrows=10)
+                show_dataset_summary(uploaded_file.name, streamed_result['total_records'], preview_df)
+            elif query_source is not None:
+                st.success(f"✅ 文件加载成功！（{QUERY_ENGINES[query_source['engine']]['name']}直接查询文件）")
+                preview_df = pd.read_csv(io.BytesIO(uploaded_file.getvalue()), nrows=10)
+                show_dataset_summary(uploaded_file.name, query_source['total_records'], preview_df)
+            elif df is not None:
                 st.success("✅ 文件上传成功！")
-
-                # 显示文件信息
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.info(f"📊 文件：{uploaded_file.name}")
-                with col2:
-                    st.info(f"📊 数据行数：{len(df):,}")
-                with col3:
-                    st.info(f"📊 数据列数：{len(df.columns)}")
-
-                # 显示列名预览
-                with st.expander("📋 查看数据列名", expanded=False):
-                    st.write("数据列：", list(df.columns))
-
-                # 显示数据预览
-                with st.expander("👀 预览数据（前10行）", expanded=False):
-                    st.dataframe(df.head(10), use_container_width=True)
+                show_dataset_summary(uploaded_file.name, len(df), df.head(10))
+            elif st.session_state.load_job is not None:
+                st.success("✅ 文件上传成功！正在后台读取和分析数据")
+                show_load_progress()
+                preview_df = pd.read_csv(io.BytesIO(uploaded_file.getvalue()), nrows=10)
+                with st.expander("👀 预览数据（前10行）", expanded=True):
+                    st.dataframe(preview_df, use_container_width=True)
+            show_load_plan()
 
         except Exception as e:
             st.error(f"❌ 读取文件失败: {e}")
 
+    # 服务器本地文件（无法通过浏览器上传的超大文件）
+    with st.expander("📂 使用服务器本地文件", expanded=False):
+        local_path = st.text_input(
+            "本地文件路径",
+            value=st.session_state.local_file_path or "",
+            placeholder="/data/orders.csv"
+        )
+
+        if st.button("📂 加载本地文件", use_container_width=True):
+            if not os.path.isfile(local_path):
+                st.error("❌ 文件不存在")
+            else:
+                try:
+                    with st.spinner("正在读取文件..."):
+                        load_dataset_file(local_path, hash_file(local_path))
+                    st.session_state.local_file_path = local_path
+                    st.session_state.uploaded_file_id = None
+
+                    if st.session_state.streamed_result is not None:
+                        st.success(f"✅ 本地文件流式分析完成！数据行数：{st.session_state.streamed_result['total_records']:,}")
+                    elif st.session_state.query_source is not None:
+                        st.success(f"✅ 本地文件加载成功！数据行数：{st.session_state.query_source['total_records']:,}")
+                    elif st.session_state.uploaded_file is not None:
+                        st.success(f"✅ 本地文件加载成功！数据行数：{len(st.session_state.uploaded_file):,}")
+                    elif st.session_state.load_job is not None:
+                        st.success("✅ 本地文件已开始后台读取和分析，完成后各分析页面直接显示结果")
+                        show_load_progress()
+                    show_load_plan()
+                except Exception as e:
+                    st.error(f"❌ 读取文件失败: {e}")
+
     # 数据格式要求
     st.markdown("""
     <div class="custom-card" style="margin-top: 30px;">
@@ -1769,7 +2036,7 @@ def page_upload_data():
 
     with col2:
         if st.button("🚀 开始分析", use_container_width=True, type="primary"):
-            if st.session_state.uploaded_file is not None:
+            if has_current_dataset():
                 st.session_state.current_page = "违规率分析"
                 st.rerun()
             else:
@@ -1777,154 +2044,23 @@ def page_upload_data():
 
 
 # ==================== 页面2：违规率分析 ====================
-def page_violation_analysis():
-    """违规率分析页面"""
-    st.markdown("""
-    <div class="custom-card fade-in">
-        <h2>📈 违规率分析</h2>
-        <p>完整数据分析，包含GMV、违规率等多维度分析</p>
-    </div>
-    """, unsafe_allow_html=True)
-
-    # 检查是否有数据文件
-    if st.session_state.uploaded_file is None and st.session_state.local_file_path is None:
-        st.warning("⚠️ 请先上传数据文件")
-        if st.button("📤 前往上传数据文件", use_container_width=True):
-            st.session_state.current_page = "上传数据文件"
-            st.rerun()
-        return
-
-    # 确定使用哪个文件
-    df = None
-    try:
-        if st.session_state.uploaded_file is not None:
-            df = st.session_state.uploaded_file
-        elif st.session_state.local_file_path is not None:
-            df = pd.read_csv(st.session_state.local_file_path)
-    except Exception as e:
-        st.error(f"❌ 读取数据失败: {e}")
-        return
-
-    if df is None:
-        st.error("❌ 无法读取数据文件")
-        return
-
-    # 显示原始数据预览
-    if st.session_state.show_raw_data:
-        with st.expander("📋 原始数据预览", expanded=False):
-            st.dataframe(df.head(100), use_container_width=True)
-            st.info(f"数据总行数: {len(df)}")
-            st.info(f"数据列: {', '.join(df.columns.tolist())}")
-
-    # 完整数据分析
-    with st.spinner("正在进行完整数据分析..."):
-        analysis_result = analyze_complete_data(df)
-
-    if analysis_result is None:
-        st.warning("⚠️ 数据分析失败，请检查数据格式")
-        return
-
-    result_df = analysis_result['analysis_result']
-    filtered_df = analysis_result['filtered_data']
-    total_combinations = analysis_result['total_combinations']
-    total_records = analysis_result['total_records']
-    use_project_code = analysis_result['use_project_code']
-
-    if result_df.empty:
-        st.info("没有符合条件的项目数据")
-        return
-
-    # 显示整体概览
-    st.markdown("""
-    <div class="custom-card">
-        <h3>📈 完整数据分析概览</h3>
-    </div>
-    """, unsafe_allow_html=True)
-
-    # 关键指标汇总
-    total_orders = result_df['订单总数'].sum()
-    total_estimate_gmv = sum([float(x) for x in result_df['预估计佣GMV']])
-    total_actual_gmv = sum([float(x) for x in result_df['实际计佣GMV']])
-    total_violation = result_df['无效-违规订单数'].sum() + result_df['无效-风险订单数'].sum()
-
-    # 使用列布局显示指标卡片
-    col1, col2, col3, col4 = st.columns(4)
-
-    with col1:
-        st.markdown(f"""
-        <div class="stat-card">
-            <div class="stat-value">{total_records:,}</div>
-            <div class="stat-label">原始数据总行数</div>
-        </div>
-        """, unsafe_allow_html=True)
-
-    with col2:
-        st.markdown(f"""
-        <div class="stat-card">
-            <div class="stat-value">{total_combinations:,}</div>
-            <div class="stat-label">项目-渠道组合数</div>
-        </div>
-        """, unsafe_allow_html=True)
-
-    with col3:
-        st.markdown(f"""
-        <div class="stat-card">
-            <div class="stat-value">¥{total_estimate_gmv:,.0f}</div>
-            <div class="stat-label">总预估计佣GMV</div>
-        </div>
-        """, unsafe_allow_html=True)
-
-    with col4:
-        st.markdown(f"""
-        <div class="stat-card">
-            <div class="stat-value">{total_violation:,}</div>
-            <div class="stat-label">总违规+风险订单</div>
-        </div>
-        """, unsafe_allow_html=True)
-
-    # 显示排序信息
-    if use_project_code:
-        st.success("✅ 已按项目编号排序")
-    else:
-        st.info("ℹ️ 已按项目名称排序（未检测到项目编号列）")
-
-    # 详细分析表格
-    st.markdown("""
-    <div class="custom-card">
-        <h3>📊 详细分析表格</h3>
-    </div>
-    """, unsafe_allow_html=True)
-
-    if st.session_state.show_detailed_analysis:
-        # 显示完整分析表格
-        st.dataframe(
-            result_df,
-            use_container_width=True,
-            height=500
-        )
-
+@st.fragment
+def show_analysis_charts(result_df):
+    """分析图表和项目汇总选项卡"""
     # 创建选项卡查看不同部分
     tab1, tab2, tab3 = st.tabs(["📈 违规分析", "💰 GMV分析", "📊 项目汇总"])
 
     with tab1:
         st.markdown("### 违规分析概览")
 
-        # 提取数值数据用于图表
-        violation_data = []
-        for _, row in result_df.iterrows():
-            violation_rate = float(row['违规率'].replace('%', ''))
-            violation_gmv_rate = float(row['违规GMV占比'].replace('%', ''))
-            project_violation_rate = float(row['项目违规率'].replace('%', ''))
-
-            violation_data.append({
-                '项目': row['项目名称'],
-                '渠道': row['渠道名称'],
-                '违规率': violation_rate,
-                '违规GMV占比': violation_gmv_rate,
-                '项目违规率': project_violation_rate
-            })
-
-        violation_df = pd.DataFrame(violation_data)
+        # 提取数值数据用于图表（占比以百分数显示）
+        violation_df = pd.DataFrame({
+            '项目': result_df['项目名称'],
+            '渠道': result_df['渠道名称'],
+            '违规率': result_df['违规率'] * 100,
+            '违规GMV占比': result_df['违规GMV占比'] * 100,
+            '项目违规率': result_df['项目违规率'] * 100
+        })
 
         if not violation_df.empty and st.session_state.show_charts:
             col1, col2 = st.columns(2)
@@ -1981,23 +2117,8 @@ def page_violation_analysis():
         st.markdown("### GMV分析概览")
 
         # 提取GMV数据
-        gmv_data = []
-        for _, row in result_df.iterrows():
-            estimate_gmv = float(row['预估计佣GMV'])
-            actual_gmv = float(row['实际计佣GMV'])
-            violation_gmv = float(row['无效-违规订单GMV'])
-            risk_gmv = float(row['无效-风险订单GMV'])
-
-            gmv_data.append({
-                '项目': row['项目名称'],
-                '渠道': row['渠道名称'],
-                '预估计佣GMV': estimate_gmv,
-                '实际计佣GMV': actual_gmv,
-                '无效-违规订单GMV': violation_gmv,
-                '无效-风险订单GMV': risk_gmv
-            })
-
-        gmv_df = pd.DataFrame(gmv_data)
+        gmv_df = result_df[['项目名称', '渠道名称', '预估计佣GMV', '实际计佣GMV', '无效-违规订单GMV', '无效-风险订单GMV']].rename(
+            columns={'项目名称': '项目', '渠道名称': '渠道'})
 
         if not gmv_df.empty and st.session_state.show_charts:
             # 预估vs实际GMV对比
@@ -2056,23 +2177,29 @@ def page_violation_analysis():
         if '项目编号' in result_df.columns:
             summary_df = result_df.groupby(['项目编号', '项目名称']).agg({
                 '订单总数': 'sum',
-                '预估计佣GMV': lambda x: sum([float(v) for v in x]),
-                '实际计佣GMV': lambda x: sum([float(v) for v in x]),
+                '预估计佣GMV': 'sum',
+                '实际计佣GMV': 'sum',
                 '无效-违规订单数': 'sum',
                 '无效-风险订单数': 'sum',
-                '违规率': lambda x: np.mean([float(str(v).replace('%', '')) for v in x])
+                '违规率': 'mean'
             }).reset_index()
 
-            summary_df['预估计佣GMV'] = summary_df['预估计佣GMV'].apply(lambda x: f"¥{x:,.2f}")
-            summary_df['实际计佣GMV'] = summary_df['实际计佣GMV'].apply(lambda x: f"¥{x:,.2f}")
-            summary_df['违规率'] = summary_df['违规率'].apply(lambda x: f"{x:.2f}%")
-
             st.dataframe(
                 summary_df,
                 use_container_width=True,
-                height=300
+                height=300,
+                column_config=build_column_config(summary_df, amount_format="¥%.2f")
             )
 
+
+@st.fragment
+def show_analysis_exports(analysis_result):
+    """分析报告导出，点击按钮时只重新运行这一部分"""
+    result_df = analysis_result['analysis_result']
+    filtered_df = analysis_result['filtered_data']
+    params = (analysis_result['fixed_point'],)
+    report_date = result_report_date(result_df)
+
     # 导出功能
     st.markdown("---")
     st.markdown("""
@@ -2085,75 +2212,211 @@ def page_violation_analysis():
 
     with col1:
         # 导出详细分析报告
-        csv_buffer = io.StringIO()
-        result_df.to_csv(csv_buffer, index=False, encoding='utf-8-sig')
-
-        st.download_button(
-            label="📥 下载完整分析报告",
-            data=csv_buffer.getvalue(),
-            file_name=f"违规率分析报告_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv",
-            use_container_width=True
+        export_download_button(
+            "完整分析报告", 'analysis_csv', params,
+            lambda: build_csv_export(result_df),
+            f"违规率分析报告_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            "text/csv",
+            report_date
         )
 
     with col2:
-        # 导出原始数据
-        csv_buffer2 = io.StringIO()
-        filtered_df.to_csv(csv_buffer2, index=False, encoding='utf-8-sig')
-
-        st.download_button(
-            label="📥 下载原始数据",
-            data=csv_buffer2.getvalue(),
-            file_name=f"原始数据_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv",
-            use_container_width=True
-        )
+        # 导出原始数据（流式分析模式和查询引擎下不保留原始数据）
+        if filtered_df is not None:
+            raw_data_download_button("原始数据", 'raw', (), filtered_df)
+        else:
+            st.info("ℹ️ 流式分析模式和查询引擎下不保留原始数据")
 
     with col3:
         # 导出完整报告（Excel）
-        excel_buffer = io.BytesIO()
-        with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-            result_df.to_excel(writer, sheet_name='详细分析', index=False)
-            filtered_df.to_excel(writer, sheet_name='原始数据', index=False)
-
-            # 创建项目汇总
-            if use_project_code and '项目编号' in result_df.columns:
-                summary_df = result_df.groupby(['项目编号', '项目名称']).agg({
-                    '订单总数': 'sum',
-                    '预估计佣GMV': lambda x: sum([float(v) for v in x]),
-                    '实际计佣GMV': lambda x: sum([float(v) for v in x]),
-                    '无效-违规订单数': 'sum',
-                    '无效-风险订单数': 'sum'
-                }).reset_index()
-
-                summary_df['预估计佣GMV'] = summary_df['预估计佣GMV'].apply(lambda x: f"¥{x:,.2f}")
-                summary_df['实际计佣GMV'] = summary_df['实际计佣GMV'].apply(lambda x: f"¥{x:,.2f}")
-                summary_df.to_excel(writer, sheet_name='项目汇总', index=False)
-
-            # 添加统计信息
-            total_stats = {
-                '总项目-渠道组合数': len(result_df),
-                '总订单数': result_df['订单总数'].sum(),
-                '总预估计佣GMV': sum([float(x) for x in result_df['预估计佣GMV']]),
-                '总实际计佣GMV': sum([float(x) for x in result_df['实际计佣GMV']]),
-                '总无效-违规订单数': result_df['无效-违规订单数'].sum(),
-                '总无效-风险订单数': result_df['无效-风险订单数'].sum(),
-                '分析时间': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                '数据来源': '违规率分析'
-            }
-            stats_df = pd.DataFrame([total_stats])
-            stats_df.to_excel(writer, sheet_name='统计汇总', index=False)
-
-        excel_buffer.seek(0)
-
-        st.download_button(
-            label="📥 下载完整报告 (Excel)",
-            data=excel_buffer.getvalue(),
-            file_name=f"违规率分析报告_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            use_container_width=True
+        export_download_button(
+            "完整报告 (Excel)", 'analysis_excel', params,
+            lambda: build_analysis_workbook(analysis_result),
+            f"违规率分析报告_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            report_date
+        )
+
+        # 导出结果表（Parquet / Arrow），保留数值类型，供BI工具直接加载
+        if pa is not None:
+            table_format = st.selectbox(
+                "结果表导出格式",
+                list(TABLE_EXPORT_LABELS),
+                format_func=lambda name: TABLE_EXPORT_LABELS[name],
+                key="analysis_table_export_format",
+                help="详细分析、项目汇总和统计汇总各一个文件，占比和金额保留为数值"
+            )
+            export_download_button(
+                f"结果表 ({TABLE_EXPORT_LABELS[table_format]})", f"analysis_{table_format}", params,
+                lambda: build_analysis_tables_archive(analysis_result, table_format),
+                f"违规率分析结果表_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+                "application/zip",
+                report_date
+            )
+
+
+def page_violation_analysis():
+    """违规率分析页面"""
+    st.markdown("""
+    <div class="custom-card fade-in">
+        <h2>📈 违规率分析</h2>
+        <p>完整数据分析，包含GMV、违规率等多维度分析</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # 检查是否有数据文件
+    if not has_current_dataset():
+        st.warning("⚠️ 请先上传数据文件")
+        if st.button("📤 前往上传数据文件", use_container_width=True):
+            st.session_state.current_page = "上传数据文件"
+            st.rerun()
+        return
+
+    # 后台预计算完成前显示进度（开启快速预览时同时显示抽样估计结果）
+    if st.session_state.load_job is not None:
+        show_load_progress()
+        if st.session_state.preview_result is not None:
+            show_violation_preview(st.session_state.preview_result)
+        return
+
+    # 流式分析模式下直接使用合并后的分析结果
+    streamed_result = st.session_state.streamed_result
+    query_source = st.session_state.query_source
+    if streamed_result is not None:
+        analysis_result = streamed_result['complete_analysis']
+    elif query_source is not None:
+        # 查询引擎直接在数据文件上聚合，只返回结果表
+        fixed_point = st.session_state.fixed_point_gmv
+        engine = QUERY_ENGINES[query_source['engine']]
+        analysis_result = get_job_result(
+            'analysis',
+            'analyze_complete_data',
+            st.session_state.dataset_hash,
+            (fixed_point,),
+            lambda: engine['analyze_complete_data'](query_source['path'], fixed_point),
+            f"正在使用{engine['name']}进行完整数据分析...",
+            "分析数据时出错"
+        )
+    else:
+        # 确定使用哪个文件
+        df = None
+        try:
+            df, _ = load_current_dataset()
+        except Exception as e:
+            st.error(f"❌ 读取数据失败: {e}")
+            return
+
+        if df is None:
+            st.error("❌ 无法读取数据文件")
+            return
+
+        # 显示原始数据预览
+        if st.session_state.show_raw_data:
+            with st.expander("📋 原始数据预览", expanded=False):
+                st.dataframe(df.head(100), use_container_width=True)
+                st.info(f"数据总行数: {len(df)}")
+                st.info(f"数据列: {', '.join(df.columns.tolist())}")
+
+        # 完整数据分析
+        price_cents = load_price_cents(df)
+        workers = st.session_state.worker_count
+        analysis_result = get_job_result(
+            'analysis',
+            'analyze_complete_data',
+            st.session_state.dataset_hash,
+            (price_cents is not None,),
+            lambda: analyze_complete_data(df, price_cents, workers=workers),
+            "正在进行完整数据分析...",
+            "分析数据时出错"
+        )
+
+    if analysis_result is None:
+        st.warning("⚠️ 数据分析失败，请检查数据格式")
+        return
+
+    result_df = analysis_result['analysis_result']
+    total_combinations = analysis_result['total_combinations']
+    total_records = analysis_result['total_records']
+    use_project_code = analysis_result['use_project_code']
+
+    if result_df.empty:
+        st.info("没有符合条件的项目数据")
+        return
+
+    # 显示整体概览
+    st.markdown("""
+    <div class="custom-card">
+        <h3>📈 完整数据分析概览</h3>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # 关键指标汇总
+    total_orders = result_df['订单总数'].sum()
+    total_estimate_gmv = sum_amount(result_df['预估计佣GMV'], analysis_result['fixed_point'])
+    total_actual_gmv = sum_amount(result_df['实际计佣GMV'], analysis_result['fixed_point'])
+    total_violation = result_df['无效-违规订单数'].sum() + result_df['无效-风险订单数'].sum()
+
+    # 使用列布局显示指标卡片
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        st.markdown(f"""
+        <div class="stat-card">
+            <div class="stat-value">{total_records:,}</div>
+            <div class="stat-label">原始数据总行数</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with col2:
+        st.markdown(f"""
+        <div class="stat-card">
+            <div class="stat-value">{total_combinations:,}</div>
+            <div class="stat-label">项目-渠道组合数</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with col3:
+        st.markdown(f"""
+        <div class="stat-card">
+            <div class="stat-value">¥{total_estimate_gmv:,.0f}</div>
+            <div class="stat-label">总预估计佣GMV</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with col4:
+        st.markdown(f"""
+        <div class="stat-card">
+            <div class="stat-value">{total_violation:,}</div>
+            <div class="stat-label">总违规+风险订单</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    # 显示排序信息
+    if use_project_code:
+        st.success("✅ 已按项目编号排序")
+    else:
+        st.info("ℹ️ 已按项目名称排序（未检测到项目编号列）")
+
+    # 详细分析表格
+    st.markdown("""
+    <div class="custom-card">
+        <h3>📊 详细分析表格</h3>
+    </div>
+    """, unsafe_allow_html=True)
+
+    if st.session_state.show_detailed_analysis:
+        # 显示完整分析表格
+        st.dataframe(
+            result_df,
+            use_container_width=True,
+            height=500,
+            column_config=build_column_config(result_df)
         )
 
+    show_analysis_charts(result_df)
+
+    show_analysis_exports(analysis_result)
+
     # 计算公式说明
     with st.expander("📖 计算公式说明", expanded=False):
         st.markdown("""
@@ -2180,43 +2443,41 @@ def page_violation_analysis():
 
 
 # ==================== 页面3：违规率统计 ====================
-def page_violation_statistics():
-    """违规率统计页面"""
+@st.fragment
+def show_statistics_exports(result_df, order_filtered_df, statistics_params):
+    """统计结果导出，按统计的时间范围缓存生成的文件"""
+    # 导出功能
+    st.markdown("---")
     st.markdown("""
-    <div class="custom-card fade-in">
-        <h2>📊 违规率统计</h2>
-        <p>按时间维度统计订单和违规情况</p>
+    <div class="custom-card">
+        <h3>💾 导出统计结果</h3>
     </div>
     """, unsafe_allow_html=True)
 
-    # 检查是否有数据文件
-    if st.session_state.uploaded_file is None and st.session_state.local_file_path is None:
-        st.warning("⚠️ 请先上传数据文件")
-        if st.button("📤 前往上传数据文件", use_container_width=True):
-            st.session_state.current_page = "上传数据文件"
-            st.rerun()
-        return
+    col1, col2 = st.columns(2)
 
-    # 确定使用哪个文件
-    df = None
-    try:
-        if st.session_state.uploaded_file is not None:
-            df = st.session_state.uploaded_file
-        elif st.session_state.local_file_path is not None:
-            df = pd.read_csv(st.session_state.local_file_path)
-    except Exception as e:
-        st.error(f"❌ 读取数据失败: {e}")
-        return
+    with col1:
+        # 导出统计报告
+        export_download_button(
+            "统计报告", 'statistics_csv', statistics_params,
+            lambda: build_csv_export(result_df),
+            f"违规率统计报告_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            "text/csv"
+        )
 
-    if df is None:
-        st.error("❌ 无法读取数据文件")
-        return
+    with col2:
+        # 导出筛选后的数据（流式分析模式和查询引擎下不保留原始数据）
+        if order_filtered_df is not None:
+            raw_data_download_button("筛选数据", 'filtered', statistics_params, order_filtered_df)
+        else:
+            st.info("ℹ️ 流式分析模式和查询引擎下不保留原始数据")
 
-    # 显示原始数据预览
-    with st.expander("📋 原始数据预览", expanded=False):
-        st.dataframe(df.head(100), use_container_width=True)
-        st.info(f"数据总行数: {len(df)}")
-        st.info(f"数据列: {', '.join(df.columns.tolist())}")
+
+@st.fragment
+def statistics_panel(df, parsed_times, streamed_result, query_source):
+    """时间范围设置、执行统计和统计结果（修改日期只重新运行这一部分，不重新运行整个页面）"""
+    if query_source is not None:
+        engine = QUERY_ENGINES[query_source['engine']]
 
     # 时间选择器部分
     st.markdown("""
@@ -2234,8 +2495,8 @@ def page_violation_statistics():
         """, unsafe_allow_html=True)
 
         # 获取数据中的最小和最大下单时间
-        df['order_time_parsed'] = df['order_time'].apply(parse_date)
-        valid_order_times = df['order_time_parsed'].dropna()
+        order_times = parsed_times.get('order_time')
+        valid_order_times = order_times.dropna() if order_times is not None else pd.Series(dtype='datetime64[ns]')
 
         if not valid_order_times.empty:
             min_order_time = valid_order_times.min()
@@ -2281,8 +2542,8 @@ def page_violation_statistics():
         """, unsafe_allow_html=True)
 
         # 获取数据中的最小和最大完成时间
-        df['finish_time_parsed'] = df['finish_time'].apply(parse_date)
-        valid_finish_times = df['finish_time_parsed'].dropna()
+        finish_times = parsed_times.get('finish_time')
+        valid_finish_times = finish_times.dropna() if finish_times is not None else pd.Series(dtype='datetime64[ns]')
 
         if not valid_finish_times.empty:
             min_finish_time = valid_finish_times.min()
@@ -2321,16 +2582,65 @@ def page_violation_statistics():
             f"查询时间范围: {finish_start_dt.strftime('%Y-%m-%d')} 至 {finish_end_dt.strftime('%Y-%m-%d')}")
         st.markdown('</div>', unsafe_allow_html=True)
 
-    # 添加统计按钮
+    # 添加统计按钮（统计在后台任务中执行，结果保留到时间范围修改为止）
+    statistics_params = (order_start_dt, order_end_dt, finish_start_dt, finish_end_dt)
     if st.button("🚀 执行统计", use_container_width=True, type="primary"):
-        with st.spinner("正在进行违规率统计..."):
-            # 执行违规率统计
-            analysis_result = analyze_violation_statistics(
-                df,
-                order_start_dt,
-                order_end_dt,
-                finish_start_dt,
-                finish_end_dt
+        st.session_state.statistics_params = statistics_params
+    elif st.session_state.statistics_params != statistics_params:
+        # 时间范围已修改：放弃还未完成的统计任务，需要重新执行统计
+        st.session_state.statistics_params = None
+        release_job('statistics')
+
+    if st.session_state.statistics_params is not None:
+        # 执行违规率统计
+        if query_source is not None:
+            analysis_result = get_job_result(
+                'statistics',
+                'analyze_violation_statistics',
+                st.session_state.dataset_hash,
+                statistics_params,
+                lambda: engine['analyze_violation_statistics'](
+                    query_source['path'],
+                    order_start_dt,
+                    order_end_dt,
+                    finish_start_dt,
+                    finish_end_dt
+                ),
+                "正在进行违规率统计...",
+                "分析违规率统计时出错"
+            )
+        elif streamed_result is not None:
+            analysis_result = run_analysis(
+                lambda: analyze_violation_cube(
+                    streamed_result['violation_cube'],
+                    order_start_dt,
+                    order_end_dt,
+                    finish_start_dt,
+                    finish_end_dt
+                ),
+                "分析违规率统计时出错"
+            )
+        else:
+            violation_cube = st.session_state.violation_cube
+            statistics_index = st.session_state.statistics_index
+            analysis_result = get_job_result(
+                'statistics',
+                'analyze_violation_statistics',
+                st.session_state.dataset_hash,
+                statistics_params,
+                lambda: analyze_violation_statistics(
+                    df,
+                    order_start_dt,
+                    order_end_dt,
+                    finish_start_dt,
+                    finish_end_dt,
+                    order_times=order_times,
+                    finish_times=finish_times,
+                    cube=violation_cube,
+                    index=statistics_index
+                ),
+                "正在进行违规率统计...",
+                "分析违规率统计时出错"
             )
 
         if analysis_result is not None:
@@ -2413,7 +2723,8 @@ def page_violation_statistics():
             st.dataframe(
                 result_df,
                 use_container_width=True,
-                height=400
+                height=400,
+                column_config=build_column_config(result_df)
             )
 
             # 可视化图表
@@ -2426,9 +2737,8 @@ def page_violation_statistics():
             col1, col2 = st.columns(2)
 
             with col1:
-                # 违规率最高的项目
-                result_df['违规率数值'] = result_df['违规率'].str.replace('%', '').astype(float)
-                top_violation = result_df.nlargest(10, '违规率数值')
+                # 违规率最高的项目（以百分数显示）
+                top_violation = result_df.assign(违规率数值=result_df['违规率'] * 100).nlargest(10, '违规率数值')
 
                 if not top_violation.empty:
                     fig1 = px.bar(
@@ -2478,41 +2788,7 @@ def page_violation_statistics():
                     )
                     st.plotly_chart(fig2, use_container_width=True)
 
-            # 导出功能
-            st.markdown("---")
-            st.markdown("""
-            <div class="custom-card">
-                <h3>💾 导出统计结果</h3>
-            </div>
-            """, unsafe_allow_html=True)
-
-            col1, col2 = st.columns(2)
-
-            with col1:
-                # 导出统计报告
-                csv_buffer = io.StringIO()
-                result_df.to_csv(csv_buffer, index=False, encoding='utf-8-sig')
-
-                st.download_button(
-                    label="📥 下载统计报告",
-                    data=csv_buffer.getvalue(),
-                    file_name=f"违规率统计报告_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
-
-            with col2:
-                # 导出筛选后的数据
-                csv_buffer2 = io.StringIO()
-                order_filtered_df.to_csv(csv_buffer2, index=False, encoding='utf-8-sig')
-
-                st.download_button(
-                    label="📥 下载筛选数据",
-                    data=csv_buffer2.getvalue(),
-                    file_name=f"筛选数据_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
+            show_statistics_exports(result_df, order_filtered_df, statistics_params)
 
             # 统计逻辑说明
             with st.expander("📖 统计逻辑说明", expanded=False):
@@ -2542,6 +2818,71 @@ def page_violation_statistics():
         st.info("👆 请设置时间范围并点击'执行统计'按钮开始分析")
 
 
+def page_violation_statistics():
+    """违规率统计页面"""
+    st.markdown("""
+    <div class="custom-card fade-in">
+        <h2>📊 违规率统计</h2>
+        <p>按时间维度统计订单和违规情况</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # 检查是否有数据文件
+    if not has_current_dataset():
+        st.warning("⚠️ 请先上传数据文件")
+        if st.button("📤 前往上传数据文件", use_container_width=True):
+            st.session_state.current_page = "上传数据文件"
+            st.rerun()
+        return
+
+    # 违规率统计需要精确数据，后台预计算完成后自动刷新
+    if st.session_state.load_job is not None:
+        st.info("ℹ️ 数据正在后台加载，加载完成后即可进行违规率统计")
+        show_load_progress()
+        return
+
+    # 流式分析模式下只使用日期立方体，日期选择范围取立方体中的日期
+    streamed_result = st.session_state.streamed_result
+    query_source = st.session_state.query_source
+    df = None
+    if query_source is not None:
+        # 查询引擎只读取时间列的最小值和最大值作为日期选择范围
+        engine = QUERY_ENGINES[query_source['engine']]
+        parsed_times = get_cached_result(
+            'time_bounds', st.session_state.dataset_hash, (),
+            lambda: run_analysis(lambda: engine['time_bounds'](query_source['path']), "读取时间范围时出错"))
+        if parsed_times is None:
+            return
+    elif streamed_result is not None:
+        cube = streamed_result['violation_cube']
+        if cube is None:
+            st.error("❌ 缺少order_time或finish_time列，无法进行违规率统计")
+            return
+        parsed_times = {
+            'order_time': pd.Series(cube['order_days'], dtype='datetime64[ns]'),
+            'finish_time': pd.Series(cube['finish_days'], dtype='datetime64[ns]')
+        }
+    else:
+        # 确定使用哪个文件
+        try:
+            df, parsed_times = load_current_dataset()
+        except Exception as e:
+            st.error(f"❌ 读取数据失败: {e}")
+            return
+
+        if df is None:
+            st.error("❌ 无法读取数据文件")
+            return
+
+        # 显示原始数据预览
+        with st.expander("📋 原始数据预览", expanded=False):
+            st.dataframe(df.head(100), use_container_width=True)
+            st.info(f"数据总行数: {len(df)}")
+            st.info(f"数据列: {', '.join(df.columns.tolist())}")
+
+    statistics_panel(df, parsed_times, streamed_result, query_source)
+
+
 # ==================== 页面4：分析设置 ====================
 def page_analysis_settings():
     """分析设置页面"""
@@ -2622,6 +2963,43 @@ def page_analysis_settings():
 
         st.markdown("</div>", unsafe_allow_html=True)
 
+    # 计算设置部分
+    st.markdown("""
+    <div class="custom-card" style="margin-top: 20px;">
+        <h3>🧮 计算设置</h3>
+    </div>
+    """, unsafe_allow_html=True)
+
+    st.session_state.fixed_point_gmv = st.checkbox(
+        "定点数计算GMV（精确到分）",
+        value=st.session_state.fixed_point_gmv,
+        help="加载数据时把金额换算为整数分，GMV合计和占比全部用整数计算，合计金额没有浮点误差；"
+             "流式分析模式下需要重新加载文件后生效"
+    )
+
+    engine_names = {'auto': '自动选择（按文件大小和可用内存）',
+                    'pandas': 'pandas（加载到内存）',
+                    **{engine: f"{info['name']}（直接查询文件）" for engine, info in QUERY_ENGINES.items()}}
+    st.session_state.analysis_engine = st.selectbox(
+        "计算引擎",
+        options=list(engine_names),
+        index=list(engine_names).index(st.session_state.analysis_engine),
+        format_func=engine_names.get,
+        help="自动选择时，预计内存占用在可用内存预算内的文件整体加载到内存，超出预算时使用DuckDB或Polars查询文件，"
+             "都未安装时使用流式分析。DuckDB和Polars直接在CSV或列式缓存文件上执行聚合查询，不把数据加载到内存，"
+             "适合千万行以上的数据；该引擎下不保留原始数据，无法导出原始数据。切换后需要重新加载文件"
+    )
+
+    st.session_state.worker_count = st.number_input(
+        "并行进程数",
+        min_value=1,
+        max_value=os.cpu_count() or 1,
+        value=min(st.session_state.worker_count, os.cpu_count() or 1),
+        step=1,
+        help=f"违规率分析按项目分区在多个进程中并行聚合，结果与单进程完全相同；"
+             f"数据少于 {PARALLEL_MIN_ROWS:,} 行或进程数少于 {PARALLEL_MIN_WORKERS} 时单进程计算更快，始终单进程计算"
+    )
+
     # 数据管理部分
     st.markdown("""
     <div class="custom-card" style="margin-top: 20px;">
@@ -2634,23 +3012,36 @@ def page_analysis_settings():
     with col1:
         if st.button("🗑️ 清除所有数据", use_container_width=True, type="secondary"):
             st.session_state.uploaded_file = None
+            st.session_state.uploaded_file_id = None
             st.session_state.local_file_path = None
+            st.session_state.parsed_times = None
+            st.session_state.dataset_hash = None
+            st.session_state.violation_cube = None
+            st.session_state.statistics_index = None
+            st.session_state.streamed_result = None
+            st.session_state.query_source = None
+            st.session_state.preview_result = None
+            st.session_state.load_job = None
+            st.session_state.statistics_params = None
+            release_all_jobs()
             st.success("✅ 已清除所有数据")
 
     with col2:
         if st.button("🔄 重新加载当前文件", use_container_width=True, type="secondary"):
-            if st.session_state.uploaded_file is not None:
-                st.info("ℹ️ 上传的文件已加载")
-            elif st.session_state.local_file_path is not None:
+            if st.session_state.local_file_path is not None:
                 try:
-                    df = pd.read_csv(st.session_state.local_file_path)
-                    if df is not None:
-                        st.session_state.uploaded_file = df
+                    load_dataset_file(st.session_state.local_file_path,
+                                      hash_file(st.session_state.local_file_path))
+                    if (st.session_state.uploaded_file is not None or st.session_state.streamed_result is not None
+                            or st.session_state.query_source is not None):
                         st.success("✅ 文件重新加载成功")
                     else:
                         st.error("❌ 重新加载失败")
                 except Exception as e:
                     st.error(f"❌ 重新加载失败: {e}")
+            elif (st.session_state.uploaded_file is not None or st.session_state.streamed_result is not None
+                  or st.session_state.query_source is not None):
+                st.info("ℹ️ 上传的文件已加载")
             else:
                 st.warning("⚠️ 没有可重新加载的文件")
 
@@ -2658,6 +3049,94 @@ def page_analysis_settings():
         if st.button("💾 保存当前设置", use_container_width=True, type="primary"):
             st.success("✅ 设置已保存")
 
+    # 缓存设置部分
+    st.markdown("""
+    <div class="custom-card" style="margin-top: 20px;">
+        <h3>⚡ 缓存设置</h3>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # 缓存由所有会话共享，设置值直接读写共享的缓存，只在修改时生效
+    result_cache = get_result_cache()
+    export_cache = get_export_cache()
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        st.number_input(
+            "最多缓存结果数",
+            min_value=1,
+            max_value=1000,
+            value=result_cache.max_entries,
+            help="超出数量时淘汰最久未使用的结果（对所有用户生效）",
+            key="cache_max_entries_input",
+            on_change=apply_cache_settings
+        )
+        st.number_input(
+            "最多缓存导出文件数",
+            min_value=1,
+            max_value=100,
+            value=export_cache.max_entries,
+            help="生成过的导出文件按数据、参数和格式缓存，再次下载时不重新生成（对所有用户生效）",
+            key="export_cache_entries_input",
+            on_change=apply_cache_settings
+        )
+        st.number_input(
+            "导出文件缓存内存上限（MB）",
+            min_value=16,
+            max_value=16 * 1024,
+            value=export_cache.max_bytes // 1024 ** 2,
+            help="缓存的导出文件超过上限时淘汰最久未使用的文件（对所有用户生效）",
+            key="export_cache_megabytes_input",
+            on_change=apply_cache_settings
+        )
+
+    with col2:
+        st.number_input(
+            "缓存有效期（分钟）",
+            min_value=1,
+            max_value=24 * 60,
+            value=result_cache.ttl_seconds // 60,
+            help="超过有效期的结果将重新计算（对所有用户生效）",
+            key="cache_ttl_minutes_input",
+            on_change=apply_cache_settings
+        )
+        st.number_input(
+            "结果缓存内存上限（MB）",
+            min_value=64,
+            max_value=64 * 1024,
+            value=result_cache.max_bytes // 1024 ** 2,
+            help="缓存的数据和结果超过上限时淘汰最久未使用的结果（对所有用户生效）",
+            key="cache_max_megabytes_input",
+            on_change=apply_cache_settings
+        )
+
+    with col3:
+        st.caption(f"当前缓存结果数：{len(result_cache)}（约 {result_cache.total_bytes / 1024 ** 2:,.0f} MB），"
+                   f"导出文件数：{len(export_cache)}（约 {export_cache.total_bytes / 1024 ** 2:,.0f} MB）")
+        if st.button("🧹 清空缓存", use_container_width=True, type="secondary"):
+            get_result_cache().clear()
+            get_export_cache().clear()
+            st.success("✅ 缓存已清空")
+
+    col1, col2 = st.columns([2, 1])
+
+    with col1:
+        st.session_state.use_columnar_cache = st.checkbox(
+            "使用列式缓存（Parquet）",
+            value=st.session_state.use_columnar_cache and pa is not None,
+            disabled=pa is None,
+            help="CSV首次加载后转换为Parquet文件，再次加载相同文件时直接读取列式文件，速度更快；需要安装pyarrow"
+        )
+        st.caption(f"缓存目录：{COLUMNAR_CACHE_DIR}")
+
+    with col2:
+        if st.button("🗑️ 清空列式缓存", use_container_width=True, type="secondary"):
+            try:
+                removed = clear_columnar_cache()
+                st.success(f"✅ 已删除 {removed} 个缓存文件")
+            except OSError as e:
+                st.error(f"❌ 清空列式缓存失败: {e}")
+
     # 帮助信息
     st.markdown("""
     <div class="custom-card" style="margin-top: 20px;">
@@ -2707,6 +3186,8 @@ def page_analysis_settings():
 
 # ==================== 主应用逻辑 ====================
 def main():
+    finish_load_job()
+
     # 根据当前页面显示不同内容
     if st.session_state.current_page == "上传数据文件":
         page_upload_data()
@@ -0,0 +1,165 @@
+"""项目违规率分析命令行工具
+
+不启动看板，直接对一个或多个CSV文件生成违规率分析报告和违规率统计报告，适合定时批量生成报告。
+
+示例：
+    python project_invalid_cli.py data/*.csv --output-dir reports --format excel \
+        --order-start 2025-12-01 --order-end 2025-12-31 --finish-start 2025-12-01 --finish-end 2026-01-15 --jobs 4
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from project_invalid_core import (
+    STREAM_CHUNK_SIZE,
+    QUERY_ENGINES,
+    DEFAULT_ENGINE,
+    AnalysisError,
+    parse_date,
+    read_dataset,
+    dataset_file_path,
+    plan_dataset_load,
+    hash_file,
+    analyze_complete_data,
+    analyze_csv_in_chunks,
+    is_day_aligned_range,
+    analyze_violation_statistics,
+    analyze_violation_cube,
+    build_project_summary,
+    build_total_stats,
+    encode_price_cents,
+    write_report,
+    shutdown_process_pools,
+)
+
+
+def parse_range_bound(text, end=False):
+    """解析命令行中的时间范围；结束时间只写日期时取当天 23:59:59.999999"""
+    value = parse_date(text)
+    if value is None:
+        raise argparse.ArgumentTypeError(f"无法识别的时间: {text}")
+    if end and ':' not in text:
+        value = datetime.combine(value.date(), datetime.max.time())
+    return value
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="生成项目违规率分析报告和违规率统计报告")
+    parser.add_argument('inputs', nargs='+', help="CSV数据文件")
+    parser.add_argument('--output-dir', default='.', help="报告输出目录（默认当前目录）")
+    parser.add_argument('--format', dest='output_format', choices=['csv', 'excel', 'parquet', 'arrow'], default='excel',
+                        help="报告格式（默认excel）：parquet和arrow（Arrow IPC文件）保留数值和日期时间类型，适合导入BI工具")
+    parser.add_argument('--order-start', type=parse_range_bound, help="下单开始时间")
+    parser.add_argument('--order-end', type=lambda text: parse_range_bound(text, end=True), help="下单结束时间")
+    parser.add_argument('--finish-start', type=parse_range_bound, help="完成开始时间")
+    parser.add_argument('--finish-end', type=lambda text: parse_range_bound(text, end=True), help="完成结束时间")
+    parser.add_argument('--statistics', action='store_true',
+                        help="生成违规率统计报告（指定任一时间范围时自动生成）")
+    parser.add_argument('--jobs', type=int, default=1, help="同时处理的文件数（默认1）")
+    parser.add_argument('--stream', action='store_true',
+                        help="分块流式分析，适合超过内存的文件（违规率统计只支持按整天的时间范围）")
+    parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE, help="流式分析每块读取的行数")
+    parser.add_argument('--no-cache', action='store_true', help="不使用列式缓存，每次都重新读取CSV")
+    parser.add_argument('--fixed-point', action='store_true', help="金额按整数分计算，GMV合计精确到分")
+    parser.add_argument('--engine', choices=['auto', 'pandas', *QUERY_ENGINES], default=DEFAULT_ENGINE,
+                        help="计算引擎：auto按文件大小和可用内存自动选择，pandas加载到内存计算，"
+                             "duckdb和polars直接在文件上执行聚合查询（默认取环境变量PROJECT_ANALYSIS_ENGINE，未设置时为auto）")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="单个文件的违规率分析按项目分区并行聚合的进程数（默认1；少于4个进程或400万行时单进程计算更快，不并行）")
+    return parser
+
+
+def time_range(args):
+    return args.order_start, args.order_end, args.finish_start, args.finish_end
+
+
+def wants_statistics(args):
+    return args.statistics or any(bound is not None for bound in time_range(args))
+
+
+def run_report(path, args):
+    """分析一个CSV文件并写出报告，返回写出的文件路径列表"""
+    try:
+        return write_reports(path, args)
+    finally:
+        # run_report 在进程池中执行，退出前关闭并行聚合使用的进程池
+        shutdown_process_pools()
+
+
+def write_reports(path, args):
+    if args.engine == 'auto' and not args.stream:
+        plan = plan_dataset_load(path, analysis_columns_only=True)
+        print(f"{path}: {plan['reason']}")
+        if plan['engine'] == 'stream' and wants_statistics(args) and not is_day_aligned_range(*time_range(args)):
+            raise AnalysisError("文件超出内存预算只能流式分析，流式分析模式下违规率统计只支持按整天的时间范围")
+        args = argparse.Namespace(**{**vars(args), 'engine': plan['engine'],
+                                     'stream': plan['engine'] == 'stream', 'chunk_size': plan['chunk_size']})
+
+    engine = QUERY_ENGINES.get(args.engine)
+    if engine is not None:
+        source_path = path if args.no_cache else dataset_file_path(path, hash_file(path))
+        complete_result = engine['analyze_complete_data'](source_path, args.fixed_point)
+    elif args.stream:
+        streamed_result = analyze_csv_in_chunks(path, args.chunk_size, args.fixed_point)
+        complete_result = streamed_result['complete_analysis']
+    else:
+        df = read_dataset(path, hash_file(path), analysis_columns_only=True, use_columnar_cache=not args.no_cache)
+        complete_result = analyze_complete_data(df, encode_price_cents(df) if args.fixed_point else None,
+                                                workers=max(1, args.workers))
+
+    result_df = complete_result['analysis_result']
+    tables = {'详细分析': result_df}
+    summary_df = build_project_summary(result_df) if complete_result['use_project_code'] else None
+    if summary_df is not None:
+        tables['项目汇总'] = summary_df
+    tables['统计汇总'] = build_total_stats(result_df, complete_result['fixed_point'])
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+    output_paths = write_report(tables, os.path.join(args.output_dir, f"{stem}_违规率分析"), args.output_format)
+
+    if wants_statistics(args):
+        if engine is not None:
+            statistics_result = engine['analyze_violation_statistics'](source_path, *time_range(args))
+        elif args.stream:
+            if streamed_result['violation_cube'] is None:
+                raise AnalysisError("缺少order_time或finish_time列，无法进行违规率统计")
+            statistics_result = analyze_violation_cube(streamed_result['violation_cube'], *time_range(args))
+        else:
+            # 只查询一个时间范围：构建日期立方体或行索引都要完整扫描一遍数据，只构建行索引
+            statistics_result = analyze_violation_statistics(df, *time_range(args))
+
+        output_paths += write_report({'违规率统计': statistics_result['analysis_result']},
+                                     os.path.join(args.output_dir, f"{stem}_违规率统计"), args.output_format)
+
+    return output_paths
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.stream and args.engine not in ('auto', 'pandas'):
+        parser.error("流式分析模式只支持pandas引擎")
+    if args.stream and wants_statistics(args) and not is_day_aligned_range(*time_range(args)):
+        parser.error("流式分析模式下违规率统计只支持按整天的时间范围")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = {path: executor.submit(run_report, path, args) for path in args.inputs}
+        for path, future in futures.items():
+            try:
+                for output_path in future.result():
+                    print(f"{path} -> {output_path}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {path}: {e}", file=sys.stderr)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
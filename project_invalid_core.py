@@ -0,0 +1,2744 @@
+"""项目违规率分析核心
+
+不依赖Streamlit的数据读取、违规率分析和违规率统计函数，可在看板、命令行和批处理任务中直接导入使用。
+分析失败时抛出 AnalysisError 及其子类，由调用方决定如何提示。
+"""
+import gzip
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+import warnings
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import suppress
+from datetime import datetime
+from multiprocessing import shared_memory
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+# pyarrow为可选依赖，未安装时不使用列式缓存
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# duckdb为可选依赖，只有选择DuckDB计算引擎时才需要
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# polars为可选依赖，只有选择Polars计算引擎时才需要
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+# 流式分析模式默认每次读取的行数
+STREAM_CHUNK_SIZE = 200000
+
+
+# ==================== 异常 ====================
+class AnalysisError(Exception):
+    """分析数据失败"""
+
+
+class MissingColumnsError(AnalysisError):
+    """数据缺少分析必需的列"""
+
+    def __init__(self, message, columns):
+        super().__init__(message)
+        self.columns = list(columns)
+
+
+class NoDataError(AnalysisError):
+    """没有可分析的数据（文件为空或没有符合筛选条件的订单）"""
+
+
+# ==================== 数据解析 ====================
+# 支持的日期格式（按优先级排列）
+DATE_FORMATS = [
+    '%d/%m/%Y %H:%M:%S',
+    '%Y-%m-%d %H:%M:%S',
+    '%m/%d/%Y %H:%M:%S',
+    '%d/%m/%Y',
+    '%Y-%m-%d',
+    '%Y/%m/%d %H:%M:%S',
+]
+
+# 表示"无日期"的占位值
+MISSING_DATE_SENTINEL = '1/1/1970 08:00:00'
+
+# 识别日期列主要格式时使用的样本行数
+DATE_FORMAT_SAMPLE_SIZE = 1000
+
+
+def parse_date(date_str):
+    """解析各种格式的日期字符串"""
+    if not date_str or pd.isna(date_str) or str(date_str) == MISSING_DATE_SENTINEL:
+        return None
+
+    date_str = str(date_str).strip()
+
+    # 尝试多种日期格式
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(date_str, fmt)
+        except:
+            continue
+
+    return None
+
+
+def detect_date_format(values):
+    """根据样本识别日期列的主要格式，返回能解析最多样本的格式（同样多时按优先级）"""
+    best_format = None
+    best_count = 0
+    for fmt in DATE_FORMATS:
+        parsed_count = pd.to_datetime(values, format=fmt, errors='coerce').notna().sum()
+        if parsed_count > best_count:
+            best_format = fmt
+            best_count = parsed_count
+    return best_format
+
+
+def parse_date_column(series):
+    """向量化解析整列日期，返回datetime64列（缺失或无法解析的值为NaT）
+
+    先用样本识别出的主要格式一次性转换整列，只有剩余未解析的行才依次尝试其他格式。
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+
+    text = series.astype('string')
+    missing_mask = text.isna() | (text == MISSING_DATE_SENTINEL)
+    text = text.str.strip()
+    missing_mask = (missing_mask | (text == '')).fillna(True).to_numpy(dtype=bool)
+
+    parsed = pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]', name=series.name)
+    if missing_mask.all():
+        return parsed
+
+    candidates = text[~missing_mask]
+    dominant_format = detect_date_format(candidates.iloc[:DATE_FORMAT_SAMPLE_SIZE])
+    formats = [dominant_format] if dominant_format else []
+    formats += [fmt for fmt in DATE_FORMATS if fmt != dominant_format]
+
+    # 主要格式转换整列，剩余的行再用其他格式兜底
+    for fmt in formats:
+        converted = pd.to_datetime(candidates, format=fmt, errors='coerce')
+        parsed.loc[converted.index] = converted
+        candidates = candidates[converted.isna()]
+        if candidates.empty:
+            break
+
+    return parsed
+
+
+# 加载数据时需要预先解析的时间列
+TIME_COLUMNS = ['order_time', 'finish_time']
+
+
+def parse_time_columns(df):
+    """解析数据中的时间列，返回 {列名: datetime64列}"""
+    return {column: parse_date_column(df[column]) for column in TIME_COLUMNS if column in df.columns}
+
+
+# CSV中已知列的数据类型：维度和状态列大量重复，使用category存储；金额列使用float；
+# 项目编号按原文读取，不因某些行为空而推断为float（123 显示为 123.0）
+CATEGORY_COLUMNS = ['activity_name', 'project_name', 'channel_name', 'bonus_text', 'bonus_invalid_text', 'order_text']
+PRICE_COLUMNS = ['estimate_cos_price', 'actual_cos_price']
+TEXT_COLUMNS = ['project_code']
+CSV_COLUMN_DTYPES = {
+    **{column: 'category' for column in CATEGORY_COLUMNS},
+    **{column: 'float64' for column in PRICE_COLUMNS},
+    **{column: str for column in TEXT_COLUMNS},
+}
+
+# 两个分析页面需要用到的列
+ANALYSIS_COLUMNS = CATEGORY_COLUMNS + PRICE_COLUMNS + ['project_code'] + TIME_COLUMNS
+
+
+def read_dataset_csv(source, analysis_columns_only=False):
+    """按声明的列类型读取CSV数据，可选择只加载分析需要的列"""
+    usecols = (lambda column: column in ANALYSIS_COLUMNS) if analysis_columns_only else None
+
+    try:
+        return pd.read_csv(source, dtype=CSV_COLUMN_DTYPES, usecols=usecols)
+    except ValueError:
+        # 金额列中有无法转换为数字的内容时，先按文本读取，再把无法转换的值置为空
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        df = pd.read_csv(source, dtype={column: dtype for column, dtype in CSV_COLUMN_DTYPES.items()
+                                        if column not in PRICE_COLUMNS}, usecols=usecols)
+        for column in PRICE_COLUMNS:
+            if column in df.columns:
+                df[column] = pd.to_numeric(df[column], errors='coerce')
+        return df
+
+
+# 列式缓存目录：CSV首次读取后按内容哈希转换为Parquet文件，之后直接读取列式文件
+COLUMNAR_CACHE_DIR = os.getenv(
+    'PROJECT_ANALYSIS_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.columnar_cache')
+)
+
+
+def columnar_cache_path(file_hash):
+    """返回指定内容哈希对应的Parquet缓存文件路径"""
+    return os.path.join(COLUMNAR_CACHE_DIR, f"{file_hash}.parquet")
+
+
+def write_columnar_cache(df, file_hash):
+    """把已按列类型读取的数据写入Parquet缓存，写入失败时不影响本次加载"""
+    path = columnar_cache_path(file_hash)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(COLUMNAR_CACHE_DIR, exist_ok=True)
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), temp_path)
+        # 先写临时文件再替换，避免其他会话读到写了一半的文件
+        os.replace(temp_path, path)
+        return True
+    except (OSError, ValueError, pa.ArrowException):
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+
+
+def read_columnar_cache(file_hash, analysis_columns_only=False):
+    """以内存映射方式读取Parquet缓存，可只读取分析需要的列；缓存不存在或损坏时返回None"""
+    path = columnar_cache_path(file_hash)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        columns = None
+        if analysis_columns_only:
+            schema_names = pq.read_schema(path).names
+            columns = [column for column in schema_names if column in ANALYSIS_COLUMNS]
+        return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+    except (OSError, ValueError, pa.ArrowException):
+        return None
+
+
+def read_dataset(source, file_hash, analysis_columns_only=False, use_columnar_cache=True):
+    """读取数据：优先使用列式缓存，没有缓存时读取CSV并写入缓存"""
+    if not use_columnar_cache or pa is None:
+        return read_dataset_csv(source, analysis_columns_only)
+
+    df = read_columnar_cache(file_hash, analysis_columns_only)
+    if df is not None:
+        return df
+
+    # 缓存中保存全部列，之后按需裁剪，不同的加载选项可以共用同一个缓存文件
+    df = read_dataset_csv(source)
+    write_columnar_cache(df, file_hash)
+    if analysis_columns_only:
+        df = df[[column for column in df.columns if column in ANALYSIS_COLUMNS]]
+    return df
+
+
+def dataset_file_path(source, file_hash):
+    """返回可供查询引擎直接读取的数据文件路径
+
+    已有列式缓存时优先读取Parquet文件；上传的文件内容不在磁盘上，先按内容哈希保存到缓存目录。
+    """
+    cache_path = columnar_cache_path(file_hash)
+    if os.path.exists(cache_path):
+        return cache_path
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+
+    path = os.path.join(COLUMNAR_CACHE_DIR, f"{file_hash}.csv")
+    if not os.path.exists(path):
+        os.makedirs(COLUMNAR_CACHE_DIR, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        source.seek(0)
+        with open(temp_path, 'wb') as f:
+            f.write(source.read())
+        os.replace(temp_path, path)
+    return path
+
+
+def clear_columnar_cache():
+    """删除列式缓存目录中的全部Parquet文件和保存的上传文件，返回删除的文件数"""
+    if not os.path.isdir(COLUMNAR_CACHE_DIR):
+        return 0
+
+    removed = 0
+    for name in os.listdir(COLUMNAR_CACHE_DIR):
+        if name.endswith(('.parquet', '.csv')):
+            os.remove(os.path.join(COLUMNAR_CACHE_DIR, name))
+            removed += 1
+    return removed
+
+
+# ==================== 违规率分析 ====================
+# bonus_invalid_text 中单独统计的无效原因，其余非空原因归为"其他无效原因"
+INVALID_REASON_COLUMNS = {
+    '无效-违规订单': 'invalid_violation',
+    '无效-风险订单': 'invalid_risk',
+    '无效-取消': 'invalid_cancel',
+    '无效-拆单': 'invalid_split',
+    '无效-退货': 'invalid_return',
+}
+
+# 状态和原因列的整数编码
+# bonus_invalid_text：0为空，1~5依次为 INVALID_REASON_COLUMNS 中的无效原因，最后一个代码为其他无效原因
+REASON_NONE = 0
+REASON_CODES = {reason: code for code, reason in enumerate(INVALID_REASON_COLUMNS, start=1)}
+REASON_OTHER = len(REASON_CODES) + 1
+REASON_CODE_COUNT = REASON_OTHER + 1
+VIOLATION_REASONS = ['无效-违规订单', '无效-风险订单']
+VIOLATION_REASON_CODES = [REASON_CODES[reason] for reason in VIOLATION_REASONS]
+
+# bonus_text：有效、无效，其余状态为0
+STATUS_OTHER = 0
+STATUS_VALID = 1
+STATUS_INVALID = 2
+STATUS_CODES = {'有效': STATUS_VALID, '无效': STATUS_INVALID}
+STATUS_CODE_COUNT = 3
+
+# 渠道级聚合结果中的计数列和GMV列
+CHANNEL_COUNT_COLUMNS = ['total_count'] + list(INVALID_REASON_COLUMNS.values()) + ['invalid_other']
+CHANNEL_GMV_COLUMNS = [
+    'estimate_commission_gmv',
+    'estimate_completed_gmv',
+    'actual_commission_gmv',
+    'invalid_violation_gmv',
+    'invalid_risk_gmv',
+]
+
+
+def encode_text_codes(series, mapping, default, missing):
+    """把文本列编码为int8代码：只对去重后的取值查表，category列直接使用已有的类别编码"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        values = series.cat.categories
+    else:
+        codes, values = pd.factorize(series)
+
+    # 空值的编码为-1，对应查找表的最后一项
+    lookup = np.array([mapping.get(value, default) for value in values] + [missing], dtype=np.int8)
+    return lookup[codes]
+
+
+def encode_reason_codes(df):
+    """bonus_invalid_text 编码，空值和空字符串为 REASON_NONE"""
+    return encode_text_codes(df['bonus_invalid_text'], {'': REASON_NONE, **REASON_CODES},
+                             REASON_OTHER, REASON_NONE)
+
+
+def encode_status_codes(df):
+    """bonus_text 编码"""
+    return encode_text_codes(df['bonus_text'], STATUS_CODES, STATUS_OTHER, STATUS_OTHER)
+
+
+def encode_statistics_flags(df):
+    """违规率统计使用的行标记：无效订单加2，违规订单（无效-违规订单或无效-风险订单）加1"""
+    invalid = encode_status_codes(df) == STATUS_INVALID
+    violation = np.isin(encode_reason_codes(df), VIOLATION_REASON_CODES)
+    return (invalid * 2 + violation).astype(np.int8)
+
+
+def factorize_groups(df, columns):
+    """按组合在数据中首次出现的顺序为每行编号（空值也作为单独的取值）
+
+    返回 (每行的组合编号, 每个组合首次出现的行位置)。
+    """
+    combined = np.zeros(len(df), dtype=np.int64)
+    for column in columns:
+        codes, uniques = pd.factorize(df[column])
+        combined = combined * (len(uniques) + 1) + (codes + 1)
+    group_codes, _ = pd.factorize(combined)
+
+    # 编号按首次出现的顺序递增，新组合出现的位置就是编号的累计最大值增加的位置
+    first_rows = np.flatnonzero(np.diff(np.maximum.accumulate(group_codes), prepend=-1) > 0)
+    return group_codes, first_rows
+
+
+def count_by_code(group_codes, codes, group_count, code_count, weights=None):
+    """计数核：一次bincount得到 组合 × 代码 的计数矩阵（提供weights时为加权求和）"""
+    cells = group_codes.astype(np.int64) * code_count + codes
+    return np.bincount(cells, weights=weights, minlength=group_count * code_count).reshape(group_count, code_count)
+
+
+def price_weights(series):
+    """金额列转换为bincount权重，空值按0计（与分组求和跳过空值一致）"""
+    values = series.to_numpy(dtype=np.float64)
+    return np.where(np.isnan(values), 0.0, values)
+
+
+def encode_price_cents(df):
+    """定点数模式：把金额列转换为以分为单位的int64（空值按0计），返回 {列名: int64数组}"""
+    price_cents = {}
+    for column in PRICE_COLUMNS:
+        values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64)
+        price_cents[column] = np.round(np.where(np.isnan(values), 0.0, values) * 100).astype(np.int64)
+    return price_cents
+
+
+def sum_amount(values, fixed_point=False):
+    """金额合计；定点数模式下先换算为整数分再求和，合计结果精确到分"""
+    if fixed_point:
+        return np.round(np.asarray(values, dtype=np.float64) * 100).astype(np.int64).sum() / 100
+    return values.sum()
+
+
+def aggregate_channel_stats(df, price_cents=None, groups=None):
+    """单次分组聚合，计算每个项目-渠道组合的全部计数和GMV指标
+
+    返回以 (project_name, channel_name) 为索引的DataFrame，组合顺序与数据中首次出现的顺序一致。
+    空的项目名称或渠道名称也会保留为单独的组合，以便项目级汇总覆盖全部订单。
+    状态和原因先编码为整数代码，所有计数和GMV都由 count_by_code 的计数矩阵得到。
+    提供 price_cents（见 encode_price_cents）时为定点数模式，GMV列为int64分。
+    groups 为已计算好的 factorize_groups 结果，未提供时在此计算。
+    """
+    group_codes, first_rows = groups if groups is not None else factorize_groups(df, ['project_name', 'channel_name'])
+    group_index = pd.MultiIndex.from_frame(df[['project_name', 'channel_name']].iloc[first_rows])
+    group_count = len(group_index)
+
+    reason_codes = encode_reason_codes(df)
+    status_codes = encode_status_codes(df)
+    completed = encode_text_codes(df['order_text'], {'已完成': 1}, 0, 0)
+    if price_cents is not None:
+        estimate_price = price_cents['estimate_cos_price']
+        actual_price = price_cents['actual_cos_price']
+    else:
+        estimate_price = price_weights(df['estimate_cos_price'])
+        actual_price = price_weights(df['actual_cos_price'])
+
+    # 组合 × 无效原因：订单数和预估佣金
+    reason_counts = count_by_code(group_codes, reason_codes, group_count, REASON_CODE_COUNT)
+    reason_gmv = count_by_code(group_codes, reason_codes, group_count, REASON_CODE_COUNT, estimate_price)
+    # 组合 × 奖金状态：预估佣金；组合 × (奖金状态, 是否已完成)：实际佣金
+    status_gmv = count_by_code(group_codes, status_codes, group_count, STATUS_CODE_COUNT, estimate_price)
+    completed_gmv = count_by_code(group_codes, status_codes * 2 + completed, group_count, STATUS_CODE_COUNT * 2,
+                                  actual_price)
+
+    channel_stats = pd.DataFrame({'total_count': reason_counts.sum(axis=1)}, index=group_index)
+    for reason, column in INVALID_REASON_COLUMNS.items():
+        channel_stats[column] = reason_counts[:, REASON_CODES[reason]]
+    channel_stats['invalid_other'] = reason_counts[:, REASON_OTHER]
+
+    channel_stats['estimate_commission_gmv'] = status_gmv.sum(axis=1)
+    channel_stats['estimate_completed_gmv'] = status_gmv[:, STATUS_VALID]
+    channel_stats['actual_commission_gmv'] = completed_gmv[:, STATUS_VALID * 2 + 1]
+    channel_stats['invalid_violation_gmv'] = reason_gmv[:, REASON_CODES['无效-违规订单']]
+    channel_stats['invalid_risk_gmv'] = reason_gmv[:, REASON_CODES['无效-风险订单']]
+
+    channel_stats[CHANNEL_COUNT_COLUMNS] = channel_stats[CHANNEL_COUNT_COLUMNS].astype(np.int64)
+    if price_cents is not None:
+        # 整数分的累加在2^53以内没有舍入误差，结果可以无损转换回int64
+        channel_stats[CHANNEL_GMV_COLUMNS] = channel_stats[CHANNEL_GMV_COLUMNS].round().astype(np.int64)
+    return channel_stats
+
+
+def rollup_project_stats(channel_stats):
+    """由渠道级聚合结果汇总出项目级统计数据（用于项目违规率和项目违规GMV占比）"""
+    project_stats = channel_stats.groupby(level='project_name', sort=False, observed=True).agg(
+        project_total_count=('total_count', 'sum'),
+        project_estimate_gmv=('estimate_commission_gmv', 'sum'),
+        project_invalid_violation=('invalid_violation', 'sum'),
+        project_invalid_risk=('invalid_risk', 'sum'),
+        project_invalid_violation_gmv=('invalid_violation_gmv', 'sum'),
+    )
+
+    total_count = project_stats['project_total_count']
+    estimate_gmv = project_stats['project_estimate_gmv']
+
+    # 项目违规率
+    project_stats['project_violation_rate'] = (
+        (project_stats['project_invalid_violation'] + project_stats['project_invalid_risk']) / total_count
+    ).where(total_count > 0, 0)
+
+    # 项目违规GMV占比（使用预估GMV）
+    # 注意：与原有统计口径保持一致，项目级违规GMV占比只计入无效-违规订单GMV
+    project_stats['project_violation_gmv_ratio'] = (
+        project_stats['project_invalid_violation_gmv'] / estimate_gmv
+    ).where(estimate_gmv > 0, 0)
+
+    return project_stats
+
+
+def check_complete_data_columns(columns):
+    """检查违规率分析需要的列是否存在，缺少时抛出 MissingColumnsError"""
+    # 检查必要的列是否存在
+    required_columns = ['activity_name', 'project_name', 'channel_name', 'bonus_invalid_text', 'bonus_text']
+    missing_columns = [col for col in required_columns if col not in columns]
+
+    if missing_columns:
+        raise MissingColumnsError(f"缺少必要的列: {missing_columns}", columns)
+
+    # 检查是否有order_text列
+    if 'order_text' not in columns:
+        raise MissingColumnsError("缺少order_text列，无法计算实际计佣GMV", columns)
+
+    # 检查是否有estimate_cos_price和actual_cos_price列
+    if 'estimate_cos_price' not in columns:
+        raise MissingColumnsError("缺少estimate_cos_price列，无法计算预估计佣GMV", columns)
+
+    if 'actual_cos_price' not in columns:
+        raise MissingColumnsError("缺少actual_cos_price列，无法计算实际计佣GMV", columns)
+
+
+def first_project_codes(df):
+    """获取每个项目的第一个非空project_code（结果可按数据顺序拼接后再次取第一个值合并）"""
+    return df.groupby('project_name', sort=False, observed=True)['project_code'].first()
+
+
+def build_project_code_map(first_codes):
+    """生成 {项目名称: 项目编号}，如果没有project_code，使用项目名称"""
+    return {
+        project_name: str(project_code) if pd.notna(project_code) else project_name
+        for project_name, project_code in first_codes.items()
+    }
+
+
+def build_complete_result(channel_stats, project_code_map=None, fixed_point=False):
+    """由渠道级聚合结果生成违规率分析结果表
+
+    project_code_map 为 {项目名称: 项目编号}，提供时按项目编号排序并在结果中加入项目编号列。
+    fixed_point 表示 channel_stats 中的GMV为int64分：汇总和占比都用整数计算，只在结果表中换算为元。
+    """
+    use_project_code = project_code_map is not None
+    total_combinations = len(channel_stats)
+
+    # 由渠道级结果汇总项目级别的统计数据（用于项目违规率和项目违规GMV占比）
+    project_stats = rollup_project_stats(channel_stats)
+
+    # 只保留项目名称和渠道名称都存在的组合
+    project_names = channel_stats.index.get_level_values('project_name')
+    channel_names = channel_stats.index.get_level_values('channel_name')
+    channel_stats = channel_stats[project_names.notna() & channel_names.notna()]
+    project_names = channel_stats.index.get_level_values('project_name')
+    channel_names = channel_stats.index.get_level_values('channel_name')
+
+    total_count = channel_stats['total_count']
+    estimate_commission_gmv = channel_stats['estimate_commission_gmv']
+
+    # 计算无效订单总数（所有无效原因的总和）
+    total_invalid_orders = channel_stats[CHANNEL_COUNT_COLUMNS[1:]].sum(axis=1)
+
+    def safe_ratio(numerator, denominator):
+        return (numerator / denominator).where(denominator > 0, 0)
+
+    # 计算GMV占比（占预估计佣GMV的比例）
+    invalid_violation_gmv_ratio = safe_ratio(channel_stats['invalid_violation_gmv'], estimate_commission_gmv)
+    invalid_risk_gmv_ratio = safe_ratio(channel_stats['invalid_risk_gmv'], estimate_commission_gmv)
+
+    # 计算各类订单占比（占订单总数的比例）
+    invalid_ratio_total = safe_ratio(total_invalid_orders, total_count)
+    violation_ratio_total = safe_ratio(channel_stats['invalid_violation'], total_count)
+    risk_ratio_total = safe_ratio(channel_stats['invalid_risk'], total_count)
+
+    # 计算渠道违规率（违规订单数占比）和渠道违规GMV占比
+    channel_violation_rate = safe_ratio(channel_stats['invalid_violation'] + channel_stats['invalid_risk'],
+                                        total_count)
+    channel_violation_gmv_ratio = safe_ratio(
+        channel_stats['invalid_violation_gmv'] + channel_stats['invalid_risk_gmv'], estimate_commission_gmv)
+
+    # 获取项目级别的统计数据
+    project_stat = project_stats.reindex(project_names)
+
+    def amount(column):
+        values = channel_stats[column].to_numpy()
+        return values / 100 if fixed_point else values
+
+    # 创建结果表（按组合在数据中首次出现的顺序）
+    result_df = pd.DataFrame({
+        '日期': pd.Timestamp.now().normalize(),
+        '项目名称': list(project_names),
+        '渠道名称': list(channel_names),
+        '订单总数': total_count.to_numpy(),
+        '预估计佣GMV': amount('estimate_commission_gmv'),
+        '预估完成': amount('estimate_completed_gmv'),
+        '实际计佣GMV': amount('actual_commission_gmv'),
+        '无效订单总数': total_invalid_orders.to_numpy(),
+        '无效订单占比': invalid_ratio_total.to_numpy(),
+        '无效-违规订单数': channel_stats['invalid_violation'].to_numpy(),
+        '无效-违规订单占比': violation_ratio_total.to_numpy(),
+        '无效-违规订单GMV': amount('invalid_violation_gmv'),
+        '无效-违规订单GMV占比': invalid_violation_gmv_ratio.to_numpy(),
+        '无效-风险订单数': channel_stats['invalid_risk'].to_numpy(),
+        '无效-风险订单占比': risk_ratio_total.to_numpy(),
+        '无效-风险订单GMV': amount('invalid_risk_gmv'),
+        '无效-风险订单GMV占比': invalid_risk_gmv_ratio.to_numpy(),
+        '违规率': channel_violation_rate.to_numpy(),
+        '违规GMV占比': channel_violation_gmv_ratio.to_numpy(),
+        '项目违规率': project_stat['project_violation_rate'].fillna(0).to_numpy(),
+        '项目违规GMV占比': project_stat['project_violation_gmv_ratio'].fillna(0).to_numpy()
+    })
+
+    # 如果有项目编号，添加到结果中
+    if use_project_code:
+        result_df['项目编号'] = [project_code_map.get(project_name, "") for project_name in project_names]
+
+    # 按照项目编号排序（如果有项目编号）
+    if use_project_code:
+        # 确保项目编号可以正确排序
+        try:
+            # 尝试将项目编号转换为整数进行排序
+            result_df['项目编号_排序'] = pd.to_numeric(result_df['项目编号'], errors='coerce')
+            result_df = result_df.sort_values('项目编号_排序', ascending=True)
+            result_df = result_df.drop('项目编号_排序', axis=1)
+        except:
+            # 如果不能转换为数字，按字符串排序
+            result_df = result_df.sort_values('项目编号', ascending=True)
+    else:
+        # 按项目名称排序
+        result_df = result_df.sort_values('项目名称', ascending=True)
+
+    # 按照要求的字段顺序重新排列
+    required_columns_order = [
+        '日期',
+        '项目名称',
+        '渠道名称',
+        '订单总数',
+        '预估计佣GMV',
+        '预估完成',
+        '实际计佣GMV',
+        '无效订单总数',
+        '无效订单占比',
+        '无效-违规订单数',
+        '无效-违规订单占比',
+        '无效-违规订单GMV',
+        '无效-违规订单GMV占比',
+        '无效-风险订单数',
+        '无效-风险订单占比',
+        '无效-风险订单GMV',
+        '无效-风险订单GMV占比',
+        '违规率',
+        '违规GMV占比',
+        '项目违规率',
+        '项目违规GMV占比'
+    ]
+
+    # 如果有项目编号，添加到列顺序中
+    if use_project_code:
+        # 在项目名称之后，渠道名称之前插入项目编号
+        required_columns_order.insert(2, '项目编号')  # 位置2（0-based索引）
+
+    # 确保只保留要求的列
+    result_df = result_df[required_columns_order]
+
+    return {
+        'analysis_result': result_df,
+        'total_combinations': total_combinations,
+        'use_project_code': use_project_code,
+        'fixed_point': fixed_point
+    }
+
+
+def analyze_complete_data(df, price_cents=None, workers=1):
+    """使用完整计算逻辑分析数据（不应用时间筛选）
+
+    price_cents 为加载数据时按分转换的金额列（见 encode_price_cents），提供时GMV按定点数计算。
+    workers 大于1时按项目分区，在多个进程中并行聚合（结果与单进程完全相同）；数据量或进程数不足以抵消
+    进程间开销时仍单进程计算（见 PARALLEL_MIN_ROWS）。
+    """
+    # 检查必要的列是否存在
+    check_complete_data_columns(df.columns)
+
+    # 检查是否有project_code列用于排序
+    if 'project_code' not in df.columns:
+        use_project_code = False
+    else:
+        use_project_code = True
+
+    # 确保estimate_cos_price和actual_cos_price是数值类型
+    for col in ['estimate_cos_price', 'actual_cos_price']:
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # 如果使用project_code排序，我们需要获取每个项目的project_code
+    if use_project_code:
+        project_code_map = build_project_code_map(first_project_codes(df))
+
+    # 单次分组计算所有项目-渠道组合的计数和GMV指标
+    if workers > 1:
+        channel_stats = aggregate_channel_stats_parallel(df, workers, price_cents)
+    else:
+        channel_stats = aggregate_channel_stats(df, price_cents)
+    complete_result = build_complete_result(channel_stats, project_code_map if use_project_code else None,
+                                            fixed_point=price_cents is not None)
+
+    return {
+        **complete_result,
+        'filtered_data': df,
+        'total_records': len(df)
+    }
+
+
+# ==================== 导出格式 ====================
+# 结果表中的金额列和占比列：分析结果中保存数值，只在显示和导出时格式化
+AMOUNT_COLUMNS = [
+    '预估计佣GMV',
+    '预估完成',
+    '实际计佣GMV',
+    '无效-违规订单GMV',
+    '无效-风险订单GMV',
+]
+RATIO_COLUMNS = [
+    '无效订单占比',
+    '无效-违规订单占比',
+    '无效-违规订单GMV占比',
+    '无效-风险订单占比',
+    '无效-风险订单GMV占比',
+    '违规率',
+    '违规GMV占比',
+    '项目违规率',
+    '项目违规GMV占比',
+    '违规率下限',
+    '违规率上限',
+    '违规GMV占比下限',
+    '违规GMV占比上限',
+]
+# 结果表中的日期列：保存为日期时间（当天零点），显示和导出CSV、Excel时只显示日期
+DATE_COLUMNS = ['日期']
+
+
+def format_for_csv(df):
+    """导出CSV时把金额列格式化为两位小数、占比列格式化为百分比文本、日期列格式化为 YYYY-MM-DD"""
+    export_df = df.copy()
+    for column in export_df.columns:
+        if column in AMOUNT_COLUMNS:
+            export_df[column] = export_df[column].map("{:.2f}".format)
+        elif column in RATIO_COLUMNS:
+            export_df[column] = export_df[column].map("{:.2%}".format)
+        elif column in DATE_COLUMNS:
+            export_df[column] = export_df[column].dt.strftime('%Y-%m-%d')
+    return export_df
+
+
+def result_report_date(result_df):
+    """结果表中的报告日期（日期列的值），没有日期列或结果为空时为None"""
+    for column in DATE_COLUMNS:
+        if column in result_df.columns and len(result_df):
+            return result_df[column].iloc[0]
+    return None
+
+
+def export_cache_key(export_format, dataset_hash, params, report_date=None):
+    """导出文件的缓存键：(导出格式, 数据哈希, 导出参数, 报告日期)
+
+    报告日期是分析结果计算当天的日期。分析结果被淘汰后在另一天重新计算时日期改变，之前生成的文件不再使用。
+    """
+    return export_format, dataset_hash, params, report_date
+
+
+# Excel单个工作表最多 1,048,576 行（含表头），超出的数据拆分到编号的工作表中
+EXCEL_MAX_ROWS = 1048576
+# 写入Excel时每次从DataFrame转换的行数
+EXCEL_CHUNK_ROWS = 50000
+# 表头样式与 pandas.DataFrame.to_excel 一致
+EXCEL_HEADER_FONT = Font(bold=True)
+EXCEL_HEADER_BORDER = Border(*(Side(style='thin'),) * 4)
+EXCEL_HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+
+
+def excel_number_formats(df):
+    """返回各列的Excel数字格式：金额列两位小数、占比列百分比、日期列只显示日期，其他列为None"""
+    formats = []
+    for column in df.columns:
+        if column in AMOUNT_COLUMNS:
+            formats.append('0.00')
+        elif column in RATIO_COLUMNS:
+            formats.append('0.00%')
+        elif column in DATE_COLUMNS:
+            formats.append('yyyy-mm-dd')
+        else:
+            formats.append(None)
+    return formats
+
+
+def excel_rows(df, chunk_size=EXCEL_CHUNK_ROWS):
+    """按块把DataFrame转换为单元格值的元组，空值写为空单元格；一次只转换一块，内存占用不随行数增长"""
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        yield from chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+
+
+def write_excel_sheet(workbook, name, df, chunk_size=EXCEL_CHUNK_ROWS):
+    """把一个表写入只写模式的工作簿，超过Excel行数上限时拆分为 名称、名称_2、名称_3 … 多个工作表"""
+    formats = excel_number_formats(df)
+    has_formats = any(formats)
+    rows_per_sheet = EXCEL_MAX_ROWS - 1
+
+    worksheet = None
+    sheet_rows = rows_per_sheet
+    sheet_count = 0
+    for row in excel_rows(df, chunk_size):
+        if sheet_rows == rows_per_sheet:
+            worksheet = create_excel_sheet(workbook, name, sheet_count, df.columns)
+            sheet_rows = 0
+            sheet_count += 1
+        if has_formats:
+            row = [styled_excel_cell(worksheet, value, number_format) for value, number_format in zip(row, formats)]
+        worksheet.append(row)
+        sheet_rows += 1
+
+    # 没有数据时只写表头
+    if worksheet is None:
+        create_excel_sheet(workbook, name, 0, df.columns)
+
+
+def create_excel_sheet(workbook, name, index, columns):
+    """新建第 index 个工作表并写入表头"""
+    sheet_name = name if index == 0 else f"{name}_{index + 1}"
+    worksheet = workbook.create_sheet(sheet_name)
+    header = []
+    for column in columns:
+        cell = WriteOnlyCell(worksheet, value=str(column))
+        cell.font = EXCEL_HEADER_FONT
+        cell.border = EXCEL_HEADER_BORDER
+        cell.alignment = EXCEL_HEADER_ALIGNMENT
+        header.append(cell)
+    worksheet.append(header)
+    return worksheet
+
+
+def styled_excel_cell(worksheet, value, number_format):
+    """需要数字格式的值包装为带格式的单元格"""
+    if number_format is None or value is None:
+        return value
+    cell = WriteOnlyCell(worksheet, value=value)
+    cell.number_format = number_format
+    return cell
+
+
+def write_excel_report(tables, target, chunk_size=EXCEL_CHUNK_ROWS):
+    """以只写模式把 {表名: DataFrame} 写成Excel工作簿（每个表一个或多个工作表）
+
+    target 可以是文件路径或二进制文件对象；逐行写入，不在内存中保留整个工作簿，适合几十万行以上的原始数据。
+    """
+    workbook = Workbook(write_only=True)
+    for name, table in tables.items():
+        write_excel_sheet(workbook, name, table, chunk_size)
+    workbook.save(target)
+
+
+# 导出原始数据时每次转换为CSV文本或Arrow记录批的行数
+EXPORT_CHUNK_ROWS = 100000
+
+
+def iter_csv_chunks(df, chunk_size=EXPORT_CHUNK_ROWS):
+    """按块生成CSV内容（UTF-8字节，第一块带BOM和表头），一次只有一块数据的文本在内存中"""
+    for start in range(0, max(len(df), 1), chunk_size):
+        text = df.iloc[start:start + chunk_size].to_csv(index=False, header=start == 0)
+        yield text.encode('utf-8-sig' if start == 0 else 'utf-8')
+
+
+def write_csv_export(df, target, compression=None, arcname='data.csv', chunk_size=EXPORT_CHUNK_ROWS):
+    """把DataFrame按块写成CSV，可选 gzip 或 zip 压缩（zip中的文件名为 arcname）
+
+    target 为二进制文件对象；原样输出金额和占比的数值，适合导出原始数据。
+    """
+    if compression == 'gzip':
+        output = gzip.GzipFile(fileobj=target, mode='wb', compresslevel=6)
+    elif compression == 'zip':
+        archive = zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED)
+        output = archive.open(arcname, 'w', force_zip64=True)
+    elif compression is None:
+        output = target
+    else:
+        raise ValueError(f"不支持的压缩方式: {compression}")
+
+    for chunk in iter_csv_chunks(df, chunk_size):
+        output.write(chunk)
+
+    if compression is not None:
+        output.close()
+    if compression == 'zip':
+        archive.close()
+
+
+# Parquet 和 Arrow IPC 文件的后缀
+ARROW_EXPORT_SUFFIXES = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+def typed_export_table(df, parsed_times=None):
+    """把原始数据中的时间文本列替换为日期时间列，导出Parquet/Arrow时保留日期时间类型
+
+    parsed_times 为 parse_time_columns 的结果，可以来自包含 df 的完整数据（按索引对齐），未提供时重新解析。
+    """
+    if parsed_times is None:
+        parsed_times = parse_time_columns(df)
+    columns = {column: times.reindex(df.index) for column, times in parsed_times.items() if column in df.columns}
+    return df.assign(**columns) if columns else df
+
+
+def write_arrow_export(df, target, export_format, chunk_size=EXPORT_CHUNK_ROWS):
+    """把DataFrame按块写成Parquet或Arrow IPC文件，保留数值、日期时间和分类列的类型
+
+    target 为文件路径或二进制文件对象。Parquet 使用zstd压缩，每块一个行组；
+    Arrow IPC 文件不压缩，读取时可以内存映射零拷贝加载。
+    """
+    if pa is None:
+        raise AnalysisError("导出Parquet/Arrow需要安装pyarrow")
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    if export_format == 'parquet':
+        writer = pq.ParquetWriter(target, schema, compression='zstd')
+    elif export_format == 'arrow':
+        writer = pa.ipc.new_file(target, schema)
+    else:
+        raise ValueError(f"不支持的导出格式: {export_format}")
+
+    with writer:
+        for start in range(0, len(df), chunk_size):
+            chunk = df.iloc[start:start + chunk_size]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def write_tables_archive(tables, target, export_format):
+    """把 {表名: DataFrame} 各写成一个Parquet或Arrow文件，打包为zip（文件本身已是二进制列式格式，不再压缩）"""
+    suffix = ARROW_EXPORT_SUFFIXES[export_format]
+    with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, table in tables.items():
+            buffer = io.BytesIO()
+            write_arrow_export(table, buffer, export_format)
+            archive.writestr(f"{name}{suffix}", buffer.getvalue())
+
+
+def build_project_summary(result_df):
+    """按项目汇总违规率分析结果，没有项目编号时返回None"""
+    if '项目编号' not in result_df.columns:
+        return None
+
+    return result_df.groupby(['项目编号', '项目名称']).agg({
+        '订单总数': 'sum',
+        '预估计佣GMV': 'sum',
+        '实际计佣GMV': 'sum',
+        '无效-违规订单数': 'sum',
+        '无效-风险订单数': 'sum'
+    }).reset_index()
+
+
+def build_total_stats(result_df, fixed_point=False):
+    """生成违规率分析报告中的统计汇总（单行）"""
+    total_stats = {
+        '总项目-渠道组合数': len(result_df),
+        '总订单数': result_df['订单总数'].sum(),
+        '总预估计佣GMV': sum_amount(result_df['预估计佣GMV'], fixed_point),
+        '总实际计佣GMV': sum_amount(result_df['实际计佣GMV'], fixed_point),
+        '总无效-违规订单数': result_df['无效-违规订单数'].sum(),
+        '总无效-风险订单数': result_df['无效-风险订单数'].sum(),
+        '分析时间': datetime.now().replace(microsecond=0),
+        '数据来源': '违规率分析'
+    }
+    return pd.DataFrame([total_stats])
+
+
+def write_report(tables, path_prefix, output_format):
+    """把 {表名: DataFrame} 写成报告文件，返回写出的文件路径列表
+
+    excel 格式写入同一个工作簿（每个表一个工作表）；csv、parquet 和 arrow 格式每个表一个文件。
+    csv 中金额和占比按显示格式输出，excel、parquet 和 arrow 保留数值和日期时间类型。
+    """
+    if output_format == 'excel':
+        path = f"{path_prefix}.xlsx"
+        write_excel_report(tables, path)
+        return [path]
+
+    paths = []
+    for name, table in tables.items():
+        if output_format == 'csv':
+            path = f"{path_prefix}_{name}.csv"
+            format_for_csv(table).to_csv(path, index=False, encoding='utf-8-sig')
+        elif output_format in ARROW_EXPORT_SUFFIXES:
+            path = f"{path_prefix}_{name}{ARROW_EXPORT_SUFFIXES[output_format]}"
+            write_arrow_export(table, path, output_format)
+        else:
+            raise ValueError(f"不支持的报告格式: {output_format}")
+        paths.append(path)
+    return paths
+
+
+# ==================== 违规率统计 ====================
+# 日期立方体单元格的维度
+CUBE_CELL_KEYS = ['project_name', 'channel_name', 'order_day', 'finish_day']
+
+# 稠密日期立方体的单元格数上限（组合数 × 下单日期数 × 完成日期数）。
+# 两个沿日期轴累加的int64数组各占8字节/单元格，构建时的临时数组约为其三倍，上限约对应800MB峰值内存；
+# 超出时整体加载的数据改用行索引统计，流式分析改为保留稀疏的单元格统计结果
+VIOLATION_CUBE_MAX_CELLS = 10 ** 7
+
+
+def collect_cube_cells(df, order_times, finish_times, row_offset=0):
+    """统计日期立方体的单元格：每个 (项目-渠道组合, 下单日期, 完成日期) 的订单数、无效订单数和违规订单数
+
+    返回长表格式的结果，分块统计的结果拼接后可以再次合并；row_offset 为本块第一行在完整数据中的位置。
+    """
+    order_days = order_times.dt.floor('D')
+    finish_days = finish_times.dt.floor('D').where(order_days.notna())
+    flags = encode_statistics_flags(df)
+    cells = pd.DataFrame({
+        'project_name': df['project_name'],
+        'channel_name': df['channel_name'],
+        'order_day': order_days,
+        'finish_day': finish_days,
+        'order_count': np.ones(len(df), dtype=np.int64),
+        'invalid_count': (flags >= 2) & finish_days.notna().to_numpy(),
+        'violation_count': (flags % 2 == 1) & finish_days.notna().to_numpy(),
+        'first_row': np.arange(row_offset, row_offset + len(df)),
+    })
+    cells = cells[order_days.notna().to_numpy()]
+    return merge_cube_cells([cells])
+
+
+def merge_cube_cells(cell_frames):
+    """合并多块日期立方体单元格统计结果"""
+    cells = pd.concat(cell_frames, ignore_index=True)
+    return cells.groupby(CUBE_CELL_KEYS, sort=False, dropna=False, observed=True).agg(
+        order_count=('order_count', 'sum'),
+        invalid_count=('invalid_count', 'sum'),
+        violation_count=('violation_count', 'sum'),
+        first_row=('first_row', 'min'),
+    ).reset_index()
+
+
+def violation_cube_cells(group_count, order_day_count, finish_day_count):
+    """稠密日期立方体沿日期轴累加后的单元格数"""
+    return group_count * (order_day_count + 1) * (finish_day_count + 1)
+
+
+def day_span(times):
+    """时间列跨越的天数（不小于其中不同日期的个数），没有有效时间时为0"""
+    first, last = times.min(), times.max()
+    if pd.isna(first):
+        return 0
+    return (last.normalize() - first.normalize()).days + 1
+
+
+def assemble_violation_cube(cells):
+    """由单元格统计结果构建日期立方体，并沿两个日期轴累加
+
+    稠密立方体超过 VIOLATION_CUBE_MAX_CELLS 个单元格时，改为返回稀疏的日期立方体：
+    只保留有订单的单元格，查询时逐个单元格筛选日期范围（见 query_violation_cube）。
+    """
+    cells = cells.sort_values('first_row', kind='stable')
+
+    # 项目-渠道组合编号（按数据中首次出现的顺序，空值也作为单独的组合）
+    group_ids = cells.groupby(['project_name', 'channel_name'], sort=False, dropna=False,
+                              observed=True).ngroup().to_numpy()
+    _, first_cells = np.unique(group_ids, return_index=True)
+    groups = cells[['project_name', 'channel_name']].iloc[first_cells].reset_index(drop=True)
+    group_count = len(groups)
+
+    # 项目名称或渠道名称为空的组合只参与组合数统计，订单数按0计
+    named_cells = (cells['project_name'].notna() & cells['channel_name'].notna()).to_numpy()
+
+    order_days, order_index = np.unique(cells['order_day'].to_numpy(), return_inverse=True)
+    finish_valid = cells['finish_day'].notna().to_numpy()
+    finish_days, finish_index = np.unique(cells['finish_day'].to_numpy()[finish_valid], return_inverse=True)
+    order_day_count = len(order_days)
+    finish_day_count = len(finish_days)
+    order_count = cells['order_count'].to_numpy()
+    row_counts = np.bincount(order_index, weights=order_count, minlength=order_day_count)
+
+    if violation_cube_cells(group_count, order_day_count, finish_day_count) > VIOLATION_CUBE_MAX_CELLS:
+        # 稀疏立方体：每个单元格的组合编号、日期位置（完成日期为空时为-1）和计数
+        cell_finish_index = np.full(len(cells), -1, dtype=np.int64)
+        cell_finish_index[finish_valid] = finish_index
+        return {
+            'groups': groups,
+            'order_days': order_days,
+            'finish_days': finish_days,
+            'row_cum': np.pad(row_counts.cumsum(), (1, 0)).astype(np.int64),
+            'cells': {
+                'group_ids': group_ids,
+                'order_index': order_index,
+                'finish_index': cell_finish_index,
+                'named': named_cells,
+                'order_count': order_count,
+                'invalid_count': cells['invalid_count'].to_numpy(),
+                'violation_count': cells['violation_count'].to_numpy(),
+                'first_row': cells['first_row'].to_numpy(),
+            },
+        }
+
+    # 下单日期维度：订单数、组合是否出现及每个组合在每个下单日期的首行位置（用于还原组合出现顺序）
+    order_cells = group_ids * order_day_count + order_index
+    order_grid_size = group_count * order_day_count
+    presence = np.bincount(order_cells, minlength=order_grid_size).reshape(group_count, order_day_count) > 0
+    order_counts = np.bincount(order_cells[named_cells], weights=order_count[named_cells],
+                               minlength=order_grid_size).reshape(group_count, order_day_count)
+
+    first_row = np.full(order_grid_size, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first_row, order_cells, cells['first_row'].to_numpy())
+    first_row = first_row.reshape(group_count, order_day_count)
+
+    # 下单日期 × 完成日期维度：无效订单数和违规订单数
+    finish_cells = order_cells[finish_valid] * finish_day_count + finish_index
+    cube_shape = (group_count, order_day_count, finish_day_count)
+    cell_count = group_count * order_day_count * finish_day_count
+    counted = named_cells[finish_valid]
+
+    def finish_counts(column):
+        weights = cells[column].to_numpy()[finish_valid]
+        return np.bincount(finish_cells[counted], weights=weights[counted], minlength=cell_count).reshape(cube_shape)
+
+    def cumulative(counts, axes):
+        pad = [(0, 0)] * counts.ndim
+        for axis in axes:
+            counts = counts.cumsum(axis=axis)
+            pad[axis] = (1, 0)
+        return np.pad(counts, pad).astype(np.int64)
+
+    return {
+        'groups': groups,
+        'order_days': order_days,
+        'finish_days': finish_days,
+        'row_cum': cumulative(row_counts, [0]),
+        'presence_cum': cumulative(presence, [1]),
+        'first_row': first_row,
+        'order_cum': cumulative(order_counts, [1]),
+        'invalid_cum': cumulative(finish_counts('invalid_count'), [1, 2]),
+        'violation_cum': cumulative(finish_counts('violation_count'), [1, 2]),
+    }
+
+
+def build_violation_cube(df, order_times, finish_times):
+    """构建违规率统计使用的日期立方体
+
+    按 (项目-渠道组合, 下单日期, 完成日期) 统计订单数、无效订单数和违规订单数，
+    并沿两个日期轴累加，任意整天的下单日期 × 完成日期范围都可以直接由累加结果相减得到。
+    按组合数和日期跨度估计的单元格数超过 VIOLATION_CUBE_MAX_CELLS 时返回None，统计时改用行索引。
+    """
+    required_columns = ['project_name', 'channel_name', 'bonus_invalid_text', 'bonus_text']
+    if any(col not in df.columns for col in required_columns):
+        return None
+
+    # 日期跨度不小于实际的日期数，估计值不超过上限时稠密立方体一定不超过上限
+    _, first_rows = factorize_groups(df, ['project_name', 'channel_name'])
+    if violation_cube_cells(len(first_rows), day_span(order_times), day_span(finish_times)) > VIOLATION_CUBE_MAX_CELLS:
+        return None
+
+    return assemble_violation_cube(collect_cube_cells(df, order_times, finish_times))
+
+
+def is_day_aligned_range(order_start_dt, order_end_dt, finish_start_dt, finish_end_dt):
+    """判断时间范围是否按整天选择（开始为当天00:00:00，结束为当天23:59:59.999999）"""
+    for start_dt in (order_start_dt, finish_start_dt):
+        if start_dt and pd.Timestamp(start_dt) != pd.Timestamp(start_dt).normalize():
+            return False
+    for end_dt in (order_end_dt, finish_end_dt):
+        if end_dt and pd.Timestamp(end_dt).time() != datetime.max.time():
+            return False
+    return True
+
+
+def cube_day_window(days, start_dt, end_dt):
+    """返回整天时间范围在日期轴上对应的 [开始, 结束) 位置"""
+    start = np.searchsorted(days, np.datetime64(pd.Timestamp(start_dt).normalize())) if start_dt else 0
+    end = np.searchsorted(days, np.datetime64(pd.Timestamp(end_dt).normalize()), side='right') if end_dt else len(days)
+    return start, max(start, end)
+
+
+def dense_cube_window(cube, order_lo, order_hi, finish_lo, finish_hi):
+    """稠密日期立方体：由累加结果相减得到每个组合在日期窗口内的统计"""
+    def window_sum(cum):
+        return (cum[:, order_hi, finish_hi] - cum[:, order_lo, finish_hi]
+                - cum[:, order_hi, finish_lo] + cum[:, order_lo, finish_lo])
+
+    present = (cube['presence_cum'][:, order_hi] - cube['presence_cum'][:, order_lo]) > 0
+    if order_hi > order_lo:
+        first_row = cube['first_row'][:, order_lo:order_hi].min(axis=1)
+    else:
+        first_row = np.zeros(len(present), dtype=np.int64)
+    order_total_count = cube['order_cum'][:, order_hi] - cube['order_cum'][:, order_lo]
+    return (present, first_row, order_total_count,
+            window_sum(cube['invalid_cum']), window_sum(cube['violation_cum']))
+
+
+def sparse_cube_window(cube, order_lo, order_hi, finish_lo, finish_hi):
+    """稀疏日期立方体：筛选日期窗口内的单元格，按组合求和得到统计"""
+    cells = cube['cells']
+    group_count = len(cube['groups'])
+    group_ids = cells['group_ids']
+    in_order = (cells['order_index'] >= order_lo) & (cells['order_index'] < order_hi)
+    in_finish = in_order & (cells['finish_index'] >= finish_lo) & (cells['finish_index'] < finish_hi)
+
+    def group_sum(mask, column):
+        counted = mask & cells['named']
+        return np.bincount(group_ids[counted], weights=cells[column][counted], minlength=group_count)
+
+    present = np.bincount(group_ids[in_order], minlength=group_count) > 0
+    first_row = np.full(group_count, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first_row, group_ids[in_order], cells['first_row'][in_order])
+    return (present, first_row, group_sum(in_order, 'order_count'),
+            group_sum(in_finish, 'invalid_count'), group_sum(in_finish, 'violation_count'))
+
+
+def query_violation_cube(cube, order_start_dt, order_end_dt, finish_start_dt, finish_end_dt):
+    """从日期立方体（稠密或稀疏）中一次得到所有组合在指定整天时间范围内的统计结果"""
+    order_lo, order_hi = cube_day_window(cube['order_days'], order_start_dt, order_end_dt)
+    finish_lo, finish_hi = cube_day_window(cube['finish_days'], finish_start_dt, finish_end_dt)
+    cube_window = sparse_cube_window if 'cells' in cube else dense_cube_window
+    present, first_row, order_total_count, invalid_order_count, violation_order_count = cube_window(
+        cube, order_lo, order_hi, finish_lo, finish_hi)
+
+    # 下单时间范围内出现过的组合，按其在筛选后数据中首次出现的顺序排列
+    group_positions = np.flatnonzero(present)
+    group_positions = group_positions[np.argsort(first_row[group_positions], kind='stable')]
+
+    order_total_count = order_total_count[group_positions]
+    invalid_order_count = invalid_order_count[group_positions]
+    violation_order_count = violation_order_count[group_positions]
+
+    # 计算违规率
+    order_total_count = order_total_count.astype(np.int64)
+    violation_rate = np.divide(violation_order_count, order_total_count,
+                               out=np.zeros(len(group_positions)), where=order_total_count > 0)
+
+    groups = cube['groups'].iloc[group_positions]
+    result_df = pd.DataFrame({
+        '项目名称': groups['project_name'].to_numpy(),
+        '渠道名称': groups['channel_name'].to_numpy(),
+        '订单总数': order_total_count,  # 基于下单时间
+        '无效订单总数': invalid_order_count.astype(np.int64),  # 基于完成时间
+        '违规订单数': violation_order_count.astype(np.int64),  # 基于完成时间
+        '违规率': violation_rate
+    })
+
+    return result_df, len(group_positions)
+
+
+# datetime64[ns] 中 NaT 对应的int64值
+NAT_NS = np.iinfo(np.int64).min
+
+
+def to_epoch_ns(times):
+    """把datetime64列转换为int64纳秒时间戳（NaT为 NAT_NS）"""
+    return times.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+def build_statistics_index(df, order_times, finish_times):
+    """构建违规率统计使用的行索引：项目-渠道组合编号、按下单时间排序的行位置和int64时间戳
+
+    加载数据时构建一次，之后任意时间范围都用二分查找定位下单时间窗口，不再逐行比较整列时间。
+    """
+    required_columns = ['project_name', 'channel_name', 'bonus_invalid_text', 'bonus_text']
+    if any(col not in df.columns for col in required_columns):
+        return None
+
+    # 项目-渠道组合编号（按数据中首次出现的顺序，空值也作为单独的组合）
+    group_codes, first_rows = factorize_groups(df, ['project_name', 'channel_name'])
+    groups = df[['project_name', 'channel_name']].iloc[first_rows].reset_index(drop=True)
+
+    order_ns = to_epoch_ns(order_times)
+    order_rows = np.flatnonzero(order_ns != NAT_NS)
+    order_rows = order_rows[np.argsort(order_ns[order_rows], kind='stable')]
+
+    return {
+        'groups': groups,
+        # 项目名称或渠道名称为空的组合只参与组合数统计，订单数按0计
+        'named_groups': (groups['project_name'].notna() & groups['channel_name'].notna()).to_numpy(),
+        'group_codes': group_codes,
+        'order_rows': order_rows,
+        'sorted_order_ns': order_ns[order_rows],
+        'finish_ns': to_epoch_ns(finish_times),
+        'flags': encode_statistics_flags(df),
+    }
+
+
+def time_window_bounds(start_dt, end_dt):
+    """把时间范围转换为int64纳秒的闭区间，未指定的一端不限制"""
+    lower = pd.Timestamp(start_dt).value if start_dt else NAT_NS + 1
+    upper = pd.Timestamp(end_dt).value if end_dt else np.iinfo(np.int64).max
+    return lower, upper
+
+
+def order_window_rows(index, order_start_dt, order_end_dt):
+    """二分查找下单时间在指定范围内的行，按数据中的原始顺序返回行位置"""
+    order_lower, order_upper = time_window_bounds(order_start_dt, order_end_dt)
+    lo = np.searchsorted(index['sorted_order_ns'], order_lower, side='left')
+    hi = np.searchsorted(index['sorted_order_ns'], order_upper, side='right')
+    return np.sort(index['order_rows'][lo:hi])
+
+
+def query_statistics_index(index, rows, finish_start_dt, finish_end_dt):
+    """统计下单时间窗口内的行中，所有组合的订单数以及完成时间范围内的无效订单数和违规订单数"""
+    codes = index['group_codes'][rows]
+    finish_lower, finish_upper = time_window_bounds(finish_start_dt, finish_end_dt)
+    finish_ns = index['finish_ns'][rows]
+    in_finish_window = (finish_ns >= finish_lower) & (finish_ns <= finish_upper)
+
+    # 完成时间范围外的行代码为0，范围内为 1 + 行标记（无效加2，违规加1），一次计数得到 组合 × 代码 矩阵
+    group_count = len(index['groups'])
+    row_codes = np.where(in_finish_window, index['flags'][rows] + 1, 0)
+    counts = count_by_code(codes, row_codes, group_count, 5)
+    order_total_count = counts.sum(axis=1)
+    invalid_order_count = counts[:, 3] + counts[:, 4]
+    violation_order_count = counts[:, 2] + counts[:, 4]
+
+    named = index['named_groups']
+    order_total_count = np.where(named, order_total_count, 0)
+    invalid_order_count = np.where(named, invalid_order_count, 0)
+    violation_order_count = np.where(named, violation_order_count, 0)
+
+    # 下单时间范围内出现过的组合，按其在筛选后数据中首次出现的顺序排列
+    present_codes, first_positions = np.unique(codes, return_index=True)
+    group_positions = present_codes[np.argsort(first_positions, kind='stable')]
+
+    order_total_count = order_total_count[group_positions]
+    violation_order_count = violation_order_count[group_positions]
+    violation_rate = np.divide(violation_order_count, order_total_count,
+                               out=np.zeros(len(group_positions)), where=order_total_count > 0)
+
+    groups = index['groups'].iloc[group_positions]
+    result_df = pd.DataFrame({
+        '项目名称': groups['project_name'].to_numpy(),
+        '渠道名称': groups['channel_name'].to_numpy(),
+        '订单总数': order_total_count,  # 基于下单时间
+        '无效订单总数': invalid_order_count[group_positions],  # 基于完成时间
+        '违规订单数': violation_order_count,  # 基于完成时间
+        '违规率': violation_rate
+    })
+
+    return result_df, len(group_positions)
+
+
+def analyze_violation_statistics(df, order_start_dt, order_end_dt, finish_start_dt, finish_end_dt,
+                                 order_times=None, finish_times=None, cube=None, index=None):
+    """分析违规率统计
+
+    order_times/finish_times 为加载数据时预先解析好的时间列，未提供时才在此解析。
+    cube 为加载数据时构建的日期立方体，时间范围按整天选择时直接用它得到统计结果，不再需要行索引。
+    index 为加载数据时构建的行索引（见 build_statistics_index），需要时未提供才在此构建。
+    """
+    # 检查必要的列是否存在
+    required_columns = ['project_name', 'channel_name', 'bonus_invalid_text', 'bonus_text', 'order_time',
+                        'finish_time']
+    missing_columns = [col for col in required_columns if col not in df.columns]
+
+    if missing_columns:
+        raise MissingColumnsError(f"缺少必要的列: {missing_columns}", df.columns)
+
+    use_cube = cube is not None and is_day_aligned_range(order_start_dt, order_end_dt, finish_start_dt, finish_end_dt)
+
+    # 解析日期列（不写回共享的数据）
+    if order_times is None and (index is None or use_cube):
+        order_times = parse_date_column(df['order_time'])
+    if index is None and not use_cube:
+        if finish_times is None:
+            finish_times = parse_date_column(df['finish_time'])
+        index = build_statistics_index(df, order_times, finish_times)
+
+    # 筛选下单时间在指定范围内的所有订单（没有行索引时逐行比较下单时间）
+    if index is not None:
+        rows = order_window_rows(index, order_start_dt, order_end_dt)
+    else:
+        order_lower, order_upper = time_window_bounds(order_start_dt, order_end_dt)
+        order_ns = to_epoch_ns(order_times)
+        rows = np.flatnonzero((order_ns >= order_lower) & (order_ns <= order_upper))
+    order_filtered_df = df.iloc[rows].copy()
+
+    if len(order_filtered_df) == 0:
+        raise NoDataError("没有符合下单时间筛选条件的订单")
+
+    if use_cube:
+        # 日期范围按整天选择时，直接由预先计算的日期立方体得到所有组合的统计结果
+        result_df, total_combinations = query_violation_cube(
+            cube, order_start_dt, order_end_dt, finish_start_dt, finish_end_dt)
+    else:
+        # 一次分组归约统计完成时间在指定范围内的无效和违规订单
+        result_df, total_combinations = query_statistics_index(index, rows, finish_start_dt, finish_end_dt)
+
+    # 按项目名称排序
+    result_df = result_df.sort_values('项目名称', ascending=True)
+
+    return {
+        'analysis_result': result_df,
+        'order_filtered_data': order_filtered_df,
+        'total_combinations': total_combinations,
+        'order_total_count': len(order_filtered_df)
+    }
+
+
+# ==================== 内容哈希 ====================
+def hash_bytes(data):
+    """计算文件内容的哈希值"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """分块读取并计算本地文件内容的哈希值"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def hash_dataframe(df):
+    """计算DataFrame内容的哈希值（包含列名和数据类型）"""
+    hasher = hashlib.sha256()
+    hasher.update(repr(list(df.columns)).encode('utf-8'))
+    hasher.update(repr([str(dtype) for dtype in df.dtypes]).encode('utf-8'))
+    hasher.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return hasher.hexdigest()
+
+
+# ==================== 结果缓存 ====================
+# 估计文本列占用内存时抽样的行数（逐个统计字符串大小在大数据上需要数秒）
+MEMORY_SAMPLE_ROWS = 1000
+
+
+def estimate_memory_usage(values):
+    """估计Series占用的字节数：文本列按抽样的平均字符串大小推算，其余列按实际大小"""
+    size = int(values.memory_usage(deep=False, index=False))
+    if values.dtype == object and len(values):
+        sample = values.iloc[np.linspace(0, len(values) - 1, min(len(values), MEMORY_SAMPLE_ROWS)).astype(np.int64)]
+        size += int(sample.memory_usage(deep=True, index=False) - sample.memory_usage(deep=False, index=False)) \
+            * len(values) // len(sample)
+    return size
+
+
+def collect_object_sizes(value, sizes):
+    """收集结果中DataFrame、Series、数组、字节串和BytesIO占用的内存，记入 {id: 字节数}（同一对象只计一次）"""
+    if id(value) in sizes:
+        return
+    if isinstance(value, pd.DataFrame):
+        sizes[id(value)] = sum(estimate_memory_usage(value[column]) for column in value.columns)
+    elif isinstance(value, pd.Series):
+        sizes[id(value)] = estimate_memory_usage(value)
+    elif isinstance(value, np.ndarray):
+        sizes[id(value)] = value.nbytes
+    elif isinstance(value, (bytes, bytearray, str)):
+        sizes[id(value)] = len(value)
+    elif isinstance(value, io.BytesIO):
+        # 导出文件缓存的是生成时写入的BytesIO；视图用完立即释放，不影响之后读取
+        with value.getbuffer() as view:
+            sizes[id(value)] = view.nbytes
+    elif isinstance(value, dict):
+        for item in value.values():
+            collect_object_sizes(item, sizes)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            collect_object_sizes(item, sizes)
+
+
+class ResultCache:
+    """按LRU淘汰、带过期时间的结果缓存，键中包含数据内容哈希和分析参数
+
+    同时限制条目数和占用内存：分析结果中的原始数据与读取结果是同一个DataFrame，多个条目共用的对象只计一次。
+    最近写入的条目总是保留，即使单独超过内存上限。
+    """
+
+    def __init__(self, max_entries=32, ttl_seconds=3600, max_bytes=2048 * 1024 ** 2):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        # 缓存中的对象 {id: [字节数, 引用该对象的条目数]}；对象被条目引用，存活期间id不会复用
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def configure(self, max_entries, ttl_seconds, max_bytes):
+        """调整缓存容量、过期时间和内存上限，超出部分立即淘汰"""
+        with self._lock:
+            self.max_entries = max_entries
+            self.ttl_seconds = ttl_seconds
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            stored_at, value, _ = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        # 在锁外估计大小，避免大数据阻塞其他会话读取缓存
+        sizes = {}
+        collect_object_sizes(value, sizes)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), value, sizes)
+            for object_id, size in sizes.items():
+                counted = self._objects.setdefault(object_id, [size, 0])
+                if counted[1] == 0:
+                    self.total_bytes += size
+                counted[1] += 1
+            self._evict()
+
+    def get_or_compute(self, key, compute):
+        """返回缓存的结果，未命中时调用compute计算并缓存（结果为None时不缓存）"""
+        result = self.get(key)
+        if result is None:
+            result = compute()
+            if result is not None:
+                self.set(key, result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._objects.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        _, _, sizes = self._entries.pop(key)
+        for object_id in sizes:
+            counted = self._objects[object_id]
+            counted[1] -= 1
+            if counted[1] == 0:
+                self.total_bytes -= counted[0]
+                del self._objects[object_id]
+
+    def _evict(self):
+        now = time.monotonic()
+        expired_keys = [key for key, (stored_at, _, _) in self._entries.items() if now - stored_at > self.ttl_seconds]
+        for key in expired_keys:
+            self._remove(key)
+
+        while len(self._entries) > self.max_entries or (self.total_bytes > self.max_bytes and len(self._entries) > 1):
+            self._remove(next(iter(self._entries)))
+
+
+# ==================== 后台任务队列 ====================
+class JobQueue:
+    """在线程池中执行分析任务：相同的任务（键相同）只计算一次，没有会话等待的任务在开始前取消
+
+    任务函数接收一个进度字典（可写入当前步骤和完成比例）。已经开始的任务无法中断，计算完成后结果仍写入结果缓存。
+    """
+
+    def __init__(self, max_workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-job")
+        self._jobs = {}
+        # 取消任务时会在持有锁的线程中同步调用完成回调，因此使用可重入锁
+        self._lock = threading.RLock()
+
+    def submit(self, key, compute):
+        """提交任务并登记一个等待者；相同键的任务正在排队或计算时直接返回该任务"""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                job = {'key': key, 'progress': {}, 'waiters': 0, 'submitted_at': time.monotonic()}
+                job['future'] = self._executor.submit(compute, job['progress'])
+                self._jobs[key] = job
+                new_job = True
+            else:
+                new_job = False
+            job['waiters'] += 1
+
+        if new_job:
+            job['future'].add_done_callback(lambda _: self._remove(job))
+        return job
+
+    def release(self, job):
+        """等待者不再需要任务结果（参数已修改或已加载其他数据），没有等待者且尚未开始的任务直接取消"""
+        with self._lock:
+            job['waiters'] -= 1
+            if job['waiters'] <= 0:
+                job['future'].cancel()
+
+    def _remove(self, job):
+        with self._lock:
+            if self._jobs.get(job['key']) is job:
+                del self._jobs[job['key']]
+
+    def __len__(self):
+        return len(self._jobs)
+
+
+# ==================== 流式分析 ====================
+def analyze_violation_cube(cube, order_start_dt, order_end_dt, finish_start_dt, finish_end_dt):
+    """只使用日期立方体分析违规率统计（流式分析模式下不保留原始数据，筛选数据为None）"""
+    order_lo, order_hi = cube_day_window(cube['order_days'], order_start_dt, order_end_dt)
+    order_total_count = int(cube['row_cum'][order_hi] - cube['row_cum'][order_lo])
+
+    if order_total_count == 0:
+        raise NoDataError("没有符合下单时间筛选条件的订单")
+
+    result_df, total_combinations = query_violation_cube(
+        cube, order_start_dt, order_end_dt, finish_start_dt, finish_end_dt)
+
+    # 按项目名称排序
+    result_df = result_df.sort_values('项目名称', ascending=True)
+
+    return {
+        'analysis_result': result_df,
+        'order_filtered_data': None,
+        'total_combinations': total_combinations,
+        'order_total_count': order_total_count
+    }
+
+
+def analyze_csv_in_chunks(source, chunk_size=STREAM_CHUNK_SIZE, fixed_point=False):
+    """分块读取CSV，逐块计算可合并的部分聚合结果，最后合并得到违规率分析结果和日期立方体
+
+    峰值内存取决于分块大小而不是文件大小，原始数据不会整体保留在内存中。
+    """
+    channel_partials = []
+    project_code_partials = []
+    cube_partials = []
+    total_records = 0
+    columns = None
+
+    # 每块按相同的列类型读取，避免逐块推断出不同的类型（如某块的项目编号中有空值时推断为float）；
+    # 金额列仍逐块转换，无法转换为数字的内容置为空，与整体读取时的处理一致
+    dtypes = {column: dtype for column, dtype in CSV_COLUMN_DTYPES.items()
+              if column in ANALYSIS_COLUMNS and column not in PRICE_COLUMNS}
+    reader = pd.read_csv(source, chunksize=chunk_size, dtype=dtypes,
+                         usecols=lambda column: column in ANALYSIS_COLUMNS)
+    for chunk in reader:
+        if columns is None:
+            columns = list(chunk.columns)
+            check_complete_data_columns(columns)
+
+        # 每块的行号接着上一块继续编号，保证组合的出现顺序与完整数据一致
+        chunk.index = pd.RangeIndex(total_records, total_records + len(chunk))
+
+        for col in PRICE_COLUMNS:
+            if not pd.api.types.is_numeric_dtype(chunk[col]):
+                chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+
+        channel_partials.append(aggregate_channel_stats(chunk, encode_price_cents(chunk) if fixed_point else None))
+        if 'project_code' in columns:
+            project_code_partials.append(first_project_codes(chunk))
+        if all(column in columns for column in TIME_COLUMNS):
+            times = parse_time_columns(chunk)
+            cube_partials.append(
+                collect_cube_cells(chunk, times['order_time'], times['finish_time'], total_records))
+
+        total_records += len(chunk)
+
+    if total_records == 0:
+        raise NoDataError("文件中没有数据")
+
+    # 合并各块的部分聚合结果（拼接顺序即数据顺序，合并后组合顺序不变）
+    channel_stats = pd.concat(channel_partials).groupby(
+        level=['project_name', 'channel_name'], sort=False, dropna=False, observed=True).sum()
+
+    project_code_map = None
+    if project_code_partials:
+        project_code_map = build_project_code_map(
+            pd.concat(project_code_partials).groupby(level=0, sort=False, observed=True).first())
+
+    complete_result = build_complete_result(channel_stats, project_code_map, fixed_point=fixed_point)
+
+    return {
+        'complete_analysis': {
+            **complete_result,
+            'filtered_data': None,
+            'total_records': total_records
+        },
+        'violation_cube': assemble_violation_cube(merge_cube_cells(cube_partials)) if cube_partials else None,
+        'total_records': total_records
+    }
+
+
+# ==================== 多进程聚合 ====================
+# 并行聚合的最少行数和最少进程数，少于任一值时直接单进程计算。
+# 单进程的bincount聚合每百万行约0.1秒，并行时父进程编码、分区和复制共享内存约占其40%，
+# 子进程还要重新解码分区数据；实测2个进程在任何行数都不比单进程快，
+# 4个进程在约200万行时持平、400万行时快约20%（热进程池，不含首次启动进程池的数秒）
+PARALLEL_MIN_ROWS = 4000000
+PARALLEL_MIN_WORKERS = 4
+
+# 各进程数对应的进程池，跨分析复用，避免每次重新启动进程和导入pandas
+_process_pools = {}
+
+# 渠道聚合需要的文本列
+CHANNEL_TEXT_COLUMNS = ['project_name', 'channel_name', 'bonus_text', 'bonus_invalid_text', 'order_text']
+
+
+def get_process_pool(workers):
+    """返回指定进程数的进程池（使用forkserver/spawn启动，避免在多线程的看板进程中fork）"""
+    pool = _process_pools.get(workers)
+    if pool is None:
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+        _process_pools[workers] = pool
+    return pool
+
+
+def shutdown_process_pools():
+    """关闭所有进程池（在子进程中使用进程池时，退出前必须调用，否则子进程无法退出）"""
+    while _process_pools:
+        _, pool = _process_pools.popitem()
+        pool.shutdown()
+
+
+def create_shared_arrays(arrays):
+    """把 {名称: numpy数组} 复制到一块共享内存，返回 (共享内存, 布局)
+
+    布局为 {名称: (偏移, dtype, 长度)}，子进程用 attach_shared_arrays 直接映射，不需要pickle数据。
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = (offset, array.dtype.str, len(array))
+        # 每个数组按8字节对齐
+        offset += (array.nbytes + 7) // 8 * 8
+
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for name, array in arrays.items():
+        start, dtype, length = layout[name]
+        np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=start)[:] = array
+    return shm, layout
+
+
+def attach_shared_arrays(shm_name, layout):
+    """在子进程中映射共享内存中的数组，返回 (共享内存, {名称: 数组视图})"""
+    # 进程池的子进程与父进程共用资源跟踪器，共享内存由父进程在聚合结束后统一释放
+    shm = shared_memory.SharedMemory(name=shm_name)
+    arrays = {
+        name: np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=offset)
+        for name, (offset, dtype, length) in layout.items()
+    }
+    return shm, arrays
+
+
+def text_column_codes(series):
+    """文本列转换为 (整数编码, (取值列表, 是否为category列))，空值编码为-1；category列直接使用类别编码"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), (series.cat.categories, True)
+    codes, uniques = pd.factorize(series)
+    return codes, (uniques, False)
+
+
+def decode_text_column(codes, categories):
+    """text_column_codes 的逆操作，还原为与原列相同类型的列（空值为NaN）"""
+    values, is_categorical = categories
+    if is_categorical:
+        return pd.Categorical.from_codes(codes, values)
+    # 末尾追加NaN，编码-1正好取到空值
+    return np.append(np.asarray(values, dtype=object), np.nan)[codes]
+
+
+def partition_by_project(project_codes, partition_count):
+    """按项目把行分到各分区（同一项目的行在同一分区），按行数贪心均衡
+
+    返回 (每行所在的分区编号, 各分区的行数)。不在父进程中按分区重排行（排序的开销与整个聚合相当），
+    由各子进程自己选出本分区的行，选出的行保持数据中的原始顺序。
+    """
+    project_rows = np.bincount(project_codes.astype(np.int64) + 1)
+    partition_rows = np.zeros(partition_count, dtype=np.int64)
+    project_partition = np.zeros(len(project_rows), dtype=np.int16)
+    for project in np.argsort(-project_rows, kind='stable'):
+        target = np.argmin(partition_rows)
+        project_partition[project] = target
+        partition_rows[target] += project_rows[project]
+
+    return project_partition[project_codes.astype(np.int64) + 1], partition_rows
+
+
+def _aggregate_partition(shm_name, layout, categories, partition):
+    """子进程：聚合一个分区的渠道统计，返回 (渠道统计, 各组合首次出现的全局行位置)"""
+    shm, arrays = attach_shared_arrays(shm_name, layout)
+    try:
+        rows = np.flatnonzero(arrays['partition'] == partition)
+        part_df = pd.DataFrame(
+            {column: decode_text_column(arrays[column][rows], categories[column]) for column in CHANNEL_TEXT_COLUMNS},
+            index=rows
+        )
+        prices = {column: arrays[column][rows] for column in PRICE_COLUMNS}
+    finally:
+        # 释放共享内存前必须先释放所有视图
+        del arrays
+        shm.close()
+
+    price_cents = None
+    if prices[PRICE_COLUMNS[0]].dtype == np.int64:
+        price_cents = prices
+    else:
+        for column, values in prices.items():
+            part_df[column] = values
+
+    groups = factorize_groups(part_df, ['project_name', 'channel_name'])
+    channel_stats = aggregate_channel_stats(part_df, price_cents, groups=groups)
+    return channel_stats, rows[groups[1]]
+
+
+def aggregate_channel_stats_parallel(df, workers, price_cents=None):
+    """多进程版 aggregate_channel_stats：按项目分区并行聚合，再按组合首次出现的位置合并
+
+    同一组合的所有行都在同一分区并保持原始顺序，每个组合的求和顺序与单进程相同，结果完全一致。
+    数据通过共享内存传给子进程（文本列只传整数编码），不需要pickle DataFrame。
+    """
+    codes = {}
+    categories = {}
+    for column in CHANNEL_TEXT_COLUMNS:
+        codes[column], categories[column] = text_column_codes(df[column])
+
+    partition_count = min(workers, len(categories['project_name'][0]) + 1)
+    if partition_count < PARALLEL_MIN_WORKERS or len(df) < PARALLEL_MIN_ROWS:
+        return aggregate_channel_stats(df, price_cents)
+
+    row_partition, partition_rows = partition_by_project(codes['project_name'], partition_count)
+    if price_cents is not None:
+        prices = price_cents
+    else:
+        prices = {column: price_weights(df[column]) for column in PRICE_COLUMNS}
+
+    shm, layout = create_shared_arrays({'partition': row_partition, **codes, **prices})
+    try:
+        pool = get_process_pool(workers)
+        futures = [
+            pool.submit(_aggregate_partition, shm.name, layout, categories, partition)
+            for partition in range(partition_count) if partition_rows[partition] > 0
+        ]
+        partials = [future.result() for future in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    # 合并后按组合在完整数据中首次出现的位置排序，与单进程的组合顺序一致
+    channel_stats = pd.concat([partial for partial, _ in partials])
+    first_rows = np.concatenate([first for _, first in partials])
+    return channel_stats.iloc[np.argsort(first_rows, kind='stable')]
+
+
+# ==================== DuckDB引擎 ====================
+# 直接在CSV或Parquet文件上执行SQL聚合，数据不加载到Python内存，只返回聚合后的小表
+def sql_literal(value):
+    """SQL字符串字面量"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def sql_text_list(values):
+    return ', '.join(sql_literal(value) for value in values)
+
+
+def text_result_values(series):
+    """查询结果中的文本列转换为object数组，空值（None）统一为NaN，与pandas引擎的结果一致"""
+    return series.astype(object).where(series.notna(), np.nan).to_numpy()
+
+
+def duckdb_connect():
+    """创建进程内的DuckDB连接（未安装duckdb时抛出 AnalysisError）"""
+    if duckdb is None:
+        raise AnalysisError("使用DuckDB引擎需要安装duckdb")
+    return duckdb.connect()
+
+
+def duckdb_scan_sql(con, path):
+    """返回读取数据文件的SQL和文件中的列名
+
+    row_id 为行在文件中的位置，用于还原组合在数据中首次出现的顺序；
+    CSV中的文本列、金额列和时间列按文本读取，与pandas读取的结果保持一致。
+    """
+    if path.endswith('.parquet'):
+        source_sql = f"read_parquet({sql_literal(path)}, file_row_number=true)"
+        columns = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {source_sql}").fetchall()]
+        columns.remove('file_row_number')
+        return f"SELECT * EXCLUDE (file_row_number), file_row_number AS row_id FROM {source_sql}", columns
+
+    columns = [row[0] for row in con.execute(
+        f"DESCRIBE SELECT * FROM read_csv({sql_literal(path)}, header=true)").fetchall()]
+    text_columns = [column for column in CATEGORY_COLUMNS + PRICE_COLUMNS + TEXT_COLUMNS + TIME_COLUMNS
+                    if column in columns]
+    types = ', '.join(f"{sql_literal(column)}: 'VARCHAR'" for column in text_columns)
+    source_sql = f"read_csv({sql_literal(path)}, header=true, types={{{types}}})"
+    # 不指定排序的窗口按文件中的读取顺序编号
+    return f"SELECT *, row_number() OVER () - 1 AS row_id FROM {source_sql}", columns
+
+
+def duckdb_source_info(path):
+    """返回数据文件的列名和行数"""
+    con = duckdb_connect()
+    scan_sql, columns = duckdb_scan_sql(con, path)
+    total_records = con.execute(f"SELECT count(*) FROM ({scan_sql})").fetchone()[0]
+    return {'columns': columns, 'total_records': total_records}
+
+
+def duckdb_price_sql(column, fixed_point):
+    """金额列表达式：无法转换为数字的值和空值按0计，定点数模式下换算为整数分（与np.round一样四舍六入五成双）"""
+    price = f"COALESCE(TRY_CAST({column} AS DOUBLE), 0)"
+    if fixed_point:
+        return f"CAST(round_even({price} * 100, 0) AS BIGINT)"
+    return price
+
+
+def analyze_complete_data_duckdb(path, fixed_point=False):
+    """DuckDB版 analyze_complete_data：在数据文件上用一次分组SQL计算渠道级统计
+
+    计数和GMV口径与 aggregate_channel_stats 相同，结果表由 build_complete_result 生成。
+    浮点GMV的求和顺序与pandas不同，合计可能有最后一位的舍入差异；需要精确到分时使用定点数模式。
+    """
+    con = duckdb_connect()
+    scan_sql, columns = duckdb_scan_sql(con, path)
+    check_complete_data_columns(columns)
+
+    reason_sql = "CAST(bonus_invalid_text AS VARCHAR)"
+    status_sql = "CAST(bonus_text AS VARCHAR)"
+    completed_sql = f"{status_sql} = '有效' AND CAST(order_text AS VARCHAR) = '已完成'"
+    estimate_sql = duckdb_price_sql('estimate_cos_price', fixed_point)
+    actual_sql = duckdb_price_sql('actual_cos_price', fixed_point)
+    amount_type = 'BIGINT' if fixed_point else 'DOUBLE'
+
+    def gmv(price_sql, condition=None):
+        filter_sql = f" FILTER (WHERE {condition})" if condition else ""
+        return f"CAST(COALESCE(sum({price_sql}){filter_sql}, 0) AS {amount_type})"
+
+    reason_counts = ',\n'.join(
+        f"count(*) FILTER (WHERE {reason_sql} = {sql_literal(reason)}) AS {column}"
+        for reason, column in INVALID_REASON_COLUMNS.items()
+    )
+    channel_stats = con.execute(f"""
+        SELECT
+            CAST(project_name AS VARCHAR) AS project_name,
+            CAST(channel_name AS VARCHAR) AS channel_name,
+            min(row_id) AS first_row,
+            count(*) AS total_count,
+            {reason_counts},
+            count(*) FILTER (WHERE {reason_sql} <> ''
+                             AND {reason_sql} NOT IN ({sql_text_list(INVALID_REASON_COLUMNS)})) AS invalid_other,
+            {gmv(estimate_sql)} AS estimate_commission_gmv,
+            {gmv(estimate_sql, f"{status_sql} = '有效'")} AS estimate_completed_gmv,
+            {gmv(actual_sql, completed_sql)} AS actual_commission_gmv,
+            {gmv(estimate_sql, f"{reason_sql} = '无效-违规订单'")} AS invalid_violation_gmv,
+            {gmv(estimate_sql, f"{reason_sql} = '无效-风险订单'")} AS invalid_risk_gmv
+        FROM ({scan_sql})
+        GROUP BY 1, 2
+        ORDER BY first_row
+    """).df()
+
+    total_records = int(channel_stats['total_count'].sum())
+    if total_records == 0:
+        raise NoDataError("文件中没有数据")
+
+    channel_stats = channel_stats.drop(columns='first_row').set_index(['project_name', 'channel_name'])
+
+    project_code_map = None
+    if 'project_code' in columns:
+        first_codes = con.execute(f"""
+            SELECT CAST(project_name AS VARCHAR) AS project_name,
+                   arg_min(project_code, row_id) FILTER (WHERE project_code IS NOT NULL) AS project_code
+            FROM ({scan_sql})
+            WHERE project_name IS NOT NULL
+            GROUP BY 1
+        """).df()
+        project_code_map = build_project_code_map(first_codes.set_index('project_name')['project_code'])
+
+    complete_result = build_complete_result(channel_stats, project_code_map, fixed_point=fixed_point)
+
+    return {
+        **complete_result,
+        'filtered_data': None,
+        'total_records': total_records
+    }
+
+
+def duckdb_time_sql(con, scan_sql, column):
+    """时间列解析表达式：与 parse_date_column 相同，主要格式优先，其余格式依次兜底，缺失和无法解析的值为NULL"""
+    text_sql = f"NULLIF(trim(CAST({column} AS VARCHAR)), '')"
+    missing_sql = f"CAST({column} AS VARCHAR) = {sql_literal(MISSING_DATE_SENTINEL)}"
+    samples = con.execute(f"""
+        SELECT {text_sql} FROM ({scan_sql})
+        WHERE {text_sql} IS NOT NULL AND NOT {missing_sql}
+        LIMIT {DATE_FORMAT_SAMPLE_SIZE}
+    """).df().iloc[:, 0]
+
+    dominant_format = detect_date_format(samples) if len(samples) else None
+    formats = [dominant_format] if dominant_format else []
+    formats += [fmt for fmt in DATE_FORMATS if fmt != dominant_format]
+    parsed_sql = ', '.join(f"try_strptime({text_sql}, {sql_literal(fmt)})" for fmt in formats)
+    return f"CASE WHEN {missing_sql} THEN NULL ELSE COALESCE({parsed_sql}) END"
+
+
+def duckdb_parsed_scan_sql(con, path):
+    """在读取数据的SQL上增加解析后的 order_ts 和 finish_ts 列"""
+    scan_sql, columns = duckdb_scan_sql(con, path)
+    required_columns = ['project_name', 'channel_name', 'bonus_invalid_text', 'bonus_text', 'order_time',
+                        'finish_time']
+    missing_columns = [col for col in required_columns if col not in columns]
+    if missing_columns:
+        raise MissingColumnsError(f"缺少必要的列: {missing_columns}", columns)
+
+    return f"""
+        SELECT
+            row_id,
+            CAST(project_name AS VARCHAR) AS project_name,
+            CAST(channel_name AS VARCHAR) AS channel_name,
+            CAST(bonus_text AS VARCHAR) AS bonus_text,
+            CAST(bonus_invalid_text AS VARCHAR) AS bonus_invalid_text,
+            {duckdb_time_sql(con, scan_sql, 'order_time')} AS order_ts,
+            {duckdb_time_sql(con, scan_sql, 'finish_time')} AS finish_ts
+        FROM ({scan_sql})
+    """
+
+
+def duckdb_time_bounds(path):
+    """返回数据中下单时间和完成时间的最小值和最大值（用于时间选择器的默认范围）"""
+    con = duckdb_connect()
+    parsed_sql = duckdb_parsed_scan_sql(con, path)
+    bounds = con.execute(
+        f"SELECT min(order_ts), max(order_ts), min(finish_ts), max(finish_ts) FROM ({parsed_sql})").fetchone()
+    return {
+        'order_time': pd.Series(bounds[:2], dtype='datetime64[ns]'),
+        'finish_time': pd.Series(bounds[2:], dtype='datetime64[ns]')
+    }
+
+
+def duckdb_range_sql(column, start_dt, end_dt, params):
+    """时间范围条件（闭区间，未指定的一端不限制），参数追加到params"""
+    conditions = [f"{column} IS NOT NULL"]
+    if start_dt:
+        conditions.append(f"{column} >= ?")
+        params.append(pd.Timestamp(start_dt).to_pydatetime())
+    if end_dt:
+        conditions.append(f"{column} <= ?")
+        params.append(pd.Timestamp(end_dt).to_pydatetime())
+    return ' AND '.join(conditions)
+
+
+def analyze_violation_statistics_duckdb(path, order_start_dt, order_end_dt, finish_start_dt, finish_end_dt):
+    """DuckDB版 analyze_violation_statistics：下单时间和完成时间两个维度的筛选都下推到SQL中
+
+    统计口径与 query_statistics_index 相同；不保留原始数据，筛选数据为None。
+    """
+    con = duckdb_connect()
+    parsed_sql = duckdb_parsed_scan_sql(con, path)
+
+    params = []
+    finish_sql = duckdb_range_sql('finish_ts', finish_start_dt, finish_end_dt, params)
+    order_sql = duckdb_range_sql('order_ts', order_start_dt, order_end_dt, params)
+    named_sql = "project_name IS NOT NULL AND channel_name IS NOT NULL"
+    group_stats = con.execute(f"""
+        SELECT
+            project_name,
+            channel_name,
+            min(row_id) AS first_row,
+            count(*) AS row_count,
+            count(*) FILTER (WHERE {named_sql}) AS order_total_count,
+            count(*) FILTER (WHERE {named_sql} AND in_finish_window AND bonus_text = '无效') AS invalid_order_count,
+            count(*) FILTER (WHERE {named_sql} AND in_finish_window
+                             AND bonus_invalid_text IN ({sql_text_list(VIOLATION_REASONS)})) AS violation_order_count
+        FROM (
+            SELECT *, COALESCE({finish_sql}, false) AS in_finish_window FROM ({parsed_sql})
+        )
+        WHERE {order_sql}
+        GROUP BY 1, 2
+        ORDER BY first_row
+    """, params).df()
+
+    order_total_count = int(group_stats['row_count'].sum())
+    if order_total_count == 0:
+        raise NoDataError("没有符合下单时间筛选条件的订单")
+
+    total_orders = group_stats['order_total_count'].to_numpy(dtype=np.int64)
+    violation_orders = group_stats['violation_order_count'].to_numpy(dtype=np.int64)
+    result_df = pd.DataFrame({
+        '项目名称': text_result_values(group_stats['project_name']),
+        '渠道名称': text_result_values(group_stats['channel_name']),
+        '订单总数': total_orders,  # 基于下单时间
+        '无效订单总数': group_stats['invalid_order_count'].to_numpy(dtype=np.int64),  # 基于完成时间
+        '违规订单数': violation_orders,  # 基于完成时间
+        '违规率': np.divide(violation_orders, total_orders, out=np.zeros(len(group_stats)), where=total_orders > 0)
+    })
+
+    # 按项目名称排序
+    result_df = result_df.sort_values('项目名称', ascending=True)
+
+    return {
+        'analysis_result': result_df,
+        'order_filtered_data': None,
+        'total_combinations': len(group_stats),
+        'order_total_count': order_total_count
+    }
+
+
+# ==================== Polars引擎 ====================
+# 以LazyFrame延迟扫描CSV或Parquet文件：列裁剪和时间筛选由查询优化器下推到扫描中，分组聚合多线程流式执行
+# CSV中project_code的类型按前若干行推断
+POLARS_INFER_SCHEMA_LENGTH = 10000
+
+
+def polars_scan(path):
+    """返回延迟扫描数据文件的LazyFrame（带 row_id 行号列）和文件中的列名"""
+    if pl is None:
+        raise AnalysisError("使用Polars引擎需要安装polars")
+
+    if path.endswith('.parquet'):
+        lf = pl.scan_parquet(path, row_index_name='row_id')
+    else:
+        columns = pl.scan_csv(path, infer_schema_length=POLARS_INFER_SCHEMA_LENGTH).collect_schema().names()
+        # 文本列、金额列、项目编号和时间列按文本读取，与pandas读取的结果保持一致
+        text_columns = [column for column in CATEGORY_COLUMNS + PRICE_COLUMNS + TEXT_COLUMNS + TIME_COLUMNS
+                        if column in columns]
+        lf = pl.scan_csv(path, row_index_name='row_id', infer_schema_length=POLARS_INFER_SCHEMA_LENGTH,
+                         schema_overrides={column: pl.String for column in text_columns})
+    columns = [column for column in lf.collect_schema().names() if column != 'row_id']
+    return lf, columns
+
+
+def polars_collect(lf):
+    """使用流式引擎执行查询，内存占用不随文件大小增长"""
+    return lf.collect(engine='streaming')
+
+
+def polars_text(column):
+    return pl.col(column).cast(pl.String)
+
+
+def polars_source_info(path):
+    """返回数据文件的列名和行数"""
+    lf, columns = polars_scan(path)
+    total_records = polars_collect(lf.select(pl.len())).item()
+    return {'columns': columns, 'total_records': total_records}
+
+
+def polars_price_expr(column, fixed_point):
+    """金额列表达式：无法转换为数字的值和空值按0计，定点数模式下换算为整数分（与np.round一样四舍六入五成双）"""
+    price = pl.col(column).cast(pl.Float64, strict=False).fill_nan(None).fill_null(0.0)
+    if fixed_point:
+        return (price * 100).round(0, mode='half_to_even').cast(pl.Int64)
+    return price
+
+
+def analyze_complete_data_polars(path, fixed_point=False):
+    """Polars版 analyze_complete_data：延迟扫描数据文件，一次分组聚合计算渠道级统计
+
+    计数和GMV口径与 aggregate_channel_stats 相同，结果表由 build_complete_result 生成。
+    浮点GMV的求和顺序与pandas不同，合计可能有最后一位的舍入差异；需要精确到分时使用定点数模式。
+    """
+    lf, columns = polars_scan(path)
+    check_complete_data_columns(columns)
+
+    reason = polars_text('bonus_invalid_text')
+    status = polars_text('bonus_text')
+    completed = (status == '有效') & (polars_text('order_text') == '已完成')
+    estimate_price = polars_price_expr('estimate_cos_price', fixed_point)
+    actual_price = polars_price_expr('actual_cos_price', fixed_point)
+
+    def count(condition):
+        return condition.sum().cast(pl.Int64)
+
+    def gmv(price, condition=None):
+        return (price if condition is None else price.filter(condition)).sum()
+
+    query = lf.group_by(polars_text('project_name'), polars_text('channel_name')).agg(
+        pl.col('row_id').min().alias('first_row'),
+        pl.len().cast(pl.Int64).alias('total_count'),
+        *[count(reason == reason_text).alias(column) for reason_text, column in INVALID_REASON_COLUMNS.items()],
+        count((reason != '') & ~reason.is_in(list(INVALID_REASON_COLUMNS))).alias('invalid_other'),
+        gmv(estimate_price).alias('estimate_commission_gmv'),
+        gmv(estimate_price, status == '有效').alias('estimate_completed_gmv'),
+        gmv(actual_price, completed).alias('actual_commission_gmv'),
+        gmv(estimate_price, reason == '无效-违规订单').alias('invalid_violation_gmv'),
+        gmv(estimate_price, reason == '无效-风险订单').alias('invalid_risk_gmv'),
+    ).sort('first_row')
+    channel_stats = polars_collect(query).to_pandas()
+
+    total_records = int(channel_stats['total_count'].sum())
+    if total_records == 0:
+        raise NoDataError("文件中没有数据")
+
+    channel_stats = channel_stats.drop(columns='first_row').set_index(['project_name', 'channel_name'])
+
+    project_code_map = None
+    if 'project_code' in columns:
+        first_codes = polars_collect(
+            lf.filter(pl.col('project_name').is_not_null())
+            .group_by(polars_text('project_name'))
+            .agg(pl.col('project_code').sort_by('row_id').drop_nulls().first())
+        ).to_pandas()
+        project_code_map = build_project_code_map(first_codes.set_index('project_name')['project_code'])
+
+    complete_result = build_complete_result(channel_stats, project_code_map, fixed_point=fixed_point)
+
+    return {
+        **complete_result,
+        'filtered_data': None,
+        'total_records': total_records
+    }
+
+
+def polars_time_expr(lf, column):
+    """时间列解析表达式：与 parse_date_column 相同，主要格式优先，其余格式依次兜底，缺失和无法解析的值为null"""
+    raw = polars_text(column)
+    text = raw.str.strip_chars()
+    text = pl.when(text != '').then(text)
+    missing = raw == MISSING_DATE_SENTINEL
+    samples = polars_collect(
+        lf.filter(text.is_not_null() & ~missing).select(text.alias(column)).head(DATE_FORMAT_SAMPLE_SIZE)
+    ).to_series().to_pandas()
+
+    dominant_format = detect_date_format(samples) if len(samples) else None
+    formats = [dominant_format] if dominant_format else []
+    formats += [fmt for fmt in DATE_FORMATS if fmt != dominant_format]
+    parsed = pl.coalesce([text.str.strptime(pl.Datetime('us'), fmt, strict=False) for fmt in formats])
+    return pl.when(~missing).then(parsed)
+
+
+def polars_parsed_scan(path):
+    """延迟扫描数据文件，只保留违规率统计需要的列，并增加解析后的 order_ts 和 finish_ts 列"""
+    lf, columns = polars_scan(path)
+    required_columns = ['project_name', 'channel_name', 'bonus_invalid_text', 'bonus_text', 'order_time',
+                        'finish_time']
+    missing_columns = [col for col in required_columns if col not in columns]
+    if missing_columns:
+        raise MissingColumnsError(f"缺少必要的列: {missing_columns}", columns)
+
+    return lf.select(
+        'row_id',
+        polars_text('project_name'),
+        polars_text('channel_name'),
+        polars_text('bonus_text'),
+        polars_text('bonus_invalid_text'),
+        polars_time_expr(lf, 'order_time').alias('order_ts'),
+        polars_time_expr(lf, 'finish_time').alias('finish_ts'),
+    )
+
+
+def polars_time_bounds(path):
+    """返回数据中下单时间和完成时间的最小值和最大值（用于时间选择器的默认范围）"""
+    bounds = polars_collect(polars_parsed_scan(path).select(
+        pl.col('order_ts').min().alias('order_min'),
+        pl.col('order_ts').max().alias('order_max'),
+        pl.col('finish_ts').min().alias('finish_min'),
+        pl.col('finish_ts').max().alias('finish_max'),
+    )).row(0)
+    return {
+        'order_time': pd.Series(bounds[:2], dtype='datetime64[ns]'),
+        'finish_time': pd.Series(bounds[2:], dtype='datetime64[ns]')
+    }
+
+
+def polars_range_expr(column, start_dt, end_dt):
+    """时间范围条件（闭区间，未指定的一端不限制）"""
+    condition = pl.col(column).is_not_null()
+    if start_dt:
+        condition = condition & (pl.col(column) >= pd.Timestamp(start_dt).to_pydatetime())
+    if end_dt:
+        condition = condition & (pl.col(column) <= pd.Timestamp(end_dt).to_pydatetime())
+    return condition
+
+
+def analyze_violation_statistics_polars(path, order_start_dt, order_end_dt, finish_start_dt, finish_end_dt):
+    """Polars版 analyze_violation_statistics：下单时间筛选下推到文件扫描中，完成时间条件在分组聚合中计算
+
+    统计口径与 query_statistics_index 相同；不保留原始数据，筛选数据为None。
+    """
+    lf = polars_parsed_scan(path)
+
+    named = pl.col('project_name').is_not_null() & pl.col('channel_name').is_not_null()
+    in_finish_window = polars_range_expr('finish_ts', finish_start_dt, finish_end_dt)
+    query = lf.filter(polars_range_expr('order_ts', order_start_dt, order_end_dt)).group_by(
+        'project_name', 'channel_name'
+    ).agg(
+        pl.col('row_id').min().alias('first_row'),
+        pl.len().alias('row_count'),
+        named.sum().alias('order_total_count'),
+        (named & in_finish_window & (pl.col('bonus_text') == '无效')).sum().alias('invalid_order_count'),
+        (named & in_finish_window & pl.col('bonus_invalid_text').is_in(VIOLATION_REASONS)).sum()
+        .alias('violation_order_count'),
+    ).sort('first_row')
+    group_stats = polars_collect(query).to_pandas()
+
+    order_total_count = int(group_stats['row_count'].sum())
+    if order_total_count == 0:
+        raise NoDataError("没有符合下单时间筛选条件的订单")
+
+    total_orders = group_stats['order_total_count'].to_numpy(dtype=np.int64)
+    violation_orders = group_stats['violation_order_count'].to_numpy(dtype=np.int64)
+    result_df = pd.DataFrame({
+        '项目名称': text_result_values(group_stats['project_name']),
+        '渠道名称': text_result_values(group_stats['channel_name']),
+        '订单总数': total_orders,  # 基于下单时间
+        '无效订单总数': group_stats['invalid_order_count'].to_numpy(dtype=np.int64),  # 基于完成时间
+        '违规订单数': violation_orders,  # 基于完成时间
+        '违规率': np.divide(violation_orders, total_orders, out=np.zeros(len(group_stats)), where=total_orders > 0)
+    })
+
+    # 按项目名称排序
+    result_df = result_df.sort_values('项目名称', ascending=True)
+
+    return {
+        'analysis_result': result_df,
+        'order_filtered_data': None,
+        'total_combinations': len(group_stats),
+        'order_total_count': order_total_count
+    }
+
+
+# ==================== 查询引擎 ====================
+# 直接查询数据文件、不把数据加载到内存的计算引擎
+QUERY_ENGINES = {
+    'duckdb': {
+        'name': 'DuckDB',
+        'source_info': duckdb_source_info,
+        'analyze_complete_data': analyze_complete_data_duckdb,
+        'analyze_violation_statistics': analyze_violation_statistics_duckdb,
+        'time_bounds': duckdb_time_bounds,
+        'available': duckdb is not None,
+    },
+    'polars': {
+        'name': 'Polars',
+        'source_info': polars_source_info,
+        'analyze_complete_data': analyze_complete_data_polars,
+        'analyze_violation_statistics': analyze_violation_statistics_polars,
+        'time_bounds': polars_time_bounds,
+        'available': pl is not None,
+    },
+}
+
+
+def resolve_default_engine(engine):
+    """检查部署环境指定的默认计算引擎，名称未知或引擎未安装时给出警告并改为auto"""
+    engine = (engine or 'auto').strip().lower()
+    if engine in ('auto', 'pandas'):
+        return engine
+    if engine not in QUERY_ENGINES:
+        warnings.warn(f"未知的计算引擎 PROJECT_ANALYSIS_ENGINE={engine}，改为自动选择")
+        return 'auto'
+    if not QUERY_ENGINES[engine]['available']:
+        warnings.warn(f"计算引擎 {QUERY_ENGINES[engine]['name']} 未安装，改为自动选择")
+        return 'auto'
+    return engine
+
+
+# 默认计算引擎：auto（按文件大小和可用内存自动选择，见 plan_dataset_load）、pandas 或 QUERY_ENGINES 中的引擎，
+# 可按部署环境设置
+DEFAULT_ENGINE = resolve_default_engine(os.getenv('PROJECT_ANALYSIS_ENGINE'))
+
+
+# ==================== 计算引擎选择 ====================
+# 估算行数和内存占用时读取的文件开头字节数
+LOAD_PLAN_SAMPLE_BYTES = 1 << 20
+
+# 整体加载后分析过程中的内存放大系数（时间列解析、行索引、日期立方体和筛选结果）
+ANALYSIS_MEMORY_FACTOR = 3
+
+# 单个数据文件最多使用的可用内存比例（看板进程同时服务多个会话）
+MEMORY_BUDGET_RATIO = 0.5
+
+# 无法获取可用内存时，超过该大小的文件不整体加载到内存
+UNKNOWN_MEMORY_MAX_FILE_SIZE = 512 << 20
+
+
+def format_bytes(size):
+    """字节数转换为便于阅读的文本"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def read_meminfo_available():
+    """/proc/meminfo 中的 MemAvailable（字节），不是Linux时返回None"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def read_cgroup_available():
+    """容器（cgroup v2/v1）内存限制下剩余的内存（字节），没有限制时返回None"""
+    for limit_path, usage_path in [('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory.current'),
+                                   ('/sys/fs/cgroup/memory/memory.limit_in_bytes',
+                                    '/sys/fs/cgroup/memory/memory.usage_in_bytes')]:
+        try:
+            with open(limit_path) as f:
+                limit = f.read().strip()
+            with open(usage_path) as f:
+                usage = int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+        if limit.isdigit() and int(limit) < 1 << 60:
+            return max(int(limit) - usage, 0)
+    return None
+
+
+def available_memory():
+    """当前可用内存（字节），取系统可用内存和容器内存限制中较小的一个，都无法获取时返回None"""
+    candidates = [value for value in (read_meminfo_available(), read_cgroup_available()) if value is not None]
+    return min(candidates) if candidates else None
+
+
+def read_source_head(source, size):
+    """读取文件开头的字节（上传的文件读取后回到开头）"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read(size)
+    source.seek(0)
+    head = source.read(size)
+    source.seek(0)
+    return head
+
+
+def source_file_size(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    return len(source.getbuffer())
+
+
+def estimate_dataset_size(source, analysis_columns_only=False):
+    """由文件开头的样本估算数据的行数和整体加载后每行占用的内存，返回 (文件大小, 估计行数, 每行内存字节数)"""
+    file_size = source_file_size(source)
+    head = read_source_head(source, LOAD_PLAN_SAMPLE_BYTES)
+    if len(head) < file_size:
+        # 样本只保留完整的行
+        head = head[:head.rfind(b'\n') + 1]
+
+    sample_rows = max(head.count(b'\n') - 1, 0)
+    if len(head) >= file_size or sample_rows == 0:
+        estimated_rows = sample_rows
+    else:
+        estimated_rows = int(file_size / len(head) * sample_rows)
+
+    sample_df = read_dataset_csv(io.BytesIO(head), analysis_columns_only)
+    if len(sample_df):
+        row_memory = sample_df.memory_usage(index=False, deep=True).sum() / len(sample_df)
+    else:
+        row_memory = 0
+    return file_size, estimated_rows, row_memory
+
+
+def first_available_query_engine():
+    """返回第一个已安装的查询引擎名称，都未安装时返回None"""
+    for engine, info in QUERY_ENGINES.items():
+        if info['available']:
+            return engine
+    return None
+
+
+def plan_dataset_load(source, analysis_columns_only=False, memory=None):
+    """按文件大小、估计行数和可用内存选择计算引擎
+
+    预计内存占用在预算内时整体加载到内存（pandas）；超出预算时使用直接查询文件的引擎，
+    查询引擎都未安装时使用流式分析，分块大小按内存预算确定。
+    返回 {'engine': 'pandas'、'stream' 或查询引擎名称, 'reason': 选择原因, ...}。
+    """
+    file_size, estimated_rows, row_memory = estimate_dataset_size(source, analysis_columns_only)
+    estimated_memory = int(estimated_rows * row_memory * ANALYSIS_MEMORY_FACTOR)
+    if memory is None:
+        memory = available_memory()
+
+    plan = {
+        'file_size': file_size,
+        'estimated_rows': estimated_rows,
+        'estimated_memory': estimated_memory,
+        'available_memory': memory,
+        'chunk_size': STREAM_CHUNK_SIZE,
+    }
+    summary = f"文件 {format_bytes(file_size)}，约 {estimated_rows:,} 行，预计分析占用内存 {format_bytes(estimated_memory)}"
+
+    if memory is None:
+        budget = None
+        fits_in_memory = file_size <= UNKNOWN_MEMORY_MAX_FILE_SIZE
+        summary += "，无法获取可用内存"
+    else:
+        budget = int(memory * MEMORY_BUDGET_RATIO)
+        fits_in_memory = estimated_memory <= budget
+        summary += f"，可用内存 {format_bytes(memory)}"
+
+    if fits_in_memory:
+        return {**plan, 'engine': 'pandas', 'reason': f"{summary}，整体加载到内存计算"}
+
+    query_engine = first_available_query_engine()
+    if query_engine is not None:
+        return {**plan, 'engine': query_engine,
+                'reason': f"{summary}，超出内存预算，使用{QUERY_ENGINES[query_engine]['name']}直接查询文件"}
+
+    # 每块的内存占用不超过预算的一部分
+    if budget is not None and row_memory > 0:
+        chunk_size = int(budget / 4 / (row_memory * ANALYSIS_MEMORY_FACTOR))
+        plan['chunk_size'] = min(max(chunk_size, 10000), STREAM_CHUNK_SIZE)
+    return {**plan, 'engine': 'stream',
+            'reason': f"{summary}，超出内存预算，按每块 {plan['chunk_size']:,} 行流式分析"}
+
+
+# ==================== 抽样预览 ====================
+# 预览时从文件中随机读取的数据块数和每块字节数（文件不超过两者乘积时读取整个文件）
+PREVIEW_SAMPLE_BLOCKS = 512
+PREVIEW_BLOCK_BYTES = 32 << 10
+
+# 每个项目-渠道组合（分层）最多抽取的行数
+PREVIEW_ROWS_PER_GROUP = 2000
+
+# 置信区间的置信水平
+PREVIEW_CONFIDENCE = 0.95
+
+
+def read_source_blocks(source, offsets, size):
+    """按偏移位置依次读取文件中的数据块"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                yield f.read(size)
+    else:
+        buffer = source.getbuffer()
+        for offset in offsets:
+            yield buffer[offset:offset + size].tobytes()
+        del buffer
+
+
+def read_block_sample(source, analysis_columns_only=True, seed=0):
+    """随机读取文件中的若干数据块，返回 (样本数据, 样本行数占全部数据行数的比例)
+
+    每块丢弃首尾不完整的行，拼接在表头之后按 read_dataset_csv 解析；文件较小时读取整个文件，比例为1。
+    假设CSV的字段中没有换行符。
+    """
+    file_size = source_file_size(source)
+    head = read_source_head(source, PREVIEW_BLOCK_BYTES)
+    header = head[:head.find(b'\n') + 1]
+
+    if file_size <= PREVIEW_SAMPLE_BLOCKS * PREVIEW_BLOCK_BYTES:
+        data = read_source_head(source, file_size)
+        return read_dataset_csv(io.BytesIO(data), analysis_columns_only), 1.0
+
+    rng = np.random.default_rng(seed)
+    block_count = file_size // PREVIEW_BLOCK_BYTES
+    offsets = np.sort(rng.choice(block_count, size=PREVIEW_SAMPLE_BLOCKS, replace=False)) * PREVIEW_BLOCK_BYTES
+
+    pieces = [header]
+    sampled_bytes = 0
+    for block in read_source_blocks(source, offsets, PREVIEW_BLOCK_BYTES):
+        start = block.find(b'\n') + 1
+        end = block.rfind(b'\n') + 1
+        if 0 < start < end:
+            pieces.append(block[start:end])
+            sampled_bytes += end - start
+
+    sample_df = read_dataset_csv(io.BytesIO(b''.join(pieces)), analysis_columns_only)
+    return sample_df, min(sampled_bytes / max(file_size - len(header), 1), 1.0)
+
+
+def stratified_rows(group_codes, rows_per_group, seed=0):
+    """分层抽样：每个组合随机抽取最多 rows_per_group 行，返回抽中的行位置"""
+    order = np.random.default_rng(seed).permutation(len(group_codes))
+    sorted_positions = order[np.argsort(group_codes[order], kind='stable')]
+    sorted_codes = group_codes[sorted_positions]
+    # 每行在本组合随机顺序中的名次
+    rank = np.arange(len(sorted_codes)) - np.searchsorted(sorted_codes, sorted_codes, side='left')
+    return np.sort(sorted_positions[rank < rows_per_group])
+
+
+def wilson_interval(successes, n, z):
+    """比例的Wilson置信区间（z可按组合分别给出，z为0时区间退化为点估计）"""
+    p = successes / n
+    z2 = z ** 2
+    denominator = 1 + z2 / n
+    center = (p + z2 / (2 * n)) / denominator
+    half_width = z / denominator * np.sqrt(p * (1 - p) / n + z2 / (4 * n ** 2))
+    return np.clip(center - half_width, 0, 1), np.clip(center + half_width, 0, 1)
+
+
+def estimate_violation_preview(source, analysis_columns_only=True, seed=0):
+    """快速预览：按项目-渠道组合分层抽样，估计每个组合的违规率和违规GMV占比及其置信区间
+
+    违规率使用Wilson区间，违规GMV占比（比率估计）使用Delta方法的正态区间，都按各组合的抽样比例做有限总体校正；
+    读取了整个文件且组合的全部行都被抽中时，估计值即精确值，区间宽度为0。
+    """
+    sample_df, sample_fraction = read_block_sample(source, analysis_columns_only, seed)
+    check_complete_data_columns(sample_df.columns)
+    if len(sample_df) == 0:
+        raise NoDataError("文件中没有数据")
+
+    group_codes, first_rows = factorize_groups(sample_df, ['project_name', 'channel_name'])
+    groups = sample_df[['project_name', 'channel_name']].iloc[first_rows].reset_index(drop=True)
+    group_count = len(groups)
+    group_rows = np.bincount(group_codes, minlength=group_count)
+
+    rows = stratified_rows(group_codes, PREVIEW_ROWS_PER_GROUP, seed)
+    codes = group_codes[rows]
+    violation = np.isin(encode_reason_codes(sample_df)[rows], VIOLATION_REASON_CODES)
+    x = price_weights(sample_df['estimate_cos_price'])[rows]
+    y = np.where(violation, x, 0.0)
+
+    def group_sum(weights=None):
+        return np.bincount(codes, weights=weights, minlength=group_count)
+
+    n = group_sum()
+    sum_x, sum_y = group_sum(x), group_sum(y)
+    sum_xx, sum_yy, sum_xy = group_sum(x * x), group_sum(y * y), group_sum(x * y)
+
+    # 有限总体校正：组合在全部数据中的估计行数为样本中的行数除以样本比例
+    estimated_group_rows = group_rows / sample_fraction
+    fpc = np.clip(1 - n / estimated_group_rows, 0, 1)
+    z = NormalDist().inv_cdf((1 + PREVIEW_CONFIDENCE) / 2) * np.sqrt(fpc)
+
+    violation_rate = group_sum(violation) / n
+    rate_lower, rate_upper = wilson_interval(group_sum(violation), n, z)
+
+    ratio = np.divide(sum_y, sum_x, out=np.zeros(group_count), where=sum_x > 0)
+    # 残差 d = y - R·x 的样本方差
+    sum_dd = sum_yy - 2 * ratio * sum_xy + ratio ** 2 * sum_xx
+    residual_variance = np.divide(np.maximum(sum_dd, 0), n - 1, out=np.zeros(group_count), where=n > 1)
+    mean_x = sum_x / n
+    ratio_se = np.divide(np.sqrt(residual_variance / n), mean_x, out=np.zeros(group_count), where=mean_x > 0)
+
+    result_df = pd.DataFrame({
+        '项目名称': groups['project_name'].to_numpy(),
+        '渠道名称': groups['channel_name'].to_numpy(),
+        '样本订单数': n.astype(np.int64),
+        '估计订单总数': np.round(estimated_group_rows).astype(np.int64),
+        '违规率': violation_rate,
+        '违规率下限': rate_lower,
+        '违规率上限': rate_upper,
+        '违规GMV占比': ratio,
+        '违规GMV占比下限': np.clip(ratio - z * ratio_se, 0, 1),
+        '违规GMV占比上限': np.clip(ratio + z * ratio_se, 0, 1),
+    })
+
+    # 只保留项目名称和渠道名称都存在的组合
+    result_df = result_df[groups['project_name'].notna().to_numpy() & groups['channel_name'].notna().to_numpy()]
+    result_df = result_df.sort_values('项目名称', ascending=True)
+
+    return {
+        'preview_result': result_df,
+        'sample_rows': len(rows),
+        'estimated_total_rows': int(round(len(sample_df) / sample_fraction)),
+        'sample_fraction': sample_fraction,
+        'confidence': PREVIEW_CONFIDENCE,
+    }
+
+
+# ==================== 后台预计算 ====================
+# 加载文件后在后台任务（见 JobQueue）中完成页面需要的计算，结果按页面使用的缓存键写入结果缓存
+def csv_dataset_hash(file_hash, analysis_columns_only):
+    """整体加载到内存的数据的缓存键（同一文件按不同列加载时分别缓存）"""
+    return f"{file_hash}-{'analysis' if analysis_columns_only else 'all'}"
+
+
+def default_statistics_range(parsed_times):
+    """违规率统计页面日期选择器的默认范围：数据中最早一天的 00:00:00 到最晚一天的 23:59:59
+
+    与页面上日期选择器的默认值一致，缺少时间数据时返回None。
+    """
+    bounds = []
+    for column in TIME_COLUMNS:
+        times = parsed_times.get(column)
+        valid_times = times.dropna() if times is not None else pd.Series(dtype='datetime64[ns]')
+        if valid_times.empty:
+            return None
+        bounds.append(datetime.combine(valid_times.min().date(), datetime.min.time()))
+        bounds.append(datetime.combine(valid_times.max().date(), datetime.max.time()))
+    return tuple(bounds)
+
+
+def precompute_csv_dataset(cache, source, file_hash, options, report):
+    """整体加载到内存：读取数据、解析时间列、构建日期立方体和行索引，并完成违规率分析和默认范围的违规率统计
+
+    重新加载相同内容的文件时，已缓存的结果不再计算（时间列每个数据哈希只解析一次）。
+    """
+    dataset_hash = csv_dataset_hash(file_hash, options['analysis_columns_only'])
+    report("读取数据", 0)
+    df = cache.get_or_compute(
+        ('read_csv', dataset_hash, ()),
+        lambda: read_dataset(source, file_hash, options['analysis_columns_only'], options['use_columnar_cache']))
+
+    report("解析时间列", 1)
+    parsed_times = cache.get_or_compute(('parse_time_columns', dataset_hash, ()), lambda: parse_time_columns(df))
+
+    report("构建日期立方体和行索引", 2)
+    cube = index = None
+    if all(column in parsed_times for column in TIME_COLUMNS):
+        cube = cache.get_or_compute(
+            ('build_violation_cube', dataset_hash, ()),
+            lambda: build_violation_cube(df, parsed_times['order_time'], parsed_times['finish_time']))
+        index = cache.get_or_compute(
+            ('build_statistics_index', dataset_hash, ()),
+            lambda: build_statistics_index(df, parsed_times['order_time'], parsed_times['finish_time']))
+
+    report("违规率分析", 3)
+    price_cents = None
+    if options['fixed_point'] and all(column in df.columns for column in PRICE_COLUMNS):
+        price_cents = cache.get_or_compute(('encode_price_cents', dataset_hash, ()), lambda: encode_price_cents(df))
+    # 分析出错时不写入缓存，打开页面时重新计算并提示错误
+    with suppress(AnalysisError):
+        cache.get_or_compute(('analyze_complete_data', dataset_hash, (price_cents is not None,)),
+                             lambda: analyze_complete_data(df, price_cents, workers=options['workers']))
+
+    report("违规率统计", 4)
+    statistics_range = default_statistics_range(parsed_times)
+    if statistics_range is not None:
+        with suppress(AnalysisError):
+            cache.get_or_compute(
+                ('analyze_violation_statistics', dataset_hash, statistics_range),
+                lambda: analyze_violation_statistics(
+                    df, *statistics_range,
+                    order_times=parsed_times['order_time'], finish_times=parsed_times['finish_time'],
+                    cube=cube, index=index))
+
+
+def precompute_query_dataset(cache, source, file_hash, engine, options, report):
+    """查询引擎：读取文件信息和时间范围，并在文件上完成违规率分析和默认范围的违规率统计"""
+    dataset_hash = f"{file_hash}-{engine}"
+    query_engine = QUERY_ENGINES[engine]
+    report("读取文件信息", 0)
+    path = dataset_file_path(source, file_hash)
+    cache.get_or_compute((f'{engine}_source_info', file_hash, ()), lambda: query_engine['source_info'](path))
+
+    report("违规率分析", 2)
+    with suppress(AnalysisError):
+        cache.get_or_compute(('analyze_complete_data', dataset_hash, (options['fixed_point'],)),
+                             lambda: query_engine['analyze_complete_data'](path, options['fixed_point']))
+
+    report("违规率统计", 4)
+    with suppress(AnalysisError):
+        time_bounds = cache.get_or_compute(('time_bounds', dataset_hash, ()),
+                                           lambda: query_engine['time_bounds'](path))
+        statistics_range = default_statistics_range(time_bounds)
+        if statistics_range is not None:
+            cache.get_or_compute(('analyze_violation_statistics', dataset_hash, statistics_range),
+                                 lambda: query_engine['analyze_violation_statistics'](path, *statistics_range))
+
+
+def precompute_dataset(cache, source, file_hash, engine, options, progress):
+    """后台线程：按选定的计算引擎完成页面需要的全部计算，结果按页面使用的缓存键写入结果缓存
+
+    不访问 st.session_state，进度写入 progress（当前步骤和完成比例）。
+    完成后页面重新加载同一文件时全部命中缓存，返回实际使用的计算引擎（整体加载内存不足时为 'stream'）。
+    """
+    def report(stage, step):
+        progress['stage'] = stage
+        progress['fraction'] = step / 5
+
+    if engine in QUERY_ENGINES:
+        precompute_query_dataset(cache, source, file_hash, engine, options, report)
+    elif engine != 'stream':
+        try:
+            precompute_csv_dataset(cache, source, file_hash, options, report)
+        except MemoryError:
+            # 内存不足时改用流式分析，与前台加载的处理方式一致
+            engine = 'stream'
+            if hasattr(source, 'seek'):
+                source.seek(0)
+
+    if engine == 'stream':
+        report("流式分析数据", 0)
+        cache.get_or_compute(('analyze_csv_in_chunks', f"{file_hash}-stream", (options['fixed_point'],)),
+                             lambda: analyze_csv_in_chunks(source, options['chunk_size'], options['fixed_point']))
+
+    report("完成", 5)
+    return engine
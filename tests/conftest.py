@@ -0,0 +1,123 @@
+"""测试共用的数据
+
+orders 为手工构造的小数据，测试中的期望值都按它逐行算出；random_orders 为固定随机种子生成的数据，
+用于和逐组合计算的参考实现、各计算引擎之间互相对照。
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+# 看板脚本，由 streamlit 的 AppTest 运行
+APP_PATH = os.path.join(REPO_DIR, 'project_invalid_analysis.py')
+
+ORDER_COLUMNS = ['activity_name', 'project_name', 'channel_name', 'bonus_invalid_text', 'bonus_text', 'order_text',
+                 'estimate_cos_price', 'actual_cos_price', 'project_code', 'order_time', 'finish_time']
+
+ORDER_ROWS = [
+    ('活动', 'A', 'x', '无效-违规订单', '无效', '已完成', 10.0, 8.0, 102, '01/12/2025 10:00:00', '05/12/2025 10:00:00'),
+    ('活动', 'A', 'x', np.nan, '有效', '已完成', 20.0, 15.0, 102, '02/12/2025 10:00:00', '06/12/2025 10:00:00'),
+    ('活动', 'A', 'x', '无效-风险订单', '无效', '未完成', 30.0, 0.0, np.nan, '03/12/2025 10:00:00', '1/1/1970 08:00:00'),
+    ('活动', 'A', 'y', '无效-取消', '无效', '已完成', 5.0, 5.0, 102, '10/12/2025 12:00:00', '20/12/2025 12:00:00'),
+    ('活动', 'A', 'y', '', '有效', '未完成', 40.0, 30.0, 102, '11/12/2025 12:00:00', np.nan),
+    ('活动', 'A', np.nan, '无效-违规订单', '无效', '已完成', 50.0, 40.0, 102, '12/12/2025 12:00:00', '13/12/2025 12:00:00'),
+    ('活动', 'B', 'x', '无效-拆单', '无效', '已完成', 7.5, 7.0, 101, '01/12/2025 08:00:00', '02/12/2025 08:00:00'),
+    ('活动', 'B', 'x', '无效-其他原因', '无效', '已完成', np.nan, 6.0, 101, '15/12/2025 08:00:00', '16/12/2025 08:00:00'),
+    ('活动', 'B', 'x', '无效-违规订单', '待定', '已完成', 12.5, np.nan, 101, '31/12/2025 23:00:00', '02/01/2026 08:00:00'),
+    ('活动', np.nan, 'x', '无效-违规订单', '无效', '已完成', 100.0, 90.0, np.nan, '05/12/2025 08:00:00', '06/12/2025 08:00:00'),
+    ('活动', 'B', 'x', '无效-退货', '有效', '已完成', 2.5, 2.0, 101, '01/01/2026 08:00:00', '03/01/2026 08:00:00'),
+]
+
+RANDOM_REASONS = ['无效-违规订单', '无效-风险订单', '无效-取消', '无效-拆单', '无效-退货', '无效-其他原因', '',
+                  np.nan, np.nan, np.nan]
+
+
+def make_orders(n, seed=0):
+    """生成n行随机订单：包含空的项目/渠道名称、空金额、缺失的项目编号、无日期占位值和空的完成时间"""
+    rng = np.random.default_rng(seed)
+    projects = np.array([f'项目{i}' for i in range(6)] + [np.nan], dtype=object)
+    channels = np.array([f'渠道{i}' for i in range(4)] + [np.nan], dtype=object)
+    project_index = rng.integers(0, len(projects), n)
+
+    df = pd.DataFrame({
+        'activity_name': '活动',
+        'project_name': projects[project_index],
+        'channel_name': channels[rng.integers(0, len(channels), n)],
+        'bonus_invalid_text': np.array(RANDOM_REASONS, dtype=object)[rng.integers(0, len(RANDOM_REASONS), n)],
+        'bonus_text': rng.choice(['有效', '无效', '待定'], n),
+        'order_text': rng.choice(['已完成', '未完成'], n),
+        'estimate_cos_price': np.round(rng.gamma(2, 30, n), 2),
+        'actual_cos_price': np.round(rng.gamma(2, 25, n), 2),
+        'project_code': np.where(project_index < 6, 100 + (5 - project_index), np.nan),
+    })
+    df.loc[rng.random(n) < 0.05, 'estimate_cos_price'] = np.nan
+    df.loc[rng.random(n) < 0.05, 'actual_cos_price'] = np.nan
+    df.loc[rng.random(n) < 0.1, 'project_code'] = np.nan
+
+    order_times = pd.Timestamp('2025-12-01') + pd.to_timedelta(rng.integers(0, 31 * 86400, n), unit='s')
+    finish_times = order_times + pd.to_timedelta(rng.integers(0, 10 * 86400, n), unit='s')
+    df['order_time'] = order_times.strftime('%d/%m/%Y %H:%M:%S')
+    df['finish_time'] = np.asarray(finish_times.strftime('%d/%m/%Y %H:%M:%S'), dtype=object)
+    df.loc[rng.random(n) < 0.1, 'finish_time'] = '1/1/1970 08:00:00'
+    df.loc[rng.random(n) < 0.02, 'finish_time'] = np.nan
+    return df
+
+
+@pytest.fixture(autouse=True)
+def columnar_cache_dir(tmp_path, monkeypatch):
+    """列式缓存写到临时目录，不影响仓库中的缓存（环境变量供子进程使用）"""
+    import project_invalid_core
+
+    cache_dir = str(tmp_path / 'columnar_cache')
+    monkeypatch.setattr(project_invalid_core, 'COLUMNAR_CACHE_DIR', cache_dir)
+    monkeypatch.setenv('PROJECT_ANALYSIS_CACHE_DIR', cache_dir)
+    return cache_dir
+
+
+@pytest.fixture
+def app():
+    """新的看板会话（已运行一次）；所有会话共享的结果缓存和任务队列在测试前后清空"""
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    st.cache_resource.clear()
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at.run()
+    yield at
+    st.cache_resource.clear()
+
+
+@pytest.fixture
+def orders():
+    return pd.DataFrame(ORDER_ROWS, columns=ORDER_COLUMNS)
+
+
+@pytest.fixture
+def random_orders():
+    return make_orders(3000)
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    """把数据写成临时目录中的CSV文件，返回文件路径"""
+    def write(df, name='orders.csv'):
+        path = tmp_path / name
+        df.to_csv(path, index=False)
+        return str(path)
+    return write
+
+
+@pytest.fixture
+def random_orders_csv(write_csv, random_orders):
+    return write_csv(random_orders)
+
+
+@pytest.fixture
+def write_orders(write_csv):
+    """按随机种子生成500行订单并写成CSV文件，返回文件路径"""
+    return lambda name, seed: write_csv(make_orders(500, seed), name)
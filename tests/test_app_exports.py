@@ -0,0 +1,92 @@
+from datetime import date
+
+import pytest
+
+import project_invalid_core
+from test_app_loading import load_local_file, run_statistics, run_until_idle
+
+
+@pytest.fixture
+def csv_builds(monkeypatch):
+    """记录生成CSV导出内容的次数"""
+    calls = []
+    format_for_csv = project_invalid_core.format_for_csv
+
+    def counting_format(df):
+        calls.append(list(df.columns))
+        return format_for_csv(df)
+
+    monkeypatch.setattr(project_invalid_core, 'format_for_csv', counting_format)
+    return calls
+
+
+def labels(at):
+    return [button.label for button in at.button] + [button.proto.label for button in at.get('download_button')]
+
+
+def open_page(at, page):
+    at.session_state['current_page'] = page
+    return run_until_idle(at.run())
+
+
+def build_export(at, label):
+    [button for button in at.button if button.label == f"⚙️ 生成{label}"][0].click().run()
+    assert f"📥 下载{label}" in labels(at)
+
+
+def test_exports_are_built_once(app, csv_builds, write_orders):
+    load_local_file(app, write_orders('orders.csv', 1))
+    open_page(app, '违规率分析')
+    # 页面运行时不生成导出内容
+    assert csv_builds == []
+    assert "📥 下载完整分析报告" not in labels(app)
+
+    build_export(app, "完整分析报告")
+    assert len(csv_builds) == 1
+
+    # 页面刷新和切换页面后直接使用缓存的文件
+    app.run()
+    open_page(app, '违规率统计')
+    open_page(app, '违规率分析')
+    assert "📥 下载完整分析报告" in labels(app)
+    assert len(csv_builds) == 1
+
+
+@pytest.mark.parametrize('label', [
+    "原始数据", "完整报告 (Excel)",
+    pytest.param("结果表 (Parquet)", marks=pytest.mark.skipif(project_invalid_core.pa is None, reason="未安装pyarrow")),
+])
+def test_binary_exports_are_served_from_the_buffer(app, write_orders, label):
+    # 二进制导出缓存的是生成时写入的BytesIO，页面刷新后仍直接提供下载
+    load_local_file(app, write_orders('orders.csv', 1))
+    open_page(app, '违规率分析')
+    build_export(app, label)
+    app.run()
+    assert not app.exception
+    assert f"📥 下载{label}" in labels(app)
+
+
+def test_new_dataset_invalidates_exports(app, write_orders):
+    first_path = write_orders('first.csv', 1)
+    load_local_file(app, first_path)
+    open_page(app, '违规率分析')
+    build_export(app, "完整分析报告")
+
+    load_local_file(app, write_orders('second.csv', 2))
+    open_page(app, '违规率分析')
+    assert "⚙️ 生成完整分析报告" in labels(app)
+
+    # 重新加载第一个文件时仍可使用之前生成的文件
+    load_local_file(app, first_path)
+    open_page(app, '违规率分析')
+    assert "📥 下载完整分析报告" in labels(app)
+
+
+def test_statistics_range_invalidates_exports(app, write_orders):
+    load_local_file(app, write_orders('orders.csv', 1))
+    run_statistics(app)
+    build_export(app, "统计报告")
+
+    app.date_input(key='order_start_date_stat').set_value(date(2025, 12, 5)).run()
+    run_statistics(app)
+    assert "⚙️ 生成统计报告" in labels(app)
@@ -0,0 +1,154 @@
+"""看板加载数据的流程：用 streamlit 的 AppTest 运行看板脚本，后台任务完成后再刷新页面"""
+import threading
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import project_invalid_core
+from conftest import APP_PATH
+from project_invalid_core import csv_dataset_hash, hash_file
+
+
+@pytest.fixture
+def parse_calls(monkeypatch):
+    """记录逐列解析时间的调用（看板和后台预计算都通过核心模块解析）"""
+    calls = []
+    parse_date_column = project_invalid_core.parse_date_column
+
+    def counting_parse(series):
+        calls.append(series.name)
+        return parse_date_column(series)
+
+    monkeypatch.setattr(project_invalid_core, 'parse_date_column', counting_parse)
+    return calls
+
+
+def run_until_idle(at):
+    """等待当前会话的后台任务完成并刷新页面，直到没有等待中的任务"""
+    for _ in range(20):
+        jobs = list(at.session_state['analysis_jobs'].values())
+        if not jobs:
+            break
+        for job in jobs:
+            job['future'].exception()
+        at.run()
+    assert not at.exception, [exception.value for exception in at.exception]
+    return at
+
+
+def start_loading(at, path):
+    """在上传页面输入本地文件路径并开始加载（不等待后台任务）"""
+    at.session_state['current_page'] = '上传数据文件'
+    at.run()
+    [text_input for text_input in at.text_input if text_input.label == '本地文件路径'][0].input(path)
+    [button for button in at.button if button.label == '📂 加载本地文件'][0].click().run()
+    return at
+
+
+def load_local_file(at, path):
+    """加载本地文件并等待后台预计算完成"""
+    return run_until_idle(start_loading(at, path))
+
+
+def run_statistics(at):
+    """在违规率统计页面按默认的时间范围执行统计"""
+    at.session_state['current_page'] = '违规率统计'
+    at.run()
+    [button for button in at.button if button.label.startswith('🚀 执行统计')][0].click().run()
+    return run_until_idle(at)
+
+
+def test_time_columns_are_parsed_once_per_dataset(app, parse_calls, write_orders):
+    first_path = write_orders('first.csv', 1)
+    load_local_file(app, first_path)
+    first_hash = app.session_state['dataset_hash']
+    assert app.session_state['uploaded_file'] is not None
+    assert sorted(parse_calls) == ['finish_time', 'order_time']
+
+    # 页面刷新和执行统计都使用加载时解析的时间列
+    app.run()
+    run_statistics(app)
+    assert app.session_state['statistics_params'] is not None
+    assert not app.error, [error.value for error in app.error]
+    app.run()
+    assert len(parse_calls) == 2
+
+    # 上传新的数据文件时重新解析
+    load_local_file(app, write_orders('second.csv', 2))
+    assert app.session_state['dataset_hash'] != first_hash
+    assert len(parse_calls) == 4
+
+    # 再次加载相同内容的文件时使用按数据哈希缓存的解析结果
+    load_local_file(app, first_path)
+    assert app.session_state['dataset_hash'] == first_hash
+    assert len(parse_calls) == 4
+
+
+@pytest.fixture
+def precompute_calls(monkeypatch):
+    """记录后台预计算的调用；blocked 中的文件哈希在对应的事件设置前阻塞"""
+    calls = SimpleNamespace(file_hashes=[], blocked={})
+    precompute_dataset = project_invalid_core.precompute_dataset
+
+    def counting_precompute(cache, source, file_hash, *args):
+        calls.file_hashes.append(file_hash)
+        if file_hash in calls.blocked:
+            assert calls.blocked[file_hash].wait(30)
+        return precompute_dataset(cache, source, file_hash, *args)
+
+    monkeypatch.setattr(project_invalid_core, 'precompute_dataset', counting_precompute)
+    return calls
+
+
+def test_sessions_loading_the_same_file_share_one_job(app, precompute_calls, write_orders):
+    path = write_orders('orders.csv', 1)
+    release = precompute_calls.blocked[hash_file(path)] = threading.Event()
+    other = AppTest.from_file(APP_PATH, default_timeout=120)
+    other.run()
+
+    # 两个会话先后加载同一文件：预计算任务按文件哈希去重，只计算一次
+    start_loading(app, path)
+    start_loading(other, path)
+    assert app.session_state['analysis_jobs']['load'] is other.session_state['analysis_jobs']['load']
+    release.set()
+    run_until_idle(app)
+    run_until_idle(other)
+
+    assert precompute_calls.file_hashes == [hash_file(path)]
+    expected_hash = csv_dataset_hash(hash_file(path), False)
+    assert app.session_state['dataset_hash'] == other.session_state['dataset_hash'] == expected_hash
+
+
+def test_new_upload_discards_the_stale_job(app, precompute_calls, write_orders):
+    first_path = write_orders('first.csv', 1)
+    second_path = write_orders('second.csv', 2)
+    release = precompute_calls.blocked[hash_file(first_path)] = threading.Event()
+
+    # 第一个文件还在预计算时加载第二个文件，之后第一个任务完成也不会替换当前数据
+    start_loading(app, first_path)
+    first_job = app.session_state['analysis_jobs']['load']
+    start_loading(app, second_path)
+    assert app.session_state['analysis_jobs']['load'] is not first_job
+    run_until_idle(app)
+    release.set()
+    first_job['future'].result(30)
+    app.run()
+
+    assert app.session_state['dataset_hash'] == csv_dataset_hash(hash_file(second_path), False)
+    assert app.session_state['load_job'] is None
+    assert app.session_state['uploaded_file']['order_time'].tolist() == \
+        pd.read_csv(second_path)['order_time'].tolist()
+
+
+def test_load_errors_are_shown(app, monkeypatch, write_orders):
+    def failing_precompute(*args):
+        raise ValueError("文件格式错误")
+
+    monkeypatch.setattr(project_invalid_core, 'precompute_dataset', failing_precompute)
+    load_local_file(app, write_orders('orders.csv', 1))
+
+    assert [error.value for error in app.error] == ["读取文件失败: 文件格式错误"]
+    assert app.session_state['load_job'] is None
+    assert app.session_state['uploaded_file'] is None
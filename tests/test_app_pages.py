@@ -0,0 +1,49 @@
+from datetime import date
+
+import pytest
+
+import project_invalid_core
+from test_app_loading import load_local_file, run_statistics, run_until_idle
+
+PAGES = ['违规率分析', '违规率统计', '分析设置']
+
+
+@pytest.fixture
+def analysis_calls(monkeypatch):
+    """记录违规率分析和违规率统计的计算次数（看板和后台预计算都调用核心模块的函数）"""
+    calls = {}
+    for name in ['analyze_complete_data', 'analyze_violation_statistics']:
+        def counting(*args, _compute=getattr(project_invalid_core, name), _name=name, **kwargs):
+            calls[_name] = calls.get(_name, 0) + 1
+            return _compute(*args, **kwargs)
+
+        monkeypatch.setattr(project_invalid_core, name, counting)
+    return calls
+
+
+@pytest.fixture
+def loaded_app(app, write_orders):
+    return load_local_file(app, write_orders('orders.csv', 1))
+
+
+@pytest.mark.parametrize('page', PAGES)
+def test_pages_render(loaded_app, page):
+    loaded_app.session_state['current_page'] = page
+    run_until_idle(loaded_app.run())
+    assert not loaded_app.error, [error.value for error in loaded_app.error]
+
+
+def test_statistics_date_change_does_not_recompute_analysis(analysis_calls, loaded_app):
+    # 加载时后台预计算了违规率分析和默认时间范围的违规率统计，打开两个页面都直接使用缓存
+    assert analysis_calls == {'analyze_complete_data': 1, 'analyze_violation_statistics': 1}
+    loaded_app.session_state['current_page'] = '违规率分析'
+    run_until_idle(loaded_app.run())
+    run_statistics(loaded_app)
+    assert analysis_calls == {'analyze_complete_data': 1, 'analyze_violation_statistics': 1}
+
+    # 修改日期后需要重新执行统计，只重新计算违规率统计
+    loaded_app.date_input(key='order_start_date_stat').set_value(date(2025, 12, 5)).run()
+    assert loaded_app.session_state['statistics_params'] is None
+    run_statistics(loaded_app)
+    assert loaded_app.session_state['statistics_params'][0].date() == date(2025, 12, 5)
+    assert analysis_calls == {'analyze_complete_data': 1, 'analyze_violation_statistics': 2}
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from project_invalid_core import (
+    INVALID_REASON_COLUMNS,
+    REASON_CODES,
+    REASON_NONE,
+    REASON_OTHER,
+    STATUS_INVALID,
+    STATUS_OTHER,
+    STATUS_VALID,
+    aggregate_channel_stats,
+    encode_reason_codes,
+    encode_status_codes,
+    factorize_groups,
+)
+
+
+def naive_channel_stats(df):
+    """用逐组合的分组求和计算渠道级聚合结果，作为计数核的对照"""
+    reason = df['bonus_invalid_text'].astype(object)
+    estimate = df['estimate_cos_price'].fillna(0)
+    actual = df['actual_cos_price'].fillna(0)
+    valid = df['bonus_text'].astype(object) == '有效'
+    completed = df['order_text'].astype(object) == '已完成'
+
+    columns = {'total_count': pd.Series(1, index=df.index)}
+    for text, column in INVALID_REASON_COLUMNS.items():
+        columns[column] = reason == text
+    columns['invalid_other'] = reason.notna() & (reason != '') & ~reason.isin(list(INVALID_REASON_COLUMNS))
+    columns['estimate_commission_gmv'] = estimate
+    columns['estimate_completed_gmv'] = estimate.where(valid, 0)
+    columns['actual_commission_gmv'] = actual.where(valid & completed, 0)
+    columns['invalid_violation_gmv'] = estimate.where(reason == '无效-违规订单', 0)
+    columns['invalid_risk_gmv'] = estimate.where(reason == '无效-风险订单', 0)
+
+    keys = [df['project_name'].astype(object), df['channel_name'].astype(object)]
+    return pd.DataFrame(columns).groupby(keys, sort=False, dropna=False).sum()
+
+
+@pytest.mark.parametrize('as_category', [False, True])
+def test_text_codes(as_category):
+    reasons = pd.Series(['无效-违规订单', '', np.nan, '无效-退货', '无效-新原因', '无效-风险订单'])
+    statuses = pd.Series(['有效', '无效', '待定', np.nan, '有效', '无效'])
+    if as_category:
+        # 未出现的类别不影响编码
+        reasons = reasons.astype(pd.CategoricalDtype(['无效-取消', *reasons.dropna().unique()]))
+        statuses = statuses.astype('category')
+    df = pd.DataFrame({'bonus_invalid_text': reasons, 'bonus_text': statuses})
+
+    assert encode_reason_codes(df).tolist() == [
+        REASON_CODES['无效-违规订单'], REASON_NONE, REASON_NONE, REASON_CODES['无效-退货'], REASON_OTHER,
+        REASON_CODES['无效-风险订单'],
+    ]
+    assert encode_status_codes(df).tolist() == [
+        STATUS_VALID, STATUS_INVALID, STATUS_OTHER, STATUS_OTHER, STATUS_VALID, STATUS_INVALID,
+    ]
+
+
+def test_groups_in_first_appearance_order():
+    df = pd.DataFrame({'project_name': ['B', 'A', np.nan, 'B', 'A', np.nan],
+                       'channel_name': ['x', 'x', 'x', 'x', np.nan, 'x']})
+    group_codes, first_rows = factorize_groups(df, ['project_name', 'channel_name'])
+    assert group_codes.tolist() == [0, 1, 2, 0, 3, 2]
+    assert first_rows.tolist() == [0, 1, 2, 4]
+
+
+@pytest.mark.parametrize('as_category', [False, True])
+def test_matches_grouped_sums(random_orders, as_category):
+    if as_category:
+        text_columns = ['project_name', 'channel_name', 'bonus_text', 'bonus_invalid_text', 'order_text']
+        random_orders = random_orders.astype({column: 'category' for column in text_columns})
+    channel_stats = aggregate_channel_stats(random_orders)
+    expected = naive_channel_stats(random_orders)
+
+    pd.testing.assert_frame_equal(channel_stats.index.to_frame(index=False).astype(object),
+                                  expected.index.to_frame(index=False), check_names=False)
+    for column in expected.columns:
+        np.testing.assert_allclose(channel_stats[column].to_numpy(dtype=np.float64),
+                                   expected[column].to_numpy(dtype=np.float64), rtol=1e-12, err_msg=column)
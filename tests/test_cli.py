@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+import project_invalid_cli
+import project_invalid_core
+from project_invalid_core import analyze_complete_data, analyze_violation_statistics
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RANGE_ARGS = ['--order-start', '2025-12-01', '--order-end', '2025-12-31',
+              '--finish-start', '2025-12-01', '--finish-end', '2026-01-15']
+
+
+def test_core_does_not_import_streamlit():
+    code = "import sys, project_invalid_core; sys.exit('streamlit' in sys.modules)"
+    assert subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR).returncode == 0
+
+
+@pytest.mark.parametrize('extra_args', [['--engine', 'pandas'], ['--stream', '--chunk-size', '500']])
+def test_csv_reports(random_orders, random_orders_csv, tmp_path, extra_args):
+    output_dir = tmp_path / 'reports'
+    assert project_invalid_cli.main([random_orders_csv, '--output-dir', str(output_dir), '--format', 'csv',
+                                     *RANGE_ARGS, *extra_args]) == 0
+
+    assert sorted(os.listdir(output_dir)) == [
+        'orders_违规率分析_统计汇总.csv', 'orders_违规率分析_详细分析.csv', 'orders_违规率分析_项目汇总.csv',
+        'orders_违规率统计_违规率统计.csv',
+    ]
+    detail = pd.read_csv(output_dir / 'orders_违规率分析_详细分析.csv')
+    expected = analyze_complete_data(random_orders.copy())['analysis_result']
+    assert detail['订单总数'].tolist() == expected['订单总数'].tolist()
+    assert detail['项目名称'].tolist() == expected['项目名称'].tolist()
+
+    statistics = pd.read_csv(output_dir / 'orders_违规率统计_违规率统计.csv')
+    # 结束时间只写日期时取当天结束
+    time_range = [project_invalid_cli.parse_range_bound(text, end=index % 2 == 1)
+                  for index, text in enumerate(RANGE_ARGS[1::2])]
+    expected_statistics = analyze_violation_statistics(random_orders, *time_range)['analysis_result']
+    assert statistics['违规订单数'].sum() == expected_statistics['违规订单数'].sum()
+    assert statistics['订单总数'].sum() == expected_statistics['订单总数'].sum()
+
+
+def test_statistics_scan_the_data_once(random_orders_csv, tmp_path, monkeypatch):
+    # 只查询一个时间范围时不构建日期立方体，只构建一次行索引
+    build_statistics_index = project_invalid_core.build_statistics_index
+    index_calls = []
+
+    def counting_build(*args):
+        index_calls.append(args)
+        return build_statistics_index(*args)
+
+    monkeypatch.setattr(project_invalid_core, 'build_violation_cube', None)
+    monkeypatch.setattr(project_invalid_core, 'build_statistics_index', counting_build)
+    # 直接调用 write_reports（main 在进程池中生成报告，子进程中看不到替换的函数）
+    args = project_invalid_cli.build_parser().parse_args(
+        [random_orders_csv, '--output-dir', str(tmp_path), '--format', 'csv', '--engine', 'pandas', *RANGE_ARGS])
+    project_invalid_cli.write_reports(random_orders_csv, args)
+    assert len(index_calls) == 1
+
+
+def test_failed_file_sets_exit_code(random_orders_csv, tmp_path, capsys):
+    missing = str(tmp_path / 'missing.csv')
+    assert project_invalid_cli.main([random_orders_csv, missing, '--output-dir', str(tmp_path / 'reports'),
+                                     '--format', 'csv', '--engine', 'pandas']) == 1
+    assert missing in capsys.readouterr().err
+    assert os.path.exists(tmp_path / 'reports' / 'orders_违规率分析_详细分析.csv')
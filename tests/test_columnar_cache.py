@@ -0,0 +1,85 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from project_invalid_core import (
+    ANALYSIS_COLUMNS,
+    clear_columnar_cache,
+    columnar_cache_path,
+    dataset_file_path,
+    hash_file,
+    read_columnar_cache,
+    read_dataset,
+    read_dataset_csv,
+)
+
+pytest.importorskip('pyarrow')
+
+
+def assert_same_dataset(left, right):
+    """Parquet中的空文本读回为None，CSV读取为NaN，两者都是缺失值"""
+    def missing_as_nan(df):
+        text_columns = df.columns[df.dtypes == object]
+        return df.assign(**{column: df[column].where(df[column].notna(), np.nan) for column in text_columns})
+
+    pd.testing.assert_frame_equal(missing_as_nan(left), missing_as_nan(right))
+
+
+@pytest.fixture
+def orders_file(random_orders, write_csv):
+    path = write_csv(random_orders.assign(remark='备注'))
+    return path, hash_file(path)
+
+
+def test_round_trip_keeps_column_types(orders_file):
+    path, file_hash = orders_file
+    first = read_dataset(path, file_hash)
+    assert os.path.exists(columnar_cache_path(file_hash))
+
+    cached = read_columnar_cache(file_hash)
+    assert_same_dataset(cached, first)
+    assert_same_dataset(cached, read_dataset_csv(path))
+
+
+def test_projection_reads_only_analysis_columns(orders_file):
+    path, file_hash = orders_file
+    read_dataset(path, file_hash)
+
+    # 缓存中保存全部列，只读分析列时从同一个缓存文件裁剪
+    df = read_dataset(path, file_hash, analysis_columns_only=True)
+    assert 'remark' not in df.columns
+    assert set(df.columns) <= set(ANALYSIS_COLUMNS)
+    assert 'remark' in read_dataset(path, file_hash).columns
+
+
+def test_cache_can_be_disabled(orders_file):
+    path, file_hash = orders_file
+    read_dataset(path, file_hash, use_columnar_cache=False)
+    assert not os.path.exists(columnar_cache_path(file_hash))
+
+
+def test_damaged_cache_is_rebuilt(orders_file):
+    path, file_hash = orders_file
+    os.makedirs(os.path.dirname(columnar_cache_path(file_hash)), exist_ok=True)
+    with open(columnar_cache_path(file_hash), 'wb') as f:
+        f.write(b'not parquet')
+
+    assert read_columnar_cache(file_hash) is None
+    assert_same_dataset(read_dataset(path, file_hash), read_dataset_csv(path))
+    assert read_columnar_cache(file_hash) is not None
+
+
+def test_uploaded_files_are_saved_and_cleared(random_orders):
+    data = random_orders.to_csv(index=False).encode('utf-8')
+    path = dataset_file_path(io.BytesIO(data), 'upload')
+    with open(path, 'rb') as f:
+        assert f.read() == data
+
+    read_dataset(io.BytesIO(data), 'upload')
+    # 有列式缓存后查询引擎改为读取Parquet文件
+    assert dataset_file_path(io.BytesIO(data), 'upload') == columnar_cache_path('upload')
+    assert clear_columnar_cache() == 2
+    assert not os.path.exists(path)
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from project_invalid_core import (
+    AMOUNT_COLUMNS,
+    RATIO_COLUMNS,
+    MissingColumnsError,
+    analyze_complete_data,
+)
+
+COUNT_COLUMNS = ['订单总数', '无效订单总数', '无效-违规订单数', '无效-风险订单数']
+
+
+def by_combination(result_df):
+    return result_df.set_index(['项目名称', '渠道名称'])
+
+
+def reference_complete_result(df):
+    """逐个组合用布尔筛选计算违规率分析的各项指标，作为单次分组聚合的对照"""
+    estimate = df['estimate_cos_price'].fillna(0)
+    actual = df['actual_cos_price'].fillna(0)
+    reason = df['bonus_invalid_text']
+    invalid = reason.notna() & (reason != '')
+    violation = reason == '无效-违规订单'
+    risk = reason == '无效-风险订单'
+    valid = df['bonus_text'] == '有效'
+    completed = df['order_text'] == '已完成'
+
+    rows = {}
+    for project_name in df['project_name'].dropna().unique():
+        in_project = df['project_name'] == project_name
+        project_total = in_project.sum()
+        project_estimate = estimate[in_project].sum()
+        project_violation_rate = (violation | risk)[in_project].sum() / project_total
+        project_gmv_ratio = estimate[in_project & violation].sum() / project_estimate if project_estimate else 0
+
+        for channel_name in df.loc[in_project, 'channel_name'].dropna().unique():
+            mask = in_project & (df['channel_name'] == channel_name)
+            total = mask.sum()
+            estimate_gmv = estimate[mask].sum()
+
+            def gmv_ratio(value):
+                return value / estimate_gmv if estimate_gmv else 0
+
+            rows[(project_name, channel_name)] = {
+                '订单总数': total,
+                '预估计佣GMV': estimate_gmv,
+                '预估完成': estimate[mask & valid].sum(),
+                '实际计佣GMV': actual[mask & valid & completed].sum(),
+                '无效订单总数': (mask & invalid).sum(),
+                '无效订单占比': (mask & invalid).sum() / total,
+                '无效-违规订单数': (mask & violation).sum(),
+                '无效-违规订单占比': (mask & violation).sum() / total,
+                '无效-违规订单GMV': estimate[mask & violation].sum(),
+                '无效-违规订单GMV占比': gmv_ratio(estimate[mask & violation].sum()),
+                '无效-风险订单数': (mask & risk).sum(),
+                '无效-风险订单占比': (mask & risk).sum() / total,
+                '无效-风险订单GMV': estimate[mask & risk].sum(),
+                '无效-风险订单GMV占比': gmv_ratio(estimate[mask & risk].sum()),
+                '违规率': (mask & (violation | risk)).sum() / total,
+                '违规GMV占比': gmv_ratio(estimate[mask & (violation | risk)].sum()),
+                '项目违规率': project_violation_rate,
+                '项目违规GMV占比': project_gmv_ratio,
+            }
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def assert_matches_reference(result_df, reference_df):
+    result_df = by_combination(result_df)
+    assert sorted(result_df.index) == sorted(reference_df.index)
+    result_df = result_df.loc[reference_df.index]
+    for column in reference_df.columns:
+        np.testing.assert_allclose(result_df[column].to_numpy(dtype=np.float64),
+                                   reference_df[column].to_numpy(dtype=np.float64),
+                                   rtol=1e-12, atol=1e-9, err_msg=column)
+
+
+def test_channel_metrics(orders):
+    result = by_combination(analyze_complete_data(orders)['analysis_result'])
+
+    a_x = result.loc[('A', 'x')]
+    assert a_x['订单总数'] == 3
+    assert a_x['无效订单总数'] == 2
+    assert a_x['预估计佣GMV'] == 60.0
+    assert a_x['预估完成'] == 20.0
+    assert a_x['实际计佣GMV'] == 15.0
+    assert a_x['无效-违规订单GMV'] == 10.0
+    assert a_x['无效-风险订单GMV'] == 30.0
+    assert a_x['违规率'] == pytest.approx(2 / 3)
+    assert a_x['违规GMV占比'] == pytest.approx(40 / 60)
+
+    a_y = result.loc[('A', 'y')]
+    assert a_y['无效订单总数'] == 1
+    assert a_y['实际计佣GMV'] == 0.0
+    assert a_y['违规率'] == 0.0
+
+    # 空的预估金额按0计，其他无效原因计入无效订单总数
+    b_x = result.loc[('B', 'x')]
+    assert b_x['订单总数'] == 4
+    assert b_x['无效订单总数'] == 4
+    assert b_x['预估计佣GMV'] == 22.5
+    assert b_x['实际计佣GMV'] == 2.0
+    assert b_x['违规GMV占比'] == pytest.approx(12.5 / 22.5)
+
+
+def test_project_metrics_include_rows_without_channel(orders):
+    result = by_combination(analyze_complete_data(orders)['analysis_result'])
+
+    # 项目A的渠道为空的订单不单独成行，但计入项目违规率和项目违规GMV占比
+    assert result.loc[('A', 'x'), '项目违规率'] == pytest.approx(3 / 6)
+    assert result.loc[('A', 'y'), '项目违规GMV占比'] == pytest.approx(60 / 155)
+    assert result.loc[('B', 'x'), '项目违规率'] == pytest.approx(1 / 4)
+
+
+def test_combinations_and_order(orders):
+    complete_result = analyze_complete_data(orders)
+    result_df = complete_result['analysis_result']
+
+    # 名称为空的组合只计入组合数
+    assert complete_result['total_combinations'] == 5
+    assert list(zip(result_df['项目名称'], result_df['渠道名称'])) == [('B', 'x'), ('A', 'x'), ('A', 'y')]
+    assert complete_result['use_project_code']
+    assert list(result_df.columns[:3]) == ['日期', '项目名称', '项目编号']
+
+
+def test_results_are_numeric(orders):
+    result_df = analyze_complete_data(orders)['analysis_result']
+    for column in AMOUNT_COLUMNS + RATIO_COLUMNS + COUNT_COLUMNS:
+        if column in result_df.columns:
+            assert pd.api.types.is_numeric_dtype(result_df[column]), column
+
+
+def test_matches_reference(random_orders):
+    result_df = analyze_complete_data(random_orders)['analysis_result']
+    assert_matches_reference(result_df, reference_complete_result(random_orders))
+
+
+def test_without_project_code(random_orders):
+    complete_result = analyze_complete_data(random_orders.drop(columns='project_code'))
+    result_df = complete_result['analysis_result']
+
+    assert not complete_result['use_project_code']
+    assert '项目编号' not in result_df.columns
+    assert result_df['项目名称'].is_monotonic_increasing
+
+
+def test_missing_columns(orders):
+    with pytest.raises(MissingColumnsError) as excinfo:
+        analyze_complete_data(orders.drop(columns=['bonus_text']))
+    assert 'bonus_text' in str(excinfo.value)
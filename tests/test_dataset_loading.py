@@ -0,0 +1,45 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from project_invalid_core import (
+    CATEGORY_COLUMNS,
+    PRICE_COLUMNS,
+    analyze_complete_data,
+    read_dataset_csv,
+)
+
+
+def test_declared_column_types(random_orders_csv):
+    df = read_dataset_csv(random_orders_csv)
+    for column in CATEGORY_COLUMNS:
+        assert isinstance(df[column].dtype, pd.CategoricalDtype), column
+    for column in PRICE_COLUMNS:
+        assert df[column].dtype == np.float64, column
+
+
+def test_analysis_columns_only(random_orders):
+    buffer = io.StringIO()
+    random_orders.assign(remark='备注').to_csv(buffer, index=False)
+
+    assert 'remark' in read_dataset_csv(io.StringIO(buffer.getvalue())).columns
+    assert 'remark' not in read_dataset_csv(io.StringIO(buffer.getvalue()), analysis_columns_only=True).columns
+
+
+def test_unparseable_prices_become_missing(orders):
+    orders['estimate_cos_price'] = orders['estimate_cos_price'].astype(object)
+    orders.loc[0, 'estimate_cos_price'] = '待确认'
+    buffer = io.BytesIO(orders.to_csv(index=False).encode('utf-8'))
+
+    df = read_dataset_csv(buffer)
+    assert df['estimate_cos_price'].dtype == np.float64
+    assert np.isnan(df.loc[0, 'estimate_cos_price'])
+    assert df.loc[1, 'estimate_cos_price'] == 20.0
+
+
+def test_typed_read_gives_same_analysis(random_orders, random_orders_csv):
+    typed_result = analyze_complete_data(read_dataset_csv(random_orders_csv))['analysis_result']
+    plain_result = analyze_complete_data(random_orders)['analysis_result']
+    pd.testing.assert_frame_equal(typed_result.reset_index(drop=True).astype({'项目名称': object, '渠道名称': object}),
+                                  plain_result.reset_index(drop=True))
@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from project_invalid_core import DATE_FORMATS, MISSING_DATE_SENTINEL, parse_date, parse_date_column
+
+
+def test_mixed_formats_match_row_parser():
+    values = pd.Series([
+        '05/12/2025 10:00:00',
+        '2025-12-06 11:30:00',
+        '25/12/2025 23:59:59',
+        '07/12/2025',
+        '2025-12-08',
+        '2025/12/09 08:00:00',
+        ' 10/12/2025 09:00:00 ',
+        MISSING_DATE_SENTINEL,
+        '',
+        np.nan,
+        '不是日期',
+    ])
+    parsed = parse_date_column(values)
+
+    expected = [parse_date(value) for value in values]
+    assert [None if pd.isna(value) else value.to_pydatetime() for value in parsed] == expected
+    assert parsed.iloc[0] == datetime(2025, 12, 5, 10, 0, 0)
+
+
+@pytest.mark.parametrize('dominant_format', DATE_FORMATS)
+def test_dominant_format_with_fallback_matches_row_parser(dominant_format):
+    # 大部分值为主要格式，其余为其他格式、缺失值和无法解析的值；日期都大于12日，各格式的含义没有歧义
+    rng = np.random.default_rng(DATE_FORMATS.index(dominant_format))
+    times = pd.Timestamp('2025-01-13') + pd.to_timedelta(rng.integers(0, 365 * 86400, 2000), unit='s')
+    times = times[times.day > 12]
+    formats = np.where(rng.random(len(times)) < 0.8, dominant_format, rng.choice(DATE_FORMATS, len(times)))
+    values = pd.Series([time.strftime(fmt) for time, fmt in zip(times, formats)], dtype=object)
+    values[rng.random(len(values)) < 0.05] = MISSING_DATE_SENTINEL
+    values[rng.random(len(values)) < 0.05] = np.nan
+    values[rng.random(len(values)) < 0.02] = '不是日期'
+
+    parsed = parse_date_column(values)
+    expected = [parse_date(value) for value in values]
+    assert [None if pd.isna(value) else value.to_pydatetime() for value in parsed] == expected
+
+
+def test_dominant_format_decides_ambiguous_dates():
+    # 样本中主要是 日/月/年，含义不明确的 01/02/2025 也按 日/月/年 解析
+    values = pd.Series(['25/12/2025 10:00:00'] * 5 + ['01/02/2025 10:00:00'])
+    assert parse_date_column(values).iloc[-1] == datetime(2025, 2, 1, 10, 0, 0)
+
+
+def test_all_missing():
+    parsed = parse_date_column(pd.Series([np.nan, MISSING_DATE_SENTINEL, '']))
+    assert parsed.isna().all()
+    assert pd.api.types.is_datetime64_any_dtype(parsed)
+
+
+def test_datetime_column_is_returned_unchanged():
+    values = pd.Series(pd.to_datetime(['2025-12-01', None]))
+    assert parse_date_column(values) is values
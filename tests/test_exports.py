@@ -0,0 +1,209 @@
+import gzip
+import io
+import os
+import re
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+import project_invalid_core
+from project_invalid_core import (
+    analyze_complete_data,
+    build_project_summary,
+    build_total_stats,
+    export_cache_key,
+    format_for_csv,
+    iter_csv_chunks,
+    parse_time_columns,
+    read_dataset_csv,
+    result_report_date,
+    typed_export_table,
+    write_arrow_export,
+    write_csv_export,
+    write_excel_report,
+    write_report,
+    write_tables_archive,
+)
+
+
+def report_tables(df):
+    result_df = analyze_complete_data(df)['analysis_result']
+    return {'详细分析': result_df, '项目汇总': build_project_summary(result_df), '统计汇总': build_total_stats(result_df)}
+
+
+def test_csv_formatting_keeps_results_numeric(orders):
+    result_df = analyze_complete_data(orders)['analysis_result']
+    export_df = format_for_csv(result_df)
+
+    row = export_df.set_index(['项目名称', '渠道名称']).loc[('A', 'x')]
+    assert row['预估计佣GMV'] == '60.00'
+    assert row['违规率'] == '66.67%'
+    assert row['无效-风险订单GMV占比'] == '50.00%'
+    assert row['订单总数'] == 3
+
+    # 分析结果本身不被修改，仍为数值
+    assert pd.api.types.is_float_dtype(result_df['违规率'])
+    assert result_df.set_index(['项目名称', '渠道名称']).loc[('A', 'x'), '预估计佣GMV'] == 60.0
+
+
+def test_export_cache_key(orders):
+    result_df = analyze_complete_data(orders)['analysis_result']
+    today = result_report_date(result_df)
+    assert today == pd.Timestamp.now().normalize()
+    assert result_report_date(result_df.iloc[:0]) is None
+    assert result_report_date(result_df.drop(columns='日期')) is None
+
+    # 导出格式、数据哈希、参数和报告日期任一不同时都是不同的文件
+    key = export_cache_key('analysis_csv', 'hash', (False,), today)
+    assert key == export_cache_key('analysis_csv', 'hash', (False,), today)
+    assert len({key,
+                export_cache_key('analysis_excel', 'hash', (False,), today),
+                export_cache_key('analysis_csv', 'other', (False,), today),
+                export_cache_key('analysis_csv', 'hash', (True,), today),
+                export_cache_key('analysis_csv', 'hash', (False,), today - pd.Timedelta(days=1))}) == 5
+
+
+def read_arrow_export(source, export_format):
+    pa = pytest.importorskip('pyarrow')
+    if export_format == 'parquet':
+        return pytest.importorskip('pyarrow.parquet').read_table(source)
+    return pa.ipc.open_file(source).read_all()
+
+
+def read_report(paths, output_format):
+    """读取 write_report 写出的报告，返回 {表名: DataFrame}"""
+    if output_format == 'excel':
+        # 项目编号为文本，读取时不转换为数字
+        return pd.read_excel(paths[0], sheet_name=None, dtype={'项目编号': str})
+    return {os.path.basename(path).rsplit('_', 1)[1].split('.')[0]: read_arrow_export(path, output_format).to_pandas()
+            for path in paths}
+
+
+@pytest.mark.parametrize('output_format', [
+    'excel',
+    *[pytest.param(name, marks=pytest.mark.skipif(project_invalid_core.pa is None, reason="未安装pyarrow"))
+      for name in ['parquet', 'arrow']],
+])
+def test_report_round_trip(orders, tmp_path, output_format):
+    tables = report_tables(orders)
+    report = read_report(write_report(tables, str(tmp_path / 'report'), output_format), output_format)
+
+    assert list(report) == list(tables)
+    for name, table in tables.items():
+        # Excel不区分int和float
+        pd.testing.assert_frame_equal(report[name], table.reset_index(drop=True), check_dtype=output_format != 'excel')
+    # 日期保存为日期时间，不是文本
+    assert pd.api.types.is_datetime64_any_dtype(report['详细分析']['日期'])
+
+
+def test_excel_number_formats(orders, tmp_path):
+    [path] = write_report(report_tables(orders), str(tmp_path / 'report'), 'excel')
+
+    # 数值按显示格式设置单元格格式，不转换为文本
+    worksheet = load_workbook(path)['详细分析']
+    header = [cell.value for cell in worksheet[1]]
+    row = {column: cell for column, cell in zip(header, worksheet[2])}
+    assert row['预估计佣GMV'].number_format == '0.00'
+    assert row['违规率'].number_format == '0.00%'
+    assert row['日期'].number_format == 'yyyy-mm-dd'
+    assert isinstance(row['违规率'].value, float)
+    assert worksheet['A1'].font.bold
+
+
+def test_excel_sheets_are_split_at_the_row_limit(random_orders, tmp_path, monkeypatch):
+    monkeypatch.setattr(project_invalid_core, 'EXCEL_MAX_ROWS', 401)
+    raw_df = random_orders.iloc[:1000]
+    path = tmp_path / 'raw.xlsx'
+    write_excel_report({'原始数据': raw_df, '空表': raw_df.iloc[:0]}, path, chunk_size=150)
+
+    sheets = pd.read_excel(path, sheet_name=None)
+    assert list(sheets) == ['原始数据', '原始数据_2', '原始数据_3', '空表']
+    assert [len(sheet) for sheet in sheets.values()] == [400, 400, 200, 0]
+    assert list(sheets['空表'].columns) == list(raw_df.columns)
+
+    combined = pd.concat([sheets['原始数据'], sheets['原始数据_2'], sheets['原始数据_3']], ignore_index=True)
+    # Excel中空字符串和空值都是空单元格
+    pd.testing.assert_frame_equal(combined, raw_df.replace('', np.nan), check_dtype=False)
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip', 'zip'])
+def test_csv_export_round_trip(random_orders, compression):
+    buffer = io.BytesIO()
+    write_csv_export(random_orders, buffer, compression, arcname='原始数据.csv', chunk_size=250)
+
+    data = buffer.getvalue()
+    if compression == 'gzip':
+        data = gzip.decompress(data)
+    elif compression == 'zip':
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            assert archive.namelist() == ['原始数据.csv']
+            data = archive.read('原始数据.csv')
+
+    # 只有第一块带BOM和表头
+    assert data.startswith('\ufeff'.encode('utf-8'))
+    assert data.count(b'activity_name') == 1
+    # CSV中空字符串和空值都读取为空值
+    pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(data), encoding='utf-8-sig'),
+                                  random_orders.replace('', np.nan))
+
+
+def test_csv_chunks_of_an_empty_table(orders):
+    assert list(iter_csv_chunks(orders.iloc[:0])) == [('\ufeff' + ','.join(orders.columns) + '\n').encode('utf-8')]
+
+
+def test_csv_report_is_formatted(orders, tmp_path):
+    paths = write_report(report_tables(orders), str(tmp_path / 'report'), 'csv')
+    assert [path.rsplit('_', 1)[1] for path in paths] == ['详细分析.csv', '项目汇总.csv', '统计汇总.csv']
+
+    detail = pd.read_csv(paths[0], encoding='utf-8-sig', dtype=str).set_index(['项目名称', '渠道名称'])
+    assert detail.loc[('A', 'x'), '违规率'] == '66.67%'
+    assert re.fullmatch(r'\d{4}-\d{2}-\d{2}', detail.loc[('A', 'x'), '日期'])
+
+
+def test_unknown_compression(orders):
+    with pytest.raises(ValueError):
+        write_csv_export(orders, io.BytesIO(), compression='bz2')
+
+
+@pytest.mark.parametrize('export_format', ['parquet', 'arrow'])
+def test_typed_raw_data_round_trip(random_orders_csv, export_format):
+    pytest.importorskip('pyarrow')
+    raw_df = typed_export_table(read_dataset_csv(random_orders_csv))
+    buffer = io.BytesIO()
+    write_arrow_export(raw_df, buffer, export_format, chunk_size=700)
+
+    table = read_arrow_export(io.BytesIO(buffer.getvalue()), export_format)
+    if export_format == 'parquet':
+        # 每块一个行组
+        assert pytest.importorskip('pyarrow.parquet').ParquetFile(io.BytesIO(buffer.getvalue())).num_row_groups == 5
+    # 时间列为日期时间，分类列和金额列保留类型
+    pd.testing.assert_frame_equal(table.to_pandas(), raw_df)
+    assert pd.api.types.is_datetime64_any_dtype(table.to_pandas()['order_time'])
+    assert isinstance(table.to_pandas()['project_name'].dtype, pd.CategoricalDtype)
+
+
+def test_typed_export_of_filtered_rows(random_orders):
+    parsed_times = parse_time_columns(random_orders)
+    filtered = random_orders[random_orders['project_name'] == '项目1']
+
+    # 使用完整数据解析好的时间列，按索引对齐
+    typed = typed_export_table(filtered, parsed_times)
+    pd.testing.assert_series_equal(typed['finish_time'], parse_time_columns(filtered)['finish_time'])
+    assert typed.index.equals(filtered.index)
+
+
+def test_tables_archive(orders):
+    pytest.importorskip('pyarrow')
+    tables = report_tables(orders)
+    buffer = io.BytesIO()
+    write_tables_archive(tables, buffer, 'parquet')
+
+    with zipfile.ZipFile(buffer) as archive:
+        assert archive.namelist() == [f"{name}.parquet" for name in tables]
+        # Parquet文件已压缩，打包时不再压缩
+        assert all(info.compress_type == zipfile.ZIP_STORED for info in archive.infolist())
+        detail = read_arrow_export(io.BytesIO(archive.read('详细分析.parquet')), 'parquet').to_pandas()
+    pd.testing.assert_frame_equal(detail, tables['详细分析'].reset_index(drop=True))
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from project_invalid_core import (
+    AMOUNT_COLUMNS,
+    analyze_complete_data,
+    build_total_stats,
+    encode_price_cents,
+    sum_amount,
+)
+
+
+def test_prices_are_encoded_as_cents():
+    df = pd.DataFrame({'estimate_cos_price': [0.1, 0.2, np.nan, 12.34], 'actual_cos_price': ['0.07', '', None, 3]})
+    price_cents = encode_price_cents(df)
+    assert price_cents['estimate_cos_price'].tolist() == [10, 20, 0, 1234]
+    assert price_cents['actual_cos_price'].tolist() == [7, 0, 0, 300]
+    assert price_cents['estimate_cos_price'].dtype == np.int64
+
+
+def test_sums_are_exact_to_the_cent(orders):
+    # 1000个0.1元按浮点数累加得到 99.9999999999986，按整数分累加正好是100元
+    df = pd.concat([orders.iloc[[1]]] * 1000, ignore_index=True)
+    df['estimate_cos_price'] = 0.1
+    assert df['estimate_cos_price'].sum() != 100.0
+
+    result = analyze_complete_data(df, price_cents=encode_price_cents(df))
+    result_df = result['analysis_result']
+    assert result['fixed_point']
+    assert result_df['预估计佣GMV'].tolist() == [100.0]
+    assert result_df['预估完成'].tolist() == [100.0]
+    assert build_total_stats(result_df, fixed_point=True).loc[0, '总预估计佣GMV'] == 100.0
+
+
+def test_matches_float_results(random_orders):
+    float_df = analyze_complete_data(random_orders.copy())['analysis_result']
+    fixed_df = analyze_complete_data(random_orders, price_cents=encode_price_cents(random_orders))['analysis_result']
+
+    pd.testing.assert_frame_equal(fixed_df, float_df, rtol=1e-9)
+    for column in AMOUNT_COLUMNS:
+        # 金额是整数分换算的元，没有累加误差
+        values = fixed_df[column].to_numpy()
+        np.testing.assert_array_equal(values, np.round(values * 100) / 100, err_msg=column)
+
+
+def test_sum_amount():
+    values = pd.Series([0.1] * 10 + [0.2] * 10)
+    assert values.sum() != 3.0
+    assert sum_amount(values, fixed_point=True) == 3.0
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+from project_invalid_core import JobQueue
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(max_workers=1)
+    yield queue
+    queue._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def blocking_job(started, finish, calls, value):
+    def compute(progress):
+        calls.append(value)
+        progress['step'] = value
+        started.set()
+        assert finish.wait(5)
+        return value
+    return compute
+
+
+def wait_until_empty(queue):
+    # 完成回调在工作线程中执行，可能晚于 future.result() 返回
+    deadline = time.monotonic() + 5
+    while len(queue) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return len(queue) == 0
+
+
+def test_same_key_is_computed_once(queue):
+    started, finish, calls = threading.Event(), threading.Event(), []
+    first = queue.submit('a', blocking_job(started, finish, calls, 1))
+    second = queue.submit('a', blocking_job(started, finish, calls, 2))
+
+    assert second is first
+    assert first['waiters'] == 2
+    assert started.wait(5)
+    assert first['progress'] == {'step': 1}
+    finish.set()
+    assert first['future'].result(5) == 1
+    assert calls == [1]
+
+
+def test_finished_jobs_leave_the_queue(queue):
+    job = queue.submit('a', lambda progress: 1)
+    assert job['future'].result(5) == 1
+    queue.release(job)
+    assert wait_until_empty(queue)
+
+    # 再次提交时重新计算
+    assert queue.submit('a', lambda progress: 2)['future'].result(5) == 2
+
+
+def test_jobs_without_waiters_are_cancelled(queue):
+    started, finish, calls = threading.Event(), threading.Event(), []
+    running = queue.submit('running', blocking_job(started, finish, calls, 'running'))
+    assert started.wait(5)
+    waiting = queue.submit('waiting', blocking_job(threading.Event(), finish, calls, 'waiting'))
+    queue.submit('waiting', blocking_job(threading.Event(), finish, calls, 'waiting'))
+
+    # 还有一个等待者时不取消
+    queue.release(waiting)
+    assert not waiting['future'].cancelled()
+    queue.release(waiting)
+    assert waiting['future'].cancelled()
+    assert len(queue) == 1
+
+    # 已经开始的任务无法取消，完成后仍返回结果
+    queue.release(running)
+    assert not running['future'].cancelled()
+    finish.set()
+    assert running['future'].result(5) == 'running'
+    assert calls == ['running']
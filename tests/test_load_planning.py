@@ -0,0 +1,87 @@
+import io
+
+import pytest
+
+import project_invalid_core
+from project_invalid_core import (
+    QUERY_ENGINES,
+    STREAM_CHUNK_SIZE,
+    estimate_dataset_size,
+    first_available_query_engine,
+    format_bytes,
+    plan_dataset_load,
+)
+
+
+@pytest.fixture
+def no_query_engines(monkeypatch):
+    for name, engine in QUERY_ENGINES.items():
+        monkeypatch.setitem(QUERY_ENGINES, name, {**engine, 'available': False})
+
+
+def test_small_file_is_counted_exactly(random_orders_csv, random_orders):
+    file_size, estimated_rows, row_memory = estimate_dataset_size(random_orders_csv)
+    assert estimated_rows == len(random_orders)
+    assert row_memory > 0
+
+
+def test_rows_are_extrapolated_from_the_file_head(random_orders_csv, random_orders, monkeypatch):
+    monkeypatch.setattr(project_invalid_core, 'LOAD_PLAN_SAMPLE_BYTES', 16 << 10)
+    _, estimated_rows, _ = estimate_dataset_size(random_orders_csv)
+    assert abs(estimated_rows - len(random_orders)) / len(random_orders) < 0.05
+
+
+def test_uploaded_file_is_rewound(random_orders_csv):
+    with open(random_orders_csv, 'rb') as f:
+        upload = io.BytesIO(f.read())
+    upload.seek(100)
+    assert estimate_dataset_size(upload) == estimate_dataset_size(random_orders_csv)
+    assert upload.tell() == 0
+
+
+def test_fits_in_memory(random_orders_csv):
+    plan = plan_dataset_load(random_orders_csv, memory=1 << 40)
+    assert plan['engine'] == 'pandas'
+    assert plan['available_memory'] == 1 << 40
+
+
+def test_over_budget_uses_a_query_engine(random_orders_csv):
+    if first_available_query_engine() is None:
+        pytest.skip("没有安装查询引擎")
+    plan = plan_dataset_load(random_orders_csv, memory=1 << 10)
+    assert plan['engine'] == first_available_query_engine()
+    assert QUERY_ENGINES[plan['engine']]['name'] in plan['reason']
+
+
+def test_over_budget_without_query_engines_streams(random_orders_csv, no_query_engines):
+    plan = plan_dataset_load(random_orders_csv, memory=1 << 10)
+    assert plan['engine'] == 'stream'
+    # 分块大小按内存预算确定，但不少于1万行
+    assert plan['chunk_size'] == 10000
+
+
+def test_chunk_size_follows_the_memory_budget(random_orders_csv, no_query_engines, monkeypatch):
+    # 1000万行、每行100字节：每块占用不超过预算的四分之一
+    monkeypatch.setattr(project_invalid_core, 'estimate_dataset_size',
+                        lambda source, analysis_columns_only: (1 << 30, 10 ** 7, 100.0))
+    row_memory = 100 * project_invalid_core.ANALYSIS_MEMORY_FACTOR
+    memory = int(50000 * row_memory * 4 / project_invalid_core.MEMORY_BUDGET_RATIO)
+
+    plan = plan_dataset_load(random_orders_csv, memory=memory)
+    assert plan['engine'] == 'stream'
+    assert plan['chunk_size'] == 50000
+    assert plan_dataset_load(random_orders_csv, memory=memory * 100)['chunk_size'] == STREAM_CHUNK_SIZE
+
+
+def test_unknown_memory_limits_file_size(random_orders_csv, monkeypatch):
+    monkeypatch.setattr(project_invalid_core, 'available_memory', lambda: None)
+    assert plan_dataset_load(random_orders_csv)['engine'] == 'pandas'
+
+    monkeypatch.setattr(project_invalid_core, 'UNKNOWN_MEMORY_MAX_FILE_SIZE', 1 << 10)
+    assert plan_dataset_load(random_orders_csv)['engine'] != 'pandas'
+
+
+def test_format_bytes():
+    assert format_bytes(512) == '512 B'
+    assert format_bytes(1536) == '1.5 KB'
+    assert format_bytes(3 << 30) == '3.0 GB'
@@ -0,0 +1,59 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import project_invalid_core
+from project_invalid_core import (
+    aggregate_channel_stats,
+    aggregate_channel_stats_parallel,
+    analyze_complete_data,
+    encode_price_cents,
+    partition_by_project,
+    read_dataset_csv,
+    shutdown_process_pools,
+)
+
+
+@pytest.fixture
+def parallel(monkeypatch):
+    """小数据也按多进程聚合，测试结束后关闭进程池"""
+    monkeypatch.setattr(project_invalid_core, 'PARALLEL_MIN_ROWS', 0)
+    yield
+    shutdown_process_pools()
+
+
+def test_partitions_keep_projects_together():
+    project_codes = np.array([0, 1, 1, 2, -1, 0, 1, 3, 3, -1, 1])
+    row_partition, partition_rows = partition_by_project(project_codes, 3)
+
+    for project in np.unique(project_codes):
+        assert len(np.unique(row_partition[project_codes == project])) == 1
+    assert partition_rows.tolist() == np.bincount(row_partition, minlength=3).tolist()
+    # 按行数从多到少依次放入当前行数最少的分区
+    assert sorted(partition_rows.tolist()) == [3, 4, 4]
+
+
+@pytest.mark.parametrize('fixed_point', [False, True])
+@pytest.mark.parametrize('as_category', [False, True])
+def test_matches_single_process(parallel, random_orders, fixed_point, as_category):
+    if as_category:
+        random_orders = read_dataset_csv(io.StringIO(random_orders.to_csv(index=False)))
+    price_cents = encode_price_cents(random_orders) if fixed_point else None
+
+    # 同一组合的行在同一分区并保持原始顺序，求和顺序与单进程相同，结果完全一致
+    pd.testing.assert_frame_equal(aggregate_channel_stats_parallel(random_orders, 4, price_cents),
+                                  aggregate_channel_stats(random_orders, price_cents), check_exact=True)
+
+
+def test_complete_analysis_with_workers(parallel, random_orders):
+    pd.testing.assert_frame_equal(analyze_complete_data(random_orders.copy(), workers=4)['analysis_result'],
+                                  analyze_complete_data(random_orders.copy())['analysis_result'], check_exact=True)
+
+
+def test_small_inputs_stay_in_process(random_orders, monkeypatch):
+    # 行数不足或项目数少于进程数下限时不使用进程池
+    monkeypatch.setattr(project_invalid_core, 'get_process_pool', None)
+    aggregate_channel_stats_parallel(random_orders, 4)
+    aggregate_channel_stats_parallel(random_orders.assign(project_name='项目0'), 8)
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+import project_invalid_core
+from project_invalid_core import (
+    JobQueue,
+    ResultCache,
+    analyze_complete_data,
+    analyze_violation_statistics,
+    csv_dataset_hash,
+    default_statistics_range,
+    hash_file,
+    parse_time_columns,
+    precompute_dataset,
+    read_dataset_csv,
+)
+from test_query_engines import ENGINES
+from test_violation_statistics import assert_statistics_equal
+
+OPTIONS = {
+    'analysis_columns_only': False,
+    'use_columnar_cache': False,
+    'fixed_point': False,
+    'workers': 1,
+    'chunk_size': 1000,
+}
+
+
+def test_results_use_the_page_cache_keys(random_orders_csv):
+    cache, progress = ResultCache(), {}
+    file_hash = hash_file(random_orders_csv)
+    assert precompute_dataset(cache, random_orders_csv, file_hash, 'pandas', OPTIONS, progress) == 'pandas'
+    assert progress == {'stage': "完成", 'fraction': 1.0}
+
+    df = read_dataset_csv(random_orders_csv)
+    dataset_hash = csv_dataset_hash(file_hash, False)
+    pd.testing.assert_frame_equal(cache.get(('read_csv', dataset_hash, ())), df)
+    pd.testing.assert_frame_equal(cache.get(('analyze_complete_data', dataset_hash, (False,)))['analysis_result'],
+                                  analyze_complete_data(df)['analysis_result'])
+
+    # 默认时间范围与统计页面日期选择器的默认值一致
+    statistics_range = default_statistics_range(parse_time_columns(df))
+    assert statistics_range[0] == pd.Timestamp('2025-12-01')
+    assert_statistics_equal(
+        cache.get(('analyze_violation_statistics', dataset_hash, statistics_range))['analysis_result'],
+        analyze_violation_statistics(df, *statistics_range)['analysis_result'])
+
+
+@pytest.mark.parametrize('engine', ['pandas', 'stream', *ENGINES])
+def test_cached_results_are_not_recomputed(random_orders_csv, engine):
+    cache = ResultCache()
+    file_hash = hash_file(random_orders_csv)
+    precompute_dataset(cache, random_orders_csv, file_hash, engine, OPTIONS, {})
+    entries = {key: cache.get(key) for key in list(cache._entries)}
+
+    # 再次加载同一文件时命中缓存，缓存中的结果对象不变
+    precompute_dataset(cache, random_orders_csv, file_hash, engine, OPTIONS, {})
+    assert all(cache.get(key) is value for key, value in entries.items())
+
+
+def test_errors_reach_the_job(tmp_path):
+    queue = JobQueue(max_workers=1)
+    missing = str(tmp_path / 'missing.csv')
+    job = queue.submit('load', lambda progress: precompute_dataset(ResultCache(), missing, 'hash', 'pandas',
+                                                                   OPTIONS, progress))
+    assert isinstance(job['future'].exception(5), FileNotFoundError)
+    assert job['progress']['stage'] == "读取数据"
+    queue._executor.shutdown(wait=True)
+
+
+def test_memory_error_falls_back_to_streaming(random_orders_csv, monkeypatch):
+    def out_of_memory(*args, **kwargs):
+        raise MemoryError
+
+    monkeypatch.setattr(project_invalid_core, 'read_dataset', out_of_memory)
+    cache = ResultCache()
+    file_hash = hash_file(random_orders_csv)
+    assert precompute_dataset(cache, random_orders_csv, file_hash, 'pandas', OPTIONS, {}) == 'stream'
+    assert cache.get(('analyze_csv_in_chunks', f"{file_hash}-stream", (False,))) is not None
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import project_invalid_core
+from project_invalid_core import (
+    analyze_complete_data,
+    estimate_violation_preview,
+    parse_time_columns,
+    read_block_sample,
+    stratified_rows,
+    wilson_interval,
+)
+
+
+def exact_rates(random_orders):
+    result_df = analyze_complete_data(random_orders)['analysis_result']
+    return result_df.set_index(['项目名称', '渠道名称'])[['订单总数', '违规率', '违规GMV占比']]
+
+
+def test_small_file_is_exact(random_orders_csv, random_orders):
+    preview = estimate_violation_preview(random_orders_csv)
+    assert preview['sample_fraction'] == 1.0
+    assert preview['estimated_total_rows'] == len(random_orders)
+
+    # 读取了整个文件且每个组合的全部行都被抽中，估计值即精确值，区间宽度为0
+    result = preview['preview_result'].set_index(['项目名称', '渠道名称'])
+    expected = exact_rates(random_orders).loc[result.index]
+    assert sorted(result.index) == sorted(expected.index)
+    assert result['估计订单总数'].tolist() == expected['订单总数'].tolist()
+    for column in ['违规率', '违规GMV占比']:
+        np.testing.assert_allclose(result[column], expected[column], rtol=1e-12)
+        np.testing.assert_allclose(result[f'{column}下限'], result[column], atol=1e-12)
+        np.testing.assert_allclose(result[f'{column}上限'], result[column], atol=1e-12)
+
+
+def test_stratified_sample_intervals(random_orders_csv, random_orders, monkeypatch):
+    monkeypatch.setattr(project_invalid_core, 'PREVIEW_ROWS_PER_GROUP', 40)
+    preview = estimate_violation_preview(random_orders_csv)
+    result = preview['preview_result'].set_index(['项目名称', '渠道名称'])
+    expected = exact_rates(random_orders).loc[result.index]
+
+    assert (result['样本订单数'] == 40).all()
+    assert (result['违规率上限'] > result['违规率下限']).all()
+    for column in ['违规率', '违规GMV占比']:
+        assert (result[f'{column}下限'] <= result[column]).all()
+        assert (result[column] <= result[f'{column}上限']).all()
+        # 95%置信区间应覆盖绝大多数组合的精确值
+        covered = (result[f'{column}下限'] <= expected[column]) & (expected[column] <= result[f'{column}上限'])
+        assert covered.mean() >= 0.8, column
+
+
+def test_block_sample_reads_whole_rows(random_orders_csv, random_orders, monkeypatch):
+    monkeypatch.setattr(project_invalid_core, 'PREVIEW_SAMPLE_BLOCKS', 16)
+    monkeypatch.setattr(project_invalid_core, 'PREVIEW_BLOCK_BYTES', 4096)
+    sample_df, sample_fraction = read_block_sample(random_orders_csv)
+
+    assert 0 < sample_fraction < 1
+    assert abs(len(sample_df) / sample_fraction - len(random_orders)) / len(random_orders) < 0.1
+    # 丢弃了每块首尾不完整的行，抽到的都是完整的行
+    assert parse_time_columns(sample_df)['order_time'].notna().all()
+    assert sample_df['estimate_cos_price'].dtype == np.float64
+
+
+def test_stratified_rows_caps_each_group():
+    group_codes = np.array([0] * 10 + [1] * 3 + [2] * 7)
+    rows = stratified_rows(group_codes, 5, seed=1)
+    assert np.bincount(group_codes[rows]).tolist() == [5, 3, 5]
+    assert (np.diff(rows) > 0).all()
+
+
+def test_wilson_interval():
+    lower, upper = wilson_interval(np.array([5.0, 0.0]), np.array([10.0, 10.0]), 1.96)
+    np.testing.assert_allclose(lower, [0.23659, 0.0], atol=1e-5)
+    np.testing.assert_allclose(upper, [0.76341, 0.27754], atol=1e-5)
+
+    # z为0时区间退化为点估计
+    assert wilson_interval(3.0, 12.0, 0.0) == (pytest.approx(0.25), pytest.approx(0.25))
+
+
+def test_preview_requires_analysis_columns(write_csv):
+    with pytest.raises(project_invalid_core.MissingColumnsError):
+        estimate_violation_preview(write_csv(pd.DataFrame({'a': [1]}), 'other.csv'))
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import project_invalid_core
+from project_invalid_core import (
+    QUERY_ENGINES,
+    analyze_complete_data,
+    analyze_violation_statistics,
+    dataset_file_path,
+    encode_price_cents,
+    hash_file,
+    parse_time_columns,
+    read_dataset,
+    resolve_default_engine,
+)
+from test_violation_statistics import DAY_RANGES, TIME_RANGES, assert_statistics_equal
+
+ENGINES = [
+    pytest.param(name, marks=pytest.mark.skipif(not QUERY_ENGINES[name]['available'],
+                                                 reason=f"{QUERY_ENGINES[name]['name']} 未安装"))
+    for name in ['duckdb', 'polars']
+]
+
+
+@pytest.fixture(params=['csv', 'parquet'])
+def source_path(request, random_orders_csv):
+    """查询引擎读取的数据文件：原始CSV或列式缓存中的Parquet文件"""
+    if request.param == 'csv':
+        return random_orders_csv
+    pytest.importorskip('pyarrow')
+    file_hash = hash_file(random_orders_csv)
+    read_dataset(random_orders_csv, file_hash)
+    return dataset_file_path(random_orders_csv, file_hash)
+
+
+def assert_no_none(result_df):
+    # 空的项目名称和渠道名称与pandas引擎一样为NaN
+    for column in ['项目名称', '渠道名称']:
+        assert not any(value is None for value in result_df[column]), column
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_complete_analysis_matches_pandas(engine, source_path, random_orders):
+    result = QUERY_ENGINES[engine]['analyze_complete_data'](source_path, False)
+    expected = analyze_complete_data(random_orders.copy())
+
+    # 浮点GMV的求和顺序不同，只比较到舍入误差
+    pd.testing.assert_frame_equal(result['analysis_result'], expected['analysis_result'])
+    assert result['total_combinations'] == expected['total_combinations']
+    assert result['total_records'] == len(random_orders)
+    assert result['use_project_code']
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_fixed_point_matches_pandas_exactly(engine, random_orders_csv, random_orders):
+    result = QUERY_ENGINES[engine]['analyze_complete_data'](random_orders_csv, True)
+    expected = analyze_complete_data(random_orders, price_cents=encode_price_cents(random_orders))
+
+    pd.testing.assert_frame_equal(result['analysis_result'], expected['analysis_result'], check_exact=True)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('time_range', DAY_RANGES + TIME_RANGES)
+def test_statistics_match_pandas(engine, source_path, random_orders, time_range):
+    result = QUERY_ENGINES[engine]['analyze_violation_statistics'](source_path, *time_range)
+    expected = analyze_violation_statistics(random_orders, *time_range)
+
+    assert_statistics_equal(result['analysis_result'], expected['analysis_result'])
+    assert_no_none(result['analysis_result'])
+    assert result['total_combinations'] == expected['total_combinations']
+    assert result['order_total_count'] == expected['order_total_count']
+    assert result['order_filtered_data'] is None
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_source_info_and_time_bounds(engine, random_orders_csv, random_orders):
+    info = QUERY_ENGINES[engine]['source_info'](random_orders_csv)
+    assert info['columns'] == list(random_orders.columns)
+    assert info['total_records'] == len(random_orders)
+
+    bounds = QUERY_ENGINES[engine]['time_bounds'](random_orders_csv)
+    times = parse_time_columns(random_orders)
+    for column in ['order_time', 'finish_time']:
+        assert bounds[column].tolist() == [times[column].min(), times[column].max()], column
+        assert np.issubdtype(bounds[column].dtype, np.datetime64)
+
+
+@pytest.mark.parametrize('value, expected', [(None, 'auto'), ('', 'auto'), (' Pandas ', 'pandas'), ('AUTO', 'auto')])
+def test_default_engine(value, expected):
+    assert resolve_default_engine(value) == expected
+
+
+def test_unknown_default_engine_falls_back_to_auto():
+    with pytest.warns(UserWarning, match='sqlite'):
+        assert resolve_default_engine('sqlite') == 'auto'
+
+
+def test_missing_default_engine_falls_back_to_auto(monkeypatch):
+    monkeypatch.setitem(QUERY_ENGINES, 'polars', {**QUERY_ENGINES['polars'], 'available': False})
+    with pytest.warns(UserWarning, match='Polars'):
+        assert resolve_default_engine('polars') == 'auto'
+    assert project_invalid_core.DEFAULT_ENGINE in ['auto', 'pandas', *QUERY_ENGINES]
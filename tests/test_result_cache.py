@@ -0,0 +1,105 @@
+import io
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+import project_invalid_core
+from project_invalid_core import ResultCache, collect_object_sizes, estimate_memory_usage
+
+
+def int_frame(rows):
+    return pd.DataFrame({'value': np.arange(rows, dtype=np.int64)})
+
+
+def test_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_expired_entries(monkeypatch):
+    clock = SimpleNamespace(now=0.0)
+    monkeypatch.setattr(project_invalid_core, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    cache = ResultCache(ttl_seconds=60)
+    cache.set('a', 1)
+
+    clock.now = 59
+    assert cache.get('a') == 1
+    clock.now = 120
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_get_or_compute():
+    cache = ResultCache()
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        return value
+
+    assert cache.get_or_compute('a', lambda: compute(1)) == 1
+    assert cache.get_or_compute('a', lambda: compute(2)) == 1
+    # 结果为None时不缓存，下次重新计算
+    assert cache.get_or_compute('b', lambda: compute(None)) is None
+    assert cache.get_or_compute('b', lambda: compute(3)) == 3
+    assert calls == [1, None, 3]
+
+def test_shared_frames_are_counted_once():
+    df = int_frame(1000)
+    table = int_frame(10)
+    cache = ResultCache()
+    cache.set('read_csv', df)
+    cache.set('analysis', {'filtered_data': df, 'analysis_result': table})
+    assert cache.total_bytes == 8000 + 80
+
+    # 只有所有引用它的条目都淘汰后才不再计入
+    cache.configure(1, 3600, cache.max_bytes)
+    assert cache.get('analysis') is not None
+    assert cache.total_bytes == 8000 + 80
+    cache.clear()
+    assert cache.total_bytes == 0
+
+
+def test_memory_limit_keeps_newest_entry():
+    cache = ResultCache(max_bytes=20000)
+    cache.set('a', int_frame(1000))
+    cache.set('b', int_frame(1000))
+    assert len(cache) == 2
+
+    cache.set('c', int_frame(1000))
+    assert cache.get('a') is None
+    assert cache.total_bytes == 16000
+
+    # 单独超过上限的结果仍然保留，之前的结果全部淘汰
+    cache.set('large', int_frame(5000))
+    assert len(cache) == 1
+    assert cache.get('large') is not None
+
+
+def test_replacing_an_entry_updates_size():
+    cache = ResultCache()
+    cache.set('a', int_frame(1000))
+    cache.set('a', int_frame(10))
+    assert cache.total_bytes == 80
+
+
+def test_object_columns_are_estimated_from_a_sample():
+    values = pd.Series(['订单' * (i % 7) for i in range(20000)])
+    actual = int(values.memory_usage(deep=True, index=False))
+    assert abs(estimate_memory_usage(values) - actual) / actual < 0.05
+
+
+def test_collects_nested_arrays_and_bytes():
+    array = np.zeros(100, dtype=np.float64)
+    sizes = {}
+    collect_object_sizes({'cube': {'counts': array, 'also': array}, 'export': b'x' * 50,
+                          'file': io.BytesIO(b'y' * 70), 'n': 3}, sizes)
+    assert sorted(sizes.values()) == [50, 70, 800]
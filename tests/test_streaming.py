@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+import project_invalid_core
+from project_invalid_core import (
+    analyze_complete_data,
+    analyze_csv_in_chunks,
+    analyze_violation_cube,
+    analyze_violation_statistics,
+    encode_price_cents,
+    read_dataset_csv,
+)
+from test_violation_statistics import DAY_RANGES, assert_statistics_equal
+
+
+@pytest.mark.parametrize('chunk_size', [97, 1000, 5000])
+def test_chunks_match_in_memory_analysis(random_orders_csv, chunk_size):
+    df = pd.read_csv(random_orders_csv)
+    expected = analyze_complete_data(df)
+    streamed = analyze_csv_in_chunks(random_orders_csv, chunk_size=chunk_size)
+
+    # 合并后组合顺序与完整数据一致，GMV只有浮点求和顺序带来的误差
+    pd.testing.assert_frame_equal(streamed['complete_analysis']['analysis_result'], expected['analysis_result'])
+    assert streamed['complete_analysis']['total_combinations'] == expected['total_combinations']
+    assert streamed['total_records'] == len(df)
+    assert streamed['complete_analysis']['filtered_data'] is None
+
+
+def test_project_codes_keep_one_type_across_chunks(write_csv, random_orders):
+    # 项目编号写成整数文本，只有后面的块中有空值：逐块推断类型时前面的块为int、后面的块为float
+    df = random_orders.copy()
+    df['project_code'] = df['project_code'].fillna(0).astype(int).astype(str).where(df['project_code'].notna())
+    df.loc[:1999, 'project_code'] = df.loc[:1999, 'project_code'].fillna('999')
+    path = write_csv(df, 'codes.csv')
+
+    expected = analyze_complete_data(read_dataset_csv(path))['analysis_result']
+    streamed = analyze_csv_in_chunks(path, chunk_size=1000)['complete_analysis']['analysis_result']
+    pd.testing.assert_frame_equal(streamed, expected)
+    assert not streamed['项目编号'].str.endswith('.0').any()
+
+
+def test_fixed_point_chunks_are_exact(random_orders_csv):
+    df = pd.read_csv(random_orders_csv)
+    expected = analyze_complete_data(df, price_cents=encode_price_cents(df))['analysis_result']
+    streamed = analyze_csv_in_chunks(random_orders_csv, chunk_size=333, fixed_point=True)
+
+    pd.testing.assert_frame_equal(streamed['complete_analysis']['analysis_result'], expected, check_exact=True)
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+@pytest.mark.parametrize('time_range', DAY_RANGES)
+def test_streamed_cube_matches_statistics(random_orders_csv, time_range, sparse, monkeypatch):
+    if sparse:
+        # 稠密立方体超过单元格数上限时改为保留稀疏的单元格统计结果
+        monkeypatch.setattr(project_invalid_core, 'VIOLATION_CUBE_MAX_CELLS', 1000)
+    df = pd.read_csv(random_orders_csv)
+    cube = analyze_csv_in_chunks(random_orders_csv, chunk_size=500)['violation_cube']
+    assert ('cells' in cube) == sparse
+
+    streamed = analyze_violation_cube(cube, *time_range)
+    expected = analyze_violation_statistics(df, *time_range)
+    assert_statistics_equal(streamed['analysis_result'], expected['analysis_result'])
+    assert streamed['total_combinations'] == expected['total_combinations']
+    assert streamed['order_total_count'] == expected['order_total_count']
+    assert streamed['order_filtered_data'] is None
@@ -0,0 +1,156 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import project_invalid_core
+from project_invalid_core import (
+    NoDataError,
+    analyze_violation_statistics,
+    build_statistics_index,
+    build_violation_cube,
+    parse_time_columns,
+)
+
+DAY_END = datetime.max.time()
+
+# 按整天选择的时间范围（可以用日期立方体回答）：(下单开始, 下单结束, 完成开始, 完成结束)
+DAY_RANGES = [
+    (datetime(2025, 12, 1), datetime.combine(datetime(2025, 12, 31), DAY_END),
+     datetime(2025, 12, 1), datetime.combine(datetime(2025, 12, 31), DAY_END)),
+    (datetime(2025, 12, 5), datetime.combine(datetime(2025, 12, 20), DAY_END),
+     datetime(2025, 12, 8), datetime.combine(datetime(2026, 1, 3), DAY_END)),
+    (None, datetime.combine(datetime(2025, 12, 10), DAY_END), datetime(2025, 12, 12), None),
+    (None, None, None, None),
+]
+
+# 不按整天的时间范围
+TIME_RANGES = [
+    (datetime(2025, 12, 3, 9, 30), datetime(2025, 12, 18, 17, 45),
+     datetime(2025, 12, 6, 12, 0), datetime(2025, 12, 24, 6, 0)),
+]
+
+
+def normalize(result_df):
+    """按组合排序后比较（分析结果只按项目名称排序，同一项目内的顺序不作要求）"""
+    return result_df.sort_values(['项目名称', '渠道名称'], na_position='last', kind='stable').reset_index(drop=True)
+
+
+def within(times, start_dt, end_dt):
+    mask = times.notna()
+    if start_dt is not None:
+        mask &= times >= start_dt
+    if end_dt is not None:
+        mask &= times <= end_dt
+    return mask
+
+
+def reference_statistics(df, order_start_dt, order_end_dt, finish_start_dt, finish_end_dt):
+    """逐个组合用布尔筛选计算违规率统计；名称为空的组合保留，各项计数为0"""
+    times = parse_time_columns(df)
+    in_order = within(times['order_time'], order_start_dt, order_end_dt)
+    in_finish = within(times['finish_time'], finish_start_dt, finish_end_dt)
+    invalid = in_finish & (df['bonus_text'] == '无效')
+    violation = in_finish & df['bonus_invalid_text'].isin(['无效-违规订单', '无效-风险订单'])
+
+    rows = []
+    window = df[in_order]
+    for (project_name, channel_name), group in window.groupby(['project_name', 'channel_name'], dropna=False,
+                                                             sort=False):
+        named = pd.notna(project_name) and pd.notna(channel_name)
+        total = len(group) if named else 0
+        violation_count = violation[group.index].sum() if named else 0
+        rows.append({
+            '项目名称': project_name,
+            '渠道名称': channel_name,
+            '订单总数': total,
+            '无效订单总数': invalid[group.index].sum() if named else 0,
+            '违规订单数': violation_count,
+            '违规率': violation_count / total if total else 0.0,
+        })
+    return pd.DataFrame(rows).astype({'订单总数': np.int64, '无效订单总数': np.int64, '违规订单数': np.int64})
+
+
+def assert_statistics_equal(result_df, expected_df):
+    pd.testing.assert_frame_equal(normalize(result_df), normalize(expected_df), check_dtype=False)
+
+
+def test_statistics_on_fixture(orders):
+    statistics_result = analyze_violation_statistics(orders, *DAY_RANGES[0])
+    result = statistics_result['analysis_result'].set_index(['项目名称', '渠道名称'])
+
+    # 下单时间在12月的10个订单中，完成时间为占位值、空值或在1月的订单不计入无效和违规订单
+    assert statistics_result['order_total_count'] == 10
+    assert statistics_result['total_combinations'] == 5
+    assert result.loc[('A', 'x')].tolist() == [3, 1, 1, pytest.approx(1 / 3)]
+    assert result.loc[('A', 'y')].tolist() == [2, 1, 0, 0.0]
+    assert result.loc[('B', 'x')].tolist() == [3, 2, 0, 0.0]
+    assert len(statistics_result['order_filtered_data']) == 10
+
+
+@pytest.mark.parametrize('time_range', DAY_RANGES + TIME_RANGES)
+def test_matches_reference(random_orders, time_range):
+    times = parse_time_columns(random_orders)
+    result_df = analyze_violation_statistics(random_orders, *time_range, order_times=times['order_time'],
+                                             finish_times=times['finish_time'])['analysis_result']
+    assert_statistics_equal(result_df, reference_statistics(random_orders, *time_range))
+
+
+@pytest.mark.parametrize('time_range', DAY_RANGES)
+def test_cube_matches_row_filtering(random_orders, time_range):
+    times = parse_time_columns(random_orders)
+    cube = build_violation_cube(random_orders, times['order_time'], times['finish_time'])
+    with_cube = analyze_violation_statistics(random_orders, *time_range, order_times=times['order_time'],
+                                             finish_times=times['finish_time'], cube=cube)
+    without_cube = analyze_violation_statistics(random_orders, *time_range, order_times=times['order_time'],
+                                                finish_times=times['finish_time'])
+
+    assert_statistics_equal(with_cube['analysis_result'], without_cube['analysis_result'])
+    assert with_cube['total_combinations'] == without_cube['total_combinations']
+    assert with_cube['order_total_count'] == without_cube['order_total_count']
+
+
+def test_cube_path_does_not_build_the_index(random_orders, monkeypatch):
+    times = parse_time_columns(random_orders)
+    cube = build_violation_cube(random_orders, times['order_time'], times['finish_time'])
+    expected = analyze_violation_statistics(random_orders, *DAY_RANGES[1])
+
+    monkeypatch.setattr(project_invalid_core, 'build_statistics_index', None)
+    with_cube = analyze_violation_statistics(random_orders, *DAY_RANGES[1], cube=cube)
+    assert_statistics_equal(with_cube['analysis_result'], expected['analysis_result'])
+    pd.testing.assert_frame_equal(with_cube['order_filtered_data'], expected['order_filtered_data'])
+    assert with_cube['order_total_count'] == expected['order_total_count']
+
+
+def test_oversized_cube_falls_back_to_the_index(random_orders, monkeypatch):
+    times = parse_time_columns(random_orders)
+    assert build_violation_cube(random_orders, times['order_time'], times['finish_time']) is not None
+
+    # 组合数 × 日期跨度超过上限时不构建立方体，统计改用行索引
+    monkeypatch.setattr(project_invalid_core, 'VIOLATION_CUBE_MAX_CELLS', 1000)
+    cube = build_violation_cube(random_orders, times['order_time'], times['finish_time'])
+    assert cube is None
+    result_df = analyze_violation_statistics(random_orders, *DAY_RANGES[1], order_times=times['order_time'],
+                                             finish_times=times['finish_time'], cube=cube)['analysis_result']
+    assert_statistics_equal(result_df, reference_statistics(random_orders, *DAY_RANGES[1]))
+
+
+def test_prebuilt_index_is_reused_across_ranges(random_orders):
+    times = parse_time_columns(random_orders)
+    index = build_statistics_index(random_orders, times['order_time'], times['finish_time'])
+    for time_range in DAY_RANGES + TIME_RANGES:
+        result_df = analyze_violation_statistics(random_orders, *time_range, index=index)['analysis_result']
+        assert_statistics_equal(result_df, reference_statistics(random_orders, *time_range))
+
+
+def test_order_window_keeps_row_order_and_bounds(orders):
+    # 下单时间正好等于范围两端的订单都计入
+    order_filtered = analyze_violation_statistics(orders, datetime(2025, 12, 1, 10), datetime(2025, 12, 12, 12),
+                                                  None, None)['order_filtered_data']
+    assert order_filtered.index.tolist() == [0, 1, 2, 3, 4, 5, 9]
+
+
+def test_no_orders_in_range(orders):
+    with pytest.raises(NoDataError):
+        analyze_violation_statistics(orders, datetime(2024, 1, 1), datetime(2024, 1, 31), None, None)